@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Benchmark overlapping the rendering of the channels and their transfer.
+
+A sequence made of long analogical pulses on each channel of the testing
+context is first rendered and then transferred channel by channel, and next
+compiled and transferred using compile_and_transfer_sequence_async. The
+transfers use a fake driver simulating the latency and the bandwidth of the
+link to the instrument.
+
+Usage : python benchmarks/bench_async_transfer.py [--pulses N] [--repeat N]
+        [--bandwidth B] [--latency L]
+
+"""
+import asyncio
+import argparse
+from time import perf_counter
+
+
+def build_sequence(pulses):
+    """Build a sequence with the requested number of pulses per channel.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+    from exopy_pulses.testing.context import DummyContext
+
+    root = RootSequence(context=DummyContext(sampling=1e-3))
+    index = 0
+    for ch in ('Ch1_A', 'Ch2_A'):
+        for i in range(pulses):
+            root.add_child_item(index, Pulse(channel=ch, kind='Analogical',
+                                             def_1=str(i), def_2=str(i + 0.9),
+                                             shape=SquareShape()))
+            index += 1
+    for ch in ('Ch1_L', 'Ch2_L'):
+        for i in range(pulses):
+            root.add_child_item(index, Pulse(channel=ch, def_1=str(i),
+                                             def_2=str(i + 0.5)))
+            index += 1
+    return root
+
+
+async def render_then_transfer(root, driver):
+    """Render all the channels and then transfer them one after the other.
+
+    """
+    context = root.context
+    items, _ = context.preprocess_sequence(root)
+    for ch, waveform in context.render_sequence(items).items():
+        await driver.write_waveform(ch, waveform)
+
+
+def main():
+    from exopy_pulses.testing.driver import FakeAsyncDriver
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--pulses', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--bandwidth', type=float, default=50e6)
+    parser.add_argument('--latency', type=float, default=5e-3)
+    args = parser.parse_args()
+
+    root = build_sequence(args.pulses)
+    context = root.context
+    for name, run in (('Render then transfer', render_then_transfer),
+                      ('Asynchronous', context
+                       .compile_and_transfer_sequence_async)):
+        times = []
+        for _ in range(args.repeat):
+            driver = FakeAsyncDriver(bandwidth=args.bandwidth,
+                                     latency=args.latency)
+            start = perf_counter()
+            asyncio.run(run(root, driver))
+            times.append(perf_counter() - start)
+        print('%s : best %.1f ms' % (name, min(times)*1e3))
+
+
+if __name__ == '__main__':
+    main()
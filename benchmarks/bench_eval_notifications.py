@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Benchmark the cost of the notifications emitted while evaluating.
+
+A sequence made of sub-sequences of pulses is evaluated without any observer,
+with observers mimicking the bindings of an editor view on the timing of each
+item (notified for every value written during the evaluation) and with the
+same view refreshing itself once when evaluation_finished is emitted.
+
+Usage : python benchmarks/bench_eval_notifications.py [--sequences N]
+        [--pulses N] [--repeat N]
+
+"""
+import argparse
+from time import perf_counter
+
+
+def build_sequence(sequences, pulses):
+    """Build a sequence with the requested number of sub-sequences.
+
+    """
+    from collections import OrderedDict
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import (RootSequence,
+                                                              BaseSequence)
+    from exopy_pulses.testing.context import DummyContext
+
+    root = RootSequence(context=DummyContext(sampling=1e-3),
+                        external_vars=OrderedDict({'a': 0.5}))
+    for i in range(sequences):
+        seq = BaseSequence(time_constrained=True, def_1=str(i),
+                           def_2=str(i + 1))
+        root.add_child_item(i, seq)
+        for j in range(pulses):
+            start = '{%d_start} + %g' % (seq.index, j/pulses)
+            seq.add_child_item(j, Pulse(channel='Ch1_A', kind='Analogical',
+                                        def_1=start, def_mode='Start/Duration',
+                                        def_2='{a}/%d' % pulses,
+                                        shape=SquareShape(amplitude='{a}')))
+    return root
+
+
+class View(object):
+    """Emulate an editor displaying the timing of each item.
+
+    """
+    def __init__(self, root, coalesced):
+        self.texts = {}
+        self.items = [i for i in root.traverse() if hasattr(i, 'stop')]
+        if coalesced:
+            root.observe('evaluation_finished', self.refresh)
+        else:
+            for item in self.items:
+                for name in ('start', 'stop', 'duration'):
+                    item.observe(name, self.update)
+
+    def update(self, change):
+        """Update the text of a single field.
+
+        """
+        self.texts[(id(change['object']), change['name'])] = \
+            '{:.3f}'.format(change['value'])
+
+    def refresh(self, outcome):
+        """Update the text of all the fields.
+
+        """
+        for item in self.items:
+            for name in ('start', 'stop', 'duration'):
+                self.texts[(id(item), name)] = \
+                    '{:.3f}'.format(getattr(item, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sequences', type=int, default=50)
+    parser.add_argument('--pulses', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, view, suppress in (('No view', None, True),
+                                 ('View notified by each value', False,
+                                  False),
+                                 ('View refreshed once', True, True)):
+        root = build_sequence(args.sequences, args.pulses)
+        root.suppress_evaluation_notifications = suppress
+        if view is not None:
+            View(root, view)
+        times = []
+        for i in range(args.repeat):
+            # Change the external variable so that nothing is memoized.
+            root.external_vars['a'] = 0.5 + 0.1*(i % 2)
+            start = perf_counter()
+            res, _, errors = root.evaluate_sequence()
+            times.append(perf_counter() - start)
+            assert res, errors
+        print('%s : best %.1f ms' % (name, min(times)*1e3))
+
+
+if __name__ == '__main__':
+    main()
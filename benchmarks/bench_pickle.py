@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Benchmark the transfer of a sequence to another process.
+
+The size of the pickle and the time needed to pickle and unpickle an evaluated
+sequence using dumps_sequence are compared to the ones of the pickled
+preferences of the sequence, which have to be rebuilt using build_from_config.
+The default pickling of the atom objects is also attempted : it includes the
+values computed during the evaluation and fails on the signals of the
+sequences.
+
+Usage : python benchmarks/bench_pickle.py [--sequences N] [--pulses N]
+        [--repeat N]
+
+"""
+import argparse
+import pickle
+from time import perf_counter
+
+from bench_eval_notifications import build_sequence
+
+
+def measure(dump, load, repeat):
+    """Measure the size of the pickle and the best times to dump and load.
+
+    """
+    dumps, loads = [], []
+    for _ in range(repeat):
+        start = perf_counter()
+        data = dump()
+        dumps.append(perf_counter() - start)
+        start = perf_counter()
+        load(data)
+        loads.append(perf_counter() - start)
+    return len(data), min(dumps), min(loads)
+
+
+def main():
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import (RootSequence,
+                                                              BaseSequence)
+    from exopy_pulses.pulses.utils.snapshot import dumps_sequence
+    from exopy_pulses.testing.context import DummyContext
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sequences', type=int, default=50)
+    parser.add_argument('--pulses', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    root = build_sequence(args.sequences, args.pulses)
+    res, _, errors = root.evaluate_sequence()
+    assert res, errors
+
+    dependencies = {'exopy.pulses.item':
+                    {'exopy_pulses.BaseSequence': BaseSequence,
+                     'exopy_pulses.Pulse': Pulse},
+                    'exopy.pulses.shape':
+                    {'exopy_pulses.SquareShape': SquareShape},
+                    'exopy.pulses.context':
+                    {'exopy_pulses.DummyContext': DummyContext}}
+
+    cases = (
+        ('Preferences', lambda: pickle.dumps(root.preferences_from_members()),
+         lambda d: RootSequence.build_from_config(pickle.loads(d),
+                                                  dependencies)),
+        ('Snapshot', lambda: dumps_sequence(root), pickle.loads),
+        ('Default atom pickling',
+         lambda: pickle.dumps(root, pickle.HIGHEST_PROTOCOL), pickle.loads),
+    )
+    for name, dump, load in cases:
+        try:
+            size, dump_time, load_time = measure(dump, load, args.repeat)
+        except Exception as e:
+            print('%s : failed (%s)' % (name, e))
+            continue
+        print('%s : %.1f kB, dump %.1f ms, load %.1f ms' %
+              (name, size/1e3, dump_time*1e3, load_time*1e3))
+
+
+if __name__ == '__main__':
+    main()
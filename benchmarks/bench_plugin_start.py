@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Benchmark the import and the start-up of the pulses manager plugin.
+
+The import time is measured in a fresh interpreter while the start-up time is
+measured using a workbench relying on a temporary application directory
+containing the requested number of templates.
+
+Usage : python benchmarks/bench_plugin_start.py [--templates N] [--repeat N]
+
+"""
+import os
+import sys
+import argparse
+import subprocess
+from tempfile import mkdtemp
+from shutil import rmtree
+from time import perf_counter
+
+
+IMPORT_CODE = ('from time import perf_counter; t = perf_counter(); '
+               'import exopy_pulses.pulses.plugin; '
+               'print(perf_counter() - t)')
+
+
+def measure_import(repeat):
+    """Measure the time needed to import the plugin module.
+
+    """
+    cmd = [sys.executable, '-c', IMPORT_CODE]
+    return [float(subprocess.check_output(cmd).split()[-1])
+            for _ in range(repeat)]
+
+
+def create_templates(folder, number):
+    """Create a set of dummy templates.
+
+    """
+    from exopy_pulses.pulses.utils.sequences_io import save_sequence_prefs
+    os.makedirs(folder)
+    prefs = {'template_vars': "{'a': '1'}",
+             'context': {'context_id': 'exopy_pulses.TemplateContext',
+                         'logical_channels': "['A']",
+                         'analogical_channels': "['Ch1']"}}
+    prefs.update({'item_%d' % i: {'item_id': 'exopy_pulses.Pulse',
+                                  'def_1': '{a}', 'def_2': '%d' % i}
+                  for i in range(100)})
+    for i in range(number):
+        path = os.path.join(folder, 'template%d.temp_pulse.ini' % i)
+        save_sequence_prefs(path, prefs, 'Template %d' % i)
+
+
+def measure_start(app_dir, repeat):
+    """Measure the time needed to start the plugin and to scan the templates.
+
+    """
+    import enaml
+    from enaml.workbench.api import Workbench
+    from configobj import ConfigObj
+    from exopy.app.preferences import plugin as preferences_plugin
+    with enaml.imports():
+        from enaml.workbench.core.core_manifest import CoreManifest
+        from exopy.app.app_manifest import AppManifest
+        from exopy.app.preferences.manifest import PreferencesManifest
+        from exopy.app.states.manifest import StateManifest
+        from exopy.app.errors.manifest import ErrorsManifest
+        from exopy_pulses.pulses.manifest import PulsesManagerManifest
+
+    # Point the application to the temporary directory.
+    preferences_plugin.MODULE_PATH = app_dir
+    conf = ConfigObj(os.path.join(app_dir, 'app_directory.ini'))
+    conf['app_path'] = app_dir
+    conf.write()
+
+    results = []
+    for _ in range(repeat):
+        workbench = Workbench()
+        for manifest in (CoreManifest, AppManifest, PreferencesManifest,
+                         ErrorsManifest, StateManifest,
+                         PulsesManagerManifest):
+            workbench.register(manifest())
+        for p_id in ('enaml.workbench.core', 'exopy.app.errors',
+                     'exopy.app.states'):
+            workbench.get_plugin(p_id)
+
+        t_start = perf_counter()
+        plugin = workbench.get_plugin('exopy.pulses')
+        t_started = perf_counter()
+        plugin._templates_scanner.join()
+        t_scanned = perf_counter()
+        results.append((t_started - t_start, t_scanned - t_start,
+                        len(plugin._template_sequences_infos)))
+
+        for m_id in ('exopy.pulses', 'exopy.app.states', 'exopy.app.errors',
+                     'exopy.app.preferences', 'exopy.app',
+                     'enaml.workbench.core'):
+            workbench.unregister(m_id)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--templates', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    imports = measure_import(args.repeat)
+    print('Import of the plugin module : best %.1f ms' % (min(imports)*1e3))
+
+    app_dir = mkdtemp()
+    try:
+        create_templates(os.path.join(app_dir, 'pulses', 'templates'),
+                         args.templates)
+        results = measure_start(app_dir, args.repeat)
+    finally:
+        rmtree(app_dir)
+
+    for i, (started, scanned, known) in enumerate(results):
+        print('Start %d (%d templates) : started in %.1f ms, templates '
+              'scanned in %.1f ms' % (i, known, started*1e3, scanned*1e3))
+
+
+if __name__ == '__main__':
+    main()
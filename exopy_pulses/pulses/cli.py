@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Command line tool compiling saved sequences without the application.
+
+The compiled waveforms of each channel are written to a npz archive (or a
+folder of npy files) for each set of external variables, which allows to
+precompile all the points of a sweep in one go.
+
+"""
+import os
+import sys
+import json
+import argparse
+from ast import literal_eval
+from itertools import product
+from pprint import pformat
+from time import perf_counter
+
+import numpy as np
+
+#: Extension of the files in which sequences are saved.
+SEQUENCE_EXT = '.pulse.ini'
+
+
+def parse_assignment(assignment):
+    """Parse a NAME=VALUE assignment whose value is a Python literal.
+
+    """
+    name, sep, value = assignment.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError('Expected NAME=VALUE not %s' %
+                                         assignment)
+    try:
+        return name.strip(), literal_eval(value.strip())
+    except (ValueError, SyntaxError):
+        raise argparse.ArgumentTypeError('Invalid value for %s : %s' %
+                                         (name, value))
+
+
+def build_points(variables, vars_file, sweeps):
+    """Build the list of external variables values to compile.
+
+    Parameters
+    ----------
+    variables : list
+        (name, value) pairs shared by all points.
+
+    vars_file : unicode or None
+        Path to a JSON file containing either a mapping of values shared by
+        all points or a list of such mappings (one per point).
+
+    sweeps : list
+        (name, values) pairs. The points are the cartesian product of the
+        swept values.
+
+    Returns
+    -------
+    points : list
+        External variables to use for each compilation.
+
+    """
+    base_points = [{}]
+    if vars_file:
+        with open(vars_file) as f:
+            data = json.load(f)
+        base_points = data if isinstance(data, list) else [data]
+
+    points = []
+    names = [name for name, _ in sweeps]
+    for base in base_points:
+        for values in product(*[list(v) for _, v in sweeps]):
+            point = dict(base)
+            point.update(variables)
+            point.update(zip(names, values))
+            points.append(point)
+
+    return points
+
+
+def save_buffers(path, buffers, fmt):
+    """Save the rendered buffers to a npz archive or a folder of npy files.
+
+    Returns
+    -------
+    path : unicode
+        Path of the created archive or folder.
+
+    """
+    if fmt == 'npz':
+        path += '.npz'
+        np.savez(path, **buffers)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for channel, buffer in buffers.items():
+            np.save(os.path.join(path, channel + '.npy'), buffer)
+
+    return path
+
+
+def build_parser():
+    """Build the parser of the command line arguments.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='exopy_pulses_compile',
+        description='Compile a saved pulse sequence and save the waveforms '
+                    'of all the channels of its context.')
+    parser.add_argument('sequence', help='Path to the sequence file.')
+    parser.add_argument('-o', '--output', default='.',
+                        help='Folder in which to write the waveforms.')
+    parser.add_argument('-f', '--format', choices=('npz', 'npy'),
+                        default='npz',
+                        help='Save each point as a npz archive or as a '
+                             'folder containing a npy file per channel.')
+    parser.add_argument('-t', '--templates', action='append', default=[],
+                        metavar='FOLDER',
+                        help='Folder containing the templates used by the '
+                             'sequence (can be repeated).')
+    parser.add_argument('-m', '--manifest', action='append', default=[],
+                        metavar='MODULE:NAME',
+                        help='Additional manifest contributing items, shapes '
+                             'or contexts (can be repeated).')
+    parser.add_argument('-v', '--var', action='append', default=[],
+                        type=parse_assignment, metavar='NAME=VALUE',
+                        help='Value of an external variable (can be '
+                             'repeated).')
+    parser.add_argument('--vars-file',
+                        help='JSON file containing the values of the external '
+                             'variables or a list of such mappings.')
+    parser.add_argument('-s', '--sweep', action='append', default=[],
+                        type=parse_assignment, metavar='NAME=VALUES',
+                        help='List of values of an external variable to '
+                             'compile (can be repeated).')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Do not print the timings.')
+    return parser
+
+
+def main(argv=None):
+    """Compile a sequence for all the requested points.
+
+    Returns
+    -------
+    code : int
+        0 if all the points were compiled, 1 otherwise.
+
+    """
+    args = build_parser().parse_args(argv)
+
+    def log(msg):
+        if not args.quiet:
+            print(msg)
+
+    # Import the machinery only once the arguments are known to be valid.
+    from exopy.utils.declarator import import_and_get
+    from .headless import HeadlessManager, list_extension_manifests, \
+        compile_sequence
+    from .utils.sequences_io import load_sequence_prefs
+
+    start = perf_counter()
+    manifests = list_extension_manifests()
+    for path in args.manifest:
+        tb = {}
+        module, _, attr = path.partition(':')
+        manifest = import_and_get(module, attr, tb, path)
+        if manifest is None:
+            print(tb[path], file=sys.stderr)
+            return 1
+        manifests.append(manifest)
+
+    manager = HeadlessManager()
+    manager.load_declarations(manifests)
+    manager.add_templates_folders(args.templates)
+
+    config, _ = load_sequence_prefs(args.sequence)
+    sequence, errors = manager.build_sequence(config)
+    if sequence is None:
+        print('Failed to build the sequence :\n' + pformat(errors),
+              file=sys.stderr)
+        return 1
+    log('Loaded sequence in {:.1f} ms'.format((perf_counter() - start)*1e3))
+
+    points = build_points(args.var, args.vars_file, args.sweep)
+    name = os.path.basename(args.sequence)
+    if name.endswith(SEQUENCE_EXT):
+        name = name[:-len(SEQUENCE_EXT)]
+    os.makedirs(args.output, exist_ok=True)
+
+    failed = 0
+    for i, point in enumerate(points):
+        buffers, timings, errors = compile_sequence(sequence, point)
+        if buffers is None:
+            failed += 1
+            print('Failed to compile point {} {} :\n{}'
+                  .format(i, point, pformat(errors)), file=sys.stderr)
+            continue
+
+        start = perf_counter()
+        p_name = name if len(points) == 1 else '{}_{}'.format(name, i)
+        path = save_buffers(os.path.join(args.output, p_name), buffers,
+                            args.format)
+        timings['save'] = perf_counter() - start
+        log('{} : '.format(path) +
+            ', '.join('{} {:.1f} ms'.format(k, v*1e3)
+                      for k, v in timings.items()))
+
+    if len(points) > 1:
+        with open(os.path.join(args.output, name + '_points.json'), 'w') as f:
+            json.dump(points, f, indent=2, default=repr)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,7 +22,7 @@ from exopy.utils.atom_util import update_members_from_preferences
 from .base_config import AbstractConfig
 from ..contexts.template_context import TemplateContext
 from ..sequences.base_sequences import BaseSequence
-from ..sequences.template_sequence import TemplateSequence
+from ..sequences.template_sequence import TemplateSequence, DEP_TYPE
 from ..pulse import Pulse
 
 
@@ -40,6 +40,9 @@ class TemplateConfig(AbstractConfig):
     and to give a mapping between the contexts channels.
 
     """
+    #: Id of the template to insert.
+    template_id = Str()
+
     #: Name of the sequence used to make the sequence easier to read.
     template_name = Str()
 
@@ -68,22 +71,27 @@ class TemplateConfig(AbstractConfig):
         """ Build sequence using the selected template.
 
         """
-        config = deepcopy(self.template_config)
-
-        #: Here we set the item id of the "root" of the sequence (that needed
-        #: to collect the right dependency). If we are NOT merging, then the
-        #: template will be added as a TemplateSequence (and therefore we need
-        #: a TemplateSequence as dependecy). If we ARE merging , then the root
-        #: is a BaseSequence holding everything and we must collect it.
+        #: If we are NOT merging, the template is added as a TemplateSequence
+        #: relying on the body of the template shared by all the sequences
+        #: using it.
         if not self.merge:
-            config['item_id'] = "exopy_pulses.__template__"
-        else:
-            config['item_id'] = "exopy_pulses.BaseSequence"
-
-        #: Set the rest of the config variables that are needed.
+            body, errors = self.manager.get_template_body(self.template_id)
+            if body is None:
+                msg = 'Failed to build the template :\n%s'
+                self.errors['dependencies'] = msg % pformat(errors)
+                return None
+
+            config = {'item_id': 'exopy_pulses.__template__',
+                      'template_id': self.template_id,
+                      'name': self.template_name}
+            return TemplateSequence.build_from_config(
+                config, {DEP_TYPE: {self.template_id: body}})
+
+        #: If we ARE merging, then the root is a BaseSequence holding
+        #: everything and we must collect it.
+        config = deepcopy(self.template_config)
+        config['item_id'] = "exopy_pulses.BaseSequence"
         config['name'] = self.template_name
-        config['template_id'] = '__template__'
-        config['template_doc'] = self.template_doc
 
         #: Collect Dependencies
         core = self.manager.workbench.get_plugin('enaml.workbench.core')
@@ -105,30 +113,19 @@ class TemplateConfig(AbstractConfig):
         #: Shorthand
         build_dep = cont.dependencies
 
-        if not self.merge:
-            seq = TemplateSequence.build_from_config(config, build_dep)
-            return seq
-
+        t_vars = literal_eval(config.pop('template_vars'))
+        if not self.t_vars_as_root:
+            loc_vars = literal_eval(config['local_vars'])
+            loc_vars.update(t_vars)
+            config['local_vars'] = repr(loc_vars)
         else:
-            t_vars = literal_eval(config.pop('template_vars'))
-            if not self.t_vars_as_root:
-                loc_vars = literal_eval(config['local_vars'])
-                loc_vars.update(t_vars)
-                config['local_vars'] = repr(loc_vars)
-            else:
-                self.root.external_vars.update(t_vars)
-
-            # Don't want to alter the dependencies dict in case somebody else
-            # use the same template.
-            t_config = deepcopy(config)
-            t_config.merge(config)
-            config = t_config
+            self.root.external_vars.update(t_vars)
 
-            seq = BaseSequence.build_from_config(t_config, build_dep)
+        seq = BaseSequence.build_from_config(config, build_dep)
 
-            self._apply_mapping(seq)
+        self._apply_mapping(seq)
 
-            return seq
+        return seq
 
     # --- Private API ---------------------------------------------------------
 
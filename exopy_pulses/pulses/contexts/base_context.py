@@ -9,10 +9,23 @@
 """Definition of the interface for base pulse sequence context.
 
 """
-from atom.api import (Enum, Str, Bool, Float, Property, Tuple, List,
-                      Constant)
+import os
+import asyncio
+import logging
+import weakref
+from uuid import uuid4
+from hashlib import sha1
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from atom.api import (Atom, Enum, Str, Bool, Float, Int, Property, Tuple,
+                      List, Dict, Constant, Value)
 
 from ..utils.entry_eval import HasEvaluableFields
+from ..utils.loops import find_loops
+from ..utils.segments import SparseChannel, WaveformLibrary
+from .transfer import TransferPipeline
 
 DEP_TYPE = 'exopy.pulses.context'
 
@@ -24,6 +37,39 @@ TIME_CONVERSION = {'s': {'s': 1, 'ms': 1e3, 'mus': 1e6, 'ns': 1e9},
                    'ns': {'s': 1e-9, 'ms': 1e-6, 'mus': 1e-3, 'ns': 1}}
 
 
+def hash_waveform(waveform):
+    """Compute a hash identifying the content of a waveform.
+
+    """
+    waveform = np.ascontiguousarray(waveform)
+    return (waveform.dtype.str, len(waveform), sha1(waveform).hexdigest())
+
+
+class LocalSettings(Atom):
+    """Settings of the contexts specific to the machine compiling sequences.
+
+    They are not saved with the sequences and are set by the pulses plugin
+    from its preferences.
+
+    """
+    #: Folder in which the rendered waveforms are stored as memory mapped npy
+    #: files. If empty the waveforms are kept in memory.
+    buffers_folder = Str()
+
+    #: Number of samples rendered at once when writing memory mapped
+    #: waveforms.
+    buffers_chunk_size = Int(2**20)
+
+    #: Address of a local compilation server (see pulses.server) to which
+    #: the compilation is delegated. If empty the sequences are compiled
+    #: locally.
+    compilation_server = Str()
+
+
+#: Settings used as defaults by all the contexts.
+LOCAL_SETTINGS = LocalSettings()
+
+
 class BaseContext(HasEvaluableFields):
     """Base class describing a Context
 
@@ -52,6 +98,22 @@ class BaseContext(HasEvaluableFields):
     #: List of logical channels defined by this context
     logical_channels = Tuple()
 
+    #: Whether the context can transfer loops built by detect_loops.
+    supports_loops = Bool(False)
+
+    #: Whether the context can compile a sequence independently of its
+    #: transfer (see compile_sequence and transfer_compiled_sequence).
+    supports_precompilation = Bool(False)
+
+    #: Whether the context can transfer several variants of a sequence as a
+    #: sequence table (see compile_and_transfer_table).
+    supports_sequence_table = Bool(False)
+
+    #: Whether the context implements the asynchronous transfer hooks
+    #: (transfer_channel_async and finalize_transfer_async) used by
+    #: compile_and_transfer_sequence_async.
+    supports_async_transfer = Bool(False)
+
     #: List of logical channels whose meaning should be inverted.
     inverted_log_channels = List().tag(pref=True)
 
@@ -66,6 +128,30 @@ class BaseContext(HasEvaluableFields):
     #: Name of the context class. Used for persistence purposes.
     context_id = Str().tag(pref=True)
 
+    #: Folder in which the rendered waveforms are stored as memory mapped npy
+    #: files. If empty the waveforms are kept in memory. Defaults to the
+    #: value of LOCAL_SETTINGS and is not saved with the sequence.
+    buffers_folder = Str()
+
+    #: Number of samples rendered at once when writing memory mapped
+    #: waveforms. Defaults to the value of LOCAL_SETTINGS.
+    buffers_chunk_size = Int()
+
+    #: Address of a local compilation server (see pulses.server) to which
+    #: the compilation is delegated, either the path of a Unix socket or
+    #: host:port. If empty the sequences are compiled locally. Defaults to
+    #: the value of LOCAL_SETTINGS and is not saved with the sequence.
+    compilation_server = Str()
+
+    #: Hashes of the waveforms currently loaded on the instrument by channel.
+    #: Updated by mark_loaded.
+    loaded_hashes = Dict()
+
+    #: Hashes of the segments currently loaded on the instrument by channel,
+    #: as a dict mapping the start of each segment to its hash. Updated by
+    #: mark_loaded.
+    loaded_segments = Dict()
+
     def compile_and_transfer_sequence(self, sequence, driver=None):
         """Compile the pulse sequence and send it to the instruments.
 
@@ -74,6 +160,12 @@ class BaseContext(HasEvaluableFields):
         it can call the preprocess_sequence method to carry out those two
         operations.
 
+        Contexts should implement this method, unless they support the
+        asynchronous transfer (see supports_async_transfer) in which case the
+        base implementation runs compile_and_transfer_sequence_async in a new
+        event loop. If an event loop is already running in the calling
+        thread, the new loop is run in a worker thread.
+
         Parameters
         ----------
         sequence : RootSequence
@@ -96,6 +188,245 @@ class BaseContext(HasEvaluableFields):
         errors : dict
             Errors that occured during compilation.
 
+        """
+        if not self.supports_async_transfer:
+            raise NotImplementedError()
+
+        coroutine = self.compile_and_transfer_sequence_async(sequence, driver)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    async def compile_and_transfer_sequence_async(self, sequence,
+                                                  driver=None):
+        """Compile the pulse sequence and send it to the instruments.
+
+        If the context supports the asynchronous transfer, the channels are
+        rendered concurrently in worker threads and each channel is
+        transferred as soon as it is ready, using transfer_channel_async,
+        while the others are still being rendered. If a compilation server is
+        set, all the channels are rendered by the server before being
+        transferred. Once all channels are transferred,
+        finalize_transfer_async is awaited to collect the infos about the
+        sequence.
+
+        Otherwise compile_and_transfer_sequence is run in a worker thread.
+
+        Parameters
+        ----------
+        sequence : RootSequence
+            Sequence to compile and transfer.
+
+        driver : object, optional
+            Instrument driver to use to transfer the sequence once compiled.
+            If absent the channels are only rendered.
+
+        Returns
+        -------
+        result : bool
+            Whether the compilation succeeded.
+
+        infos : dict
+            Infos about the transferred and compiled sequence. The keys
+            should match the ones listed in sequence_infos_keys.
+
+        errors : dict
+            Errors that occured during compilation.
+
+        """
+        loop = asyncio.get_running_loop()
+        if not self.supports_async_transfer:
+            return await loop.run_in_executor(
+                None, self.compile_and_transfer_sequence, sequence, driver)
+
+        compiled = None
+        if self.compilation_server:
+            compiled = await loop.run_in_executor(None,
+                                                  self._compile_remotely,
+                                                  sequence)
+        if compiled is not None:
+            res, buffers, errors = compiled
+            if not res:
+                return False, {}, errors
+            if driver is not None:
+                for channel, waveform in buffers.items():
+                    await self.transfer_channel_async(channel, waveform,
+                                                      driver)
+            infos = await self.finalize_transfer_async(sequence, driver)
+            return True, infos, {}
+
+        items, errors = self.preprocess_sequence(sequence)
+        if errors:
+            return False, {}, errors
+
+        duration = sequence.duration if sequence.time_constrained else None
+        renders = [loop.run_in_executor(None, self.render_channel, items, ch,
+                                        duration)
+                   for ch in self.analogical_channels + self.logical_channels]
+        for render in asyncio.as_completed(renders):
+            channel, waveform = await render
+            if driver is not None:
+                await self.transfer_channel_async(channel, waveform, driver)
+
+        infos = await self.finalize_transfer_async(sequence, driver)
+        return True, infos, {}
+
+    async def transfer_channel_async(self, channel, waveform, driver):
+        """Transfer the waveform of a channel to the instrument.
+
+        Parameters
+        ----------
+        channel : unicode
+            Name of the channel.
+
+        waveform : ndarray
+            Rendered waveform of the channel (see render_sequence).
+
+        driver : object
+            Instrument driver to use to transfer the waveform.
+
+        """
+        raise NotImplementedError()
+
+    async def finalize_transfer_async(self, sequence, driver):
+        """Finish the transfer once all the channels have been transferred.
+
+        Parameters
+        ----------
+        sequence : RootSequence
+            Sequence which was compiled.
+
+        driver : object or None
+            Instrument driver used for the transfer, None if the sequence was
+            only compiled.
+
+        Returns
+        -------
+        infos : dict
+            Infos about the transferred and compiled sequence. The keys
+            should match the ones listed in sequence_infos_keys.
+
+        """
+        return {}
+
+    def compile_sequence(self, sequence):
+        """Compile a sequence without transferring it.
+
+        This is used to compile a sequence ahead of time (for example in a
+        background thread) on a copy of the sequence. The base implementation
+        evaluates, simplifies and renders the sequence, or delegates those
+        steps to the compilation server if one is set.
+
+        Parameters
+        ----------
+        sequence : RootSequence
+            Sequence to compile.
+
+        Returns
+        -------
+        result : bool
+            Whether the compilation succeeded.
+
+        compiled : object
+            Compiled sequence which can be passed to
+            transfer_compiled_sequence.
+
+        errors : dict
+            Errors that occured during compilation.
+
+        """
+        if self.compilation_server:
+            compiled = self._compile_remotely(sequence)
+            if compiled is not None:
+                return compiled
+
+        items, errors = self.preprocess_sequence(sequence)
+        if errors:
+            return False, None, errors
+
+        duration = sequence.duration if sequence.time_constrained else None
+        return True, self.render_sequence(items, duration), {}
+
+    def transfer_compiled_sequence(self, compiled, driver):
+        """Transfer a sequence compiled by compile_sequence.
+
+        Contexts supporting this should set supports_precompilation to True.
+
+        Parameters
+        ----------
+        compiled : object
+            Compiled sequence as returned by compile_sequence.
+
+        driver : object
+            Instrument driver to use to transfer the sequence.
+
+        Returns
+        -------
+        result : bool
+            Whether the transfer succeeded.
+
+        infos : dict
+            Infos about the transferred sequence. The keys should match the
+            ones listed in sequence_infos_keys.
+
+        errors : dict
+            Errors that occured during the transfer.
+
+        """
+        raise NotImplementedError()
+
+    def compile_and_transfer_table(self, sequence, variants, driver=None):
+        """Compile several variants of a sequence and transfer them at once.
+
+        The variants are stored on the instrument as a sequence table whose
+        entries can then be selected using select_table_entry. Contexts
+        supporting this should set supports_sequence_table to True and can
+        rely on compile_sequence_table to render the variants.
+
+        Parameters
+        ----------
+        sequence : RootSequence
+            Sequence to compile and transfer.
+
+        variants : list
+            Values of the external variables to use for each entry of the
+            table.
+
+        driver : object, optional
+            Instrument driver to use to transfer the table once compiled.
+            If absent the context should do its best to assert that the
+            compilation can succeed.
+
+        Returns
+        -------
+        result : bool
+            Whether the compilation succeeded.
+
+        infos : dict
+            Infos about the transferred and compiled sequences. The keys
+            should match the ones listed in sequence_infos_keys.
+
+        errors : dict
+            Errors that occured during compilation.
+
+        """
+        raise NotImplementedError()
+
+    def select_table_entry(self, index, driver):
+        """Select the entry of the sequence table to play.
+
+        Parameters
+        ----------
+        index : int
+            Index of the variant as passed to compile_and_transfer_table.
+
+        driver : object
+            Instrument driver to which the table was transferred.
+
         """
         raise NotImplementedError()
 
@@ -115,6 +446,10 @@ class BaseContext(HasEvaluableFields):
     def preprocess_sequence(self, sequence):
         """Evaluate and simplify a sequence in the standard way.
 
+        The items notify their new values unless the
+        suppress_evaluation_notifications flag of the sequence is set, so
+        that the views of an edited sequence are refreshed.
+
         Parameters
         ----------
         sequence : RootSequence
@@ -138,6 +473,526 @@ class BaseContext(HasEvaluableFields):
         items = sequence.simplify_sequence()
         return items, errors
 
+    def detect_loops(self, items, min_count=2, max_block=8):
+        """Detect the periodic runs of identical pulses on each channel.
+
+        Contexts supporting loops (see supports_loops) can transfer the
+        returned loops instead of each of the pulses they contain.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        min_count : int, optional
+            Minimal number of repetitions of a block to create a loop.
+
+        max_block : int, optional
+            Maximal number of pulses in a repeated block.
+
+        Returns
+        -------
+        channels : dict
+            Mapping between the channels used by the pulses and the list of
+            pulses and PulseLoop describing them, sorted by start.
+
+        """
+        return find_loops(items, self, min_count, max_block)
+
+    def compile_sequence_table(self, sequence, variants):
+        """Render several variants of a sequence, merging identical ones.
+
+        The variants are evaluated on a private copy of the sequence (see
+        RootSequence.evaluate), so that the sequence itself is left untouched.
+
+        Parameters
+        ----------
+        sequence : RootSequence
+            Sequence to render.
+
+        variants : list
+            Values of the external variables to use for each variant.
+
+        Returns
+        -------
+        table : list
+            Index in waveforms of the waveforms of each variant.
+
+        waveforms : list
+            Unique rendered waveforms as returned by render_sequence.
+
+        errors : dict
+            Errors that occured during evaluation and simplification. If
+            not empty the table is incomplete.
+
+        """
+        table = []
+        waveforms = []
+        known = {}
+        for i, variant in enumerate(variants):
+            result = sequence.evaluate(variant)
+            if not result.success:
+                errors = dict(result.errors)
+                if result.missings:
+                    msg = 'The following variables were never computed : %s'
+                    errors['Unknown variables'] = msg % set(result.missings)
+                return table, waveforms, {'variant_%d' % i: errors}
+
+            # Each variant is rendered in its own files (if any) so that
+            # the waveforms of the previous ones are preserved.
+            buffers = self.render_sequence(list(result.simplified),
+                                           result.duration)
+            key = tuple((ch, hash_waveform(b))
+                        for ch, b in sorted(buffers.items()))
+            if key not in known:
+                known[key] = len(waveforms)
+                waveforms.append(buffers)
+            table.append(known[key])
+
+        return table, waveforms, {}
+
+    def render_sequence(self, items, duration=None, name=None):
+        """Render the waveforms of the channels of the context.
+
+        When buffers_folder is set, the waveforms are written by chunks
+        directly into memory mapped npy files named after the sequence and
+        the channel, so that they never need to be fully in memory. Files
+        of unnamed sequences are temporary : they are removed once the
+        waveforms are not used anymore (as soon as they are mapped on POSIX
+        systems).
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        name : unicode, optional
+            Name of the sequence used to name the memory mapped files, which
+            can then be reopened using load_buffers. If absent, the files are
+            temporary and unique to this rendering.
+
+        Returns
+        -------
+        buffers : dict
+            Mapping between the name of the channels of the context and their
+            waveform. Analogical channels are float arrays in which
+            overlapping pulses are summed, logical channels are int8 arrays
+            in which the inversion of the channels is already applied.
+
+        """
+        length = self._sequence_length(items, duration)
+        if self.buffers_folder:
+            temporary = name is None
+            if temporary:
+                name = 'sequence_' + uuid4().hex
+            buffers = self._allocate_buffers(length, name, temporary)
+            chunk_size = self.buffers_chunk_size
+        else:
+            buffers = self._allocate_buffers(length)
+            chunk_size = max(length, 1)
+
+        for offset, end, active in self._iter_chunks(items, length,
+                                                     chunk_size):
+            self._render_chunk({ch: b[offset:end]
+                                for ch, b in buffers.items()},
+                               offset, end, active)
+
+        if self.buffers_folder:
+            for buffer in buffers.values():
+                buffer.flush()
+
+        return buffers
+
+    def render_channel(self, items, channel, duration=None):
+        """Render the waveform of a single channel.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        channel : unicode
+            Name of the channel to render.
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        Returns
+        -------
+        channel : unicode
+            Name of the rendered channel.
+
+        waveform : ndarray
+            Waveform of the channel (see render_sequence).
+
+        """
+        length = self._sequence_length(items, duration)
+        dtype = (np.float64 if channel in self.analogical_channels else
+                 np.int8)
+        buffers = {channel: np.zeros(length, dtype=dtype)}
+        items = [p for p in items if p.channel == channel]
+        for offset, end, active in self._iter_chunks(items, length,
+                                                     max(length, 1)):
+            self._render_chunk(buffers, offset, end, active)
+        return channel, buffers[channel]
+
+    def render_segments(self, items, duration=None, max_gap=0,
+                        split_abutting=False):
+        """Render the waveforms of the channels as sparse segments.
+
+        Only the samples covered by pulses are computed and stored, which is
+        well suited to instruments with a segment memory. The inversion of the
+        logical channels is not applied.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        max_gap : int, optional
+            Segments separated by at most this number of samples are merged.
+
+        split_abutting : bool, optional
+            Keep back to back pulses in separate segments (see
+            SparseChannel.from_pulses).
+
+        Returns
+        -------
+        channels : dict
+            Mapping between the name of the channels of the context and their
+            SparseChannel.
+
+        """
+        length = self._sequence_length(items, duration)
+        pulses = {ch: [] for ch in self.analogical_channels +
+                  self.logical_channels}
+        for pulse in items:
+            pulses[pulse.channel].append((self.len_sample(pulse.start),
+                                          pulse.waveform))
+
+        channels = {}
+        for chs, dtype in ((self.analogical_channels, np.float64),
+                           (self.logical_channels, np.int8)):
+            for ch in chs:
+                channels[ch] = SparseChannel.from_pulses(pulses[ch], length,
+                                                         dtype, max_gap,
+                                                         split_abutting)
+        return channels
+
+    def build_waveform_libraries(self, items, duration=None, max_gap=0):
+        """Deduplicate the segments of the channels into waveform libraries.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        max_gap : int, optional
+            Segments separated by at most this number of samples are merged
+            (see render_segments).
+
+        Returns
+        -------
+        libraries : dict
+            Mapping between the name of the channels of the context and their
+            WaveformLibrary.
+
+        compression_ratio : float
+            Ratio between the number of non-zero samples of all channels and
+            the number of samples stored in the libraries.
+
+        """
+        # Back to back pulses are not merged so that the library can store
+        # identical ones once and play them repeatedly.
+        segments = self.render_segments(items, duration, max_gap, True)
+        libraries = {ch: WaveformLibrary.from_channel(channel)
+                     for ch, channel in segments.items()}
+        stored = sum(len(w) for lib in libraries.values()
+                     for w in lib.waveforms)
+        played = sum(channel.nonzero_length for channel in segments.values())
+        return libraries, played / stored if stored else 1.0
+
+    def render_markers(self, items, duration=None, packed=False):
+        """Render the logical channels of the context.
+
+        The channels are built from the rising and falling edges of the
+        pulses using cumulative sums so that no per-pulse array is created.
+        The channels listed in inverted_log_channels are inverted.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        packed : bool, optional
+            Whether to pack the samples of each channel into bits (see
+            numpy.packbits), the first sample being the most significant bit
+            of the first byte.
+
+        Returns
+        -------
+        markers : dict
+            Mapping between the logical channels and their waveform as int8
+            arrays or, when packed, uint8 arrays.
+
+        """
+        length = self._sequence_length(items, duration)
+        markers = {}
+        for ch, (starts, stops) in self._logical_edges(items, length).items():
+            levels = self._levels_from_edges(starts, stops, length)
+            if ch in self.inverted_log_channels:
+                levels = ~levels
+            markers[ch] = (np.packbits(levels) if packed else
+                           levels.astype(np.int8))
+        return markers
+
+    def render_markers_bitfield(self, items, duration=None, channels=None):
+        """Render several logical channels combined into a single bitfield.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        channels : iterable, optional
+            Logical channels to combine, the first one being stored in the
+            least significant bit. By default all the logical channels of the
+            context are used.
+
+        Returns
+        -------
+        bitfield : ndarray
+            Unsigned integer array using the smallest type able to hold all
+            the channels.
+
+        """
+        channels = list(self.logical_channels if channels is None
+                        else channels)
+        if len(channels) > 64:
+            raise ValueError('Cannot combine more than 64 logical channels.')
+        dtype = next(t for t in (np.uint8, np.uint16, np.uint32, np.uint64)
+                     if np.iinfo(t).bits >= len(channels))
+
+        length = self._sequence_length(items, duration)
+        edges = self._logical_edges(items, length)
+        bitfield = np.zeros(length, dtype=dtype)
+        for i, ch in enumerate(channels):
+            levels = self._levels_from_edges(*edges[ch], length)
+            if ch in self.inverted_log_channels:
+                levels = ~levels
+            bitfield |= levels.astype(dtype) << dtype(i)
+        return bitfield
+
+    def load_buffers(self, name):
+        """Open the memory mapped waveforms rendered for a sequence.
+
+        Parameters
+        ----------
+        name : unicode
+            Name of the sequence passed to render_sequence.
+
+        Returns
+        -------
+        buffers : dict or None
+            Read-only memory mapped waveforms of the channels, None if they
+            are not all available.
+
+        """
+        if not self.buffers_folder:
+            return None
+
+        buffers = {}
+        for ch in self.analogical_channels + self.logical_channels:
+            path = self._buffer_path(name, ch)
+            if not os.path.isfile(path):
+                return None
+            buffers[ch] = np.load(path, mmap_mode='r')
+
+        return buffers
+
+    def iter_rendered_chunks(self, items, chunk_size, duration=None):
+        """Render the waveforms of the channels by chunks of fixed size.
+
+        Only the pulses intersecting a chunk are rendered when producing it,
+        so that the memory used does not depend on the length of the
+        sequence.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        chunk_size : int
+            Number of samples in each chunk. The last chunk may be shorter.
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        Returns
+        -------
+        chunks : generator
+            Generator yielding for each chunk the index of its first sample
+            and a dict mapping the channels names to their buffer (see
+            render_sequence).
+
+        """
+        length = self._sequence_length(items, duration)
+        for offset, end, active in self._iter_chunks(items, length,
+                                                     chunk_size):
+            buffers = self._allocate_buffers(end - offset)
+            self._render_chunk(buffers, offset, end, active)
+            yield offset, buffers
+
+    def transfer_by_chunks(self, items, write, chunk_size, converters=(),
+                           duration=None, max_pending=2):
+        """Render the channels by chunks and write them using a pipeline.
+
+        Rendering and writing happen in parallel while at most max_pending
+        chunks are waiting to be written.
+
+        Parameters
+        ----------
+        items : list
+            Simplified pulses as returned by preprocess_sequence.
+
+        write : callable
+            Callable writing a chunk to the instrument. It is called with the
+            index of the first sample of the chunk and the dict of converted
+            buffers.
+
+        chunk_size : int
+            Number of samples in each chunk.
+
+        converters : iterable, optional
+            Conversions to apply to each chunk (see TransferPipeline).
+
+        duration : float, optional
+            Duration of the sequence. If absent the end of the last pulse is
+            used.
+
+        max_pending : int, optional
+            Maximal number of chunks waiting to be written.
+
+        Returns
+        -------
+        stats : dict
+            Statistics about the transfer (see TransferPipeline.run).
+
+        """
+        pipeline = TransferPipeline(write=write, converters=list(converters),
+                                    max_pending=max_pending)
+        return pipeline.run(self.iter_rendered_chunks(items, chunk_size,
+                                                      duration))
+
+    def diff_channels(self, buffers):
+        """List the channels whose waveform differs from the loaded one.
+
+        Parameters
+        ----------
+        buffers : dict
+            Newly rendered waveforms of the channels (see render_sequence).
+
+        Returns
+        -------
+        channels : list
+            Channels which need to be transferred again.
+
+        """
+        return [ch for ch, buffer in buffers.items()
+                if self.loaded_hashes.get(ch) != hash_waveform(buffer)]
+
+    def diff_segments(self, channels):
+        """Find the segments which differ from the loaded ones.
+
+        Parameters
+        ----------
+        channels : dict
+            Newly rendered sparse channels (see render_segments).
+
+        Returns
+        -------
+        changed : dict
+            Mapping between the channels and the list of (start, values)
+            segments which need to be transferred. Only the channels having
+            changes are present.
+
+        removed : dict
+            Mapping between the channels and the list of the starts of the
+            loaded segments which do not exist anymore. Only the channels
+            having removed segments are present.
+
+        """
+        changed = {}
+        removed = {}
+        for ch, channel in channels.items():
+            loaded = self.loaded_segments.get(ch, {})
+            new = [(start, values) for start, values in channel.segments
+                   if loaded.get(start) != hash_waveform(values)]
+            if new:
+                changed[ch] = new
+            starts = set(start for start, _ in channel.segments)
+            gone = sorted(start for start in loaded if start not in starts)
+            if gone:
+                removed[ch] = gone
+
+        return changed, removed
+
+    def mark_loaded(self, buffers=None, segments=None):
+        """Record the waveforms successfully transferred to the instrument.
+
+        Parameters
+        ----------
+        buffers : dict, optional
+            Waveforms of the transferred channels (see render_sequence).
+
+        segments : dict, optional
+            Transferred sparse channels (see render_segments). The loaded
+            segments of those channels are replaced.
+
+        """
+        if buffers:
+            hashes = dict(self.loaded_hashes)
+            hashes.update({ch: hash_waveform(b) for ch, b in buffers.items()})
+            self.loaded_hashes = hashes
+        if segments:
+            loaded = dict(self.loaded_segments)
+            loaded.update({ch: {start: hash_waveform(values)
+                                for start, values in channel.segments}
+                           for ch, channel in segments.items()})
+            self.loaded_segments = loaded
+
+    def forget_loaded(self):
+        """Forget what is loaded on the instrument.
+
+        This should be called when the content of the instrument memory
+        becomes unknown (for example after a reset or a new connection).
+
+        """
+        self.loaded_hashes = {}
+        self.loaded_segments = {}
+
     def len_sample(self, duration):
         """Compute the number of points used to describe a lapse of time.
 
@@ -191,9 +1046,196 @@ class BaseContext(HasEvaluableFields):
     # --- Private API ---------------------------------------------------------
     # =========================================================================
 
+    #: Client used to reach the compilation server.
+    _client = Value()
+
+    def _compile_remotely(self, sequence):
+        """Compile a sequence on the compilation server.
+
+        Returns None if the server cannot be reached or rejects the
+        connection, in which case the sequence should be compiled locally.
+
+        """
+        from multiprocessing import AuthenticationError
+        from ..server import CompilationClient
+
+        client = self._client
+        if client is None or client.address != self.compilation_server:
+            if client is not None:
+                client.close()
+            client = CompilationClient(address=self.compilation_server)
+            self._client = client
+
+        try:
+            return client.compile(sequence)
+        except (OSError, AuthenticationError):
+            logger = logging.getLogger(__name__)
+            logger.warning('Failed to reach the compilation server %s, '
+                           'compiling locally.', self.compilation_server,
+                           exc_info=True)
+            return None
+
+    def _sequence_length(self, items, duration):
+        """Compute the number of samples of a sequence.
+
+        """
+        if duration is None:
+            duration = max((p.stop for p in items), default=0)
+        return self.len_sample(duration)
+
+    def _allocate_buffers(self, length, name=None, temporary=False):
+        """Create empty buffers for all the channels of the context.
+
+        If a name is provided the buffers are memory mapped files stored in
+        the buffers folder. Temporary files are removed once mapped on POSIX
+        systems and once the buffer is collected on other systems.
+
+        """
+        if name is not None:
+            os.makedirs(self.buffers_folder, exist_ok=True)
+
+        buffers = {}
+        for channels, dtype in ((self.analogical_channels, np.float64),
+                                (self.logical_channels, np.int8)):
+            for ch in channels:
+                if name is None:
+                    buffers[ch] = np.zeros(length, dtype=dtype)
+                    continue
+                path = self._buffer_path(name, ch)
+                buffers[ch] = open_memmap(path, mode='w+', dtype=dtype,
+                                          shape=(length,))
+                if temporary:
+                    if os.name == 'posix':
+                        _remove_file(path)
+                    else:
+                        weakref.finalize(buffers[ch], _remove_file, path)
+        return buffers
+
+    def _buffer_path(self, name, channel):
+        """Path of the file in which the waveform of a channel is stored.
+
+        """
+        return os.path.join(self.buffers_folder,
+                            '{}_{}.npy'.format(name, channel))
+
+    def _iter_chunks(self, items, length, chunk_size):
+        """Iterate over the chunks of a sequence and the pulses they contain.
+
+        Yields the index of the first sample of each chunk, the index of its
+        last sample (excluded) and a list of (start, length, pulse) for the
+        pulses intersecting it.
+
+        """
+        # Sort the pulses by start sample so that the pulses intersecting a
+        # chunk can be found by simply walking the list.
+        pulses = sorted(((self.len_sample(p.start),
+                          self.len_sample(p.duration), p) for p in items),
+                        key=lambda x: x[0])
+        next_pulse = 0
+        active = []
+        for offset in range(0, length, chunk_size):
+            end = min(offset + chunk_size, length)
+            while next_pulse < len(pulses) and pulses[next_pulse][0] < end:
+                active.append(pulses[next_pulse])
+                next_pulse += 1
+            active = [p for p in active if p[0] + p[1] > offset]
+            yield offset, end, active
+
+    def _render_chunk(self, buffers, offset, end, active):
+        """Render the pulses intersecting a chunk into the chunk buffers.
+
+        Logical channels are built from the edges of their pulses and the
+        inversion of the channels is applied. Only the logical channels
+        present in buffers are rendered.
+
+        """
+        edges = {ch: ([], []) for ch in self.logical_channels}
+        for p_start, p_length, pulse in active:
+            if pulse.kind != 'Analogical':
+                starts, stops = edges[pulse.channel]
+                starts.append(p_start - offset)
+                stops.append(p_start + p_length - offset)
+                continue
+            first = max(offset - p_start, 0)
+            last = min(end - p_start, p_length)
+            if last <= first:
+                continue
+            waveform = pulse.compute_waveform(first, last)
+            b_start = p_start + first - offset
+            buffers[pulse.channel][b_start:b_start + len(waveform)] += waveform
+
+        for ch, (starts, stops) in edges.items():
+            if ch not in buffers:
+                continue
+            levels = self._levels_from_edges(starts, stops, end - offset)
+            if ch in self.inverted_log_channels:
+                levels = ~levels
+            buffers[ch][:] = levels
+
+    def _logical_edges(self, items, length):
+        """Collect the rising and falling edges of the logical pulses.
+
+        Returns a dict mapping the logical channels to a tuple of arrays
+        (starts, stops) of sample indexes.
+
+        """
+        edges = {ch: ([], []) for ch in self.logical_channels}
+        for pulse in items:
+            if pulse.kind == 'Analogical':
+                continue
+            start = self.len_sample(pulse.start)
+            starts, stops = edges[pulse.channel]
+            starts.append(start)
+            stops.append(start + self.len_sample(pulse.duration))
+        return edges
+
+    @staticmethod
+    def _levels_from_edges(starts, stops, length):
+        """Compute the boolean levels of a logical channel from its edges.
+
+        Each rising edge adds one to the number of active pulses and each
+        falling edge removes one, so that the channel is high wherever the
+        cumulative sum is positive.
+
+        """
+        counts = np.zeros(length + 1, dtype=np.int32)
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, length)
+        stops = np.clip(np.asarray(stops, dtype=np.int64), 0, length)
+        np.add.at(counts, starts, 1)
+        np.add.at(counts, stops, -1)
+        return np.cumsum(counts[:-1]) > 0
+
+    def _default_buffers_folder(self):
+        """Use the folder of the local settings.
+
+        """
+        return LOCAL_SETTINGS.buffers_folder
+
+    def _default_buffers_chunk_size(self):
+        """Use the chunk size of the local settings.
+
+        """
+        return LOCAL_SETTINGS.buffers_chunk_size
+
+    def _default_compilation_server(self):
+        """Use the compilation server of the local settings.
+
+        """
+        return LOCAL_SETTINGS.compilation_server
+
     def _default_context_id(self):
         """ Default value the context class member.
 
         """
         pack, _ = self.__module__.split('.', 1)
         return pack + '.' + type(self).__name__
+
+
+def _remove_file(path):
+    """Remove a file, ignoring the failures.
+
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
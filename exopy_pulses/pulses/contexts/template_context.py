@@ -35,6 +35,10 @@ class TemplateContext(BaseContext):
     #: Reference to the template sequence to which this context is attached.
     template_sequence = Typed(TemplateSequence)
 
+    #: Those members are copied from the root context when evaluating and are
+    #: hence not part of the content of the template.
+    _hash_excluded = ('time_unit', 'rectify_time', 'tolerance')
+
     def prepare_evaluation(self, errors):
         """Copy the necessary information from the root context.
 
@@ -44,7 +48,8 @@ class TemplateContext(BaseContext):
         self.time_unit = context.time_unit
         self.rectify_time = context.rectify_time
         self.tolerance = context.tolerance
-        self.supported_sequences = context.supported_sequences
+        # The supported sequences are not copied as the items of a template
+        # are shared and hence always inlined.
         mess = 'Missing/Erroneous mapping for channels {}'
         mapping = self.channel_mapping
         c_errors = [c for c in self.analogical_channels
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Pipeline transferring rendered waveforms to an instrument by chunks.
+
+The chunks produced by a context (see BaseContext.iter_rendered_chunks) are
+converted in the calling thread and handed to a writer thread through a
+bounded queue. When the instrument link is slower than the rendering, the
+producer blocks so that only a few chunks are ever held in memory.
+
+"""
+import queue
+import threading
+from time import perf_counter
+
+import numpy as np
+from atom.api import Atom, Callable, Int, List, Value, Float, Str, Tuple
+
+
+class ConvertDtype(Atom):
+    """Convert analogical channels to the integer type used by an instrument.
+
+    """
+    #: Type in which to convert the waveforms.
+    dtype = Value(np.dtype(np.int16))
+
+    #: Factor by which to multiply the waveforms before converting them.
+    scale = Float(1.0)
+
+    #: Channels to convert. If empty all the float channels are converted.
+    channels = Tuple()
+
+    def __call__(self, offset, buffers):
+        """Convert the buffers of a chunk.
+
+        """
+        dtype = np.dtype(self.dtype)
+        if dtype.kind in 'iu':
+            info = np.iinfo(dtype)
+            bounds = (info.min, info.max)
+        for ch, buffer in buffers.items():
+            if ((self.channels and ch not in self.channels) or
+                    (not self.channels and buffer.dtype.kind != 'f')):
+                continue
+            converted = buffer * self.scale
+            if dtype.kind in 'iu':
+                converted = np.clip(np.rint(converted), *bounds)
+            buffers[ch] = converted.astype(dtype)
+        return buffers
+
+
+class MergeMarkers(Atom):
+    """Merge logical channels into the unused bits of an analogical one.
+
+    The analogical channel should already be converted to an integer type
+    (see ConvertDtype).
+
+    """
+    #: Channel in which to store the markers.
+    target = Str()
+
+    #: Logical channels to merge, the first one being stored at bit shift.
+    markers = Tuple()
+
+    #: Index of the bit in which to store the first marker.
+    shift = Int()
+
+    def __call__(self, offset, buffers):
+        """Merge the markers of a chunk.
+
+        """
+        target = buffers[self.target]
+        merged = target.view(np.dtype('u%d' % target.itemsize)).copy()
+        for i, ch in enumerate(self.markers):
+            marker = buffers.pop(ch).astype(merged.dtype)
+            merged |= marker << merged.dtype.type(self.shift + i)
+        buffers[self.target] = merged.view(target.dtype)
+        return buffers
+
+
+class TransferPipeline(Atom):
+    """Transfer chunks of waveforms using a bounded queue.
+
+    """
+    #: Callable used to write a chunk on the instrument. It is called with
+    #: the index of the first sample of the chunk and the converted buffers.
+    write = Callable()
+
+    #: Callables applied in order to the buffers of each chunk before writing
+    #: them. They are called with the offset of the chunk and its buffers and
+    #: should return the converted buffers.
+    converters = List()
+
+    #: Maximal number of chunks waiting to be written.
+    max_pending = Int(2)
+
+    def run(self, chunks):
+        """Convert and write all the chunks produced by an iterable.
+
+        Parameters
+        ----------
+        chunks : iterable
+            Iterable yielding (offset, buffers) tuples as produced by
+            BaseContext.iter_rendered_chunks.
+
+        Returns
+        -------
+        stats : dict
+            Number of chunks and samples written, total duration of the
+            transfer, time spent by the producer waiting for the writer and
+            maximal number of chunks waiting to be written.
+
+        """
+        pending = queue.Queue(self.max_pending)
+        failure = []
+        stats = {'chunks': 0, 'samples': 0, 'waiting': 0.0,
+                 'max_pending': 0}
+
+        def writer():
+            while True:
+                chunk = pending.get()
+                if chunk is None:
+                    return
+                if not failure:
+                    try:
+                        self.write(*chunk)
+                    except Exception as e:
+                        failure.append(e)
+
+        thread = threading.Thread(target=writer, daemon=True)
+        start = perf_counter()
+        thread.start()
+        try:
+            for offset, buffers in chunks:
+                if failure:
+                    break
+                for converter in self.converters:
+                    buffers = converter(offset, buffers)
+                t = perf_counter()
+                pending.put((offset, buffers))
+                stats['waiting'] += perf_counter() - t
+                stats['max_pending'] = max(stats['max_pending'],
+                                           pending.qsize())
+                stats['chunks'] += 1
+                stats['samples'] += max((len(b) for b in buffers.values()),
+                                        default=0)
+        finally:
+            pending.put(None)
+            thread.join()
+
+        if failure:
+            raise failure[0]
+
+        stats['duration'] = perf_counter() - start
+        return stats
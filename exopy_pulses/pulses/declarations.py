@@ -8,6 +8,9 @@
 # -----------------------------------------------------------------------------
 """Enaml objects used to declare sequences in a plugin manifest.
 
+The declarators only record the path to the contributed classes and views,
+those are imported when first requested from the infos.
+
 """
 from inspect import cleandoc
 
@@ -15,8 +18,7 @@ from atom.api import Str, Dict, Property, List
 from enaml.core.api import d_, d_func
 
 from exopy.utils.traceback import format_exc
-from exopy.utils.declarator import (Declarator, GroupDeclarator,
-                                    import_and_get)
+from exopy.utils.declarator import Declarator, GroupDeclarator
 from .infos import (SequenceInfos, ConfigInfos, ContextInfos, ShapeInfos)
 
 
@@ -99,31 +101,10 @@ class Sequence(Declarator):
             traceback[err_id] = msg.format(sequence, s_path)
             return
 
-        infos = SequenceInfos(metadata=self.metadata)
-
-        # Get the sequence class.
-        s_cls = import_and_get(s_path, sequence, traceback, sequence_id)
-        if s_cls is None:
-            return
-
-        try:
-            infos.cls = s_cls
-        except TypeError:
-            msg = '{} should be a subclass of AbstractSequence. \n{}'
-            traceback[sequence_id] = msg.format(s_cls, format_exc())
-            return
-
-        # Get the sequence view.
-        s_view = import_and_get(v_path, view, traceback, sequence_id)
-        if s_view is None:
-            return
-
-        try:
-            infos.view = s_view
-        except TypeError:
-            msg = '{} should be a subclass of AbstractSequenceView,.\n{}'
-            traceback[sequence_id] = msg.format(s_view, format_exc())
-            return
+        # The sequence class and view are imported on first access.
+        infos = SequenceInfos(metadata=self.metadata,
+                              cls_path=(s_path, sequence),
+                              view_path=(v_path, view))
 
         # Add group and add to collector
         infos.metadata['group'] = self.get_group()
@@ -259,31 +240,9 @@ class SequenceConfig(Declarator):
             traceback[self.id] = msg.format(s_cls, c_path)
             return
 
-        infos = ConfigInfos()
-
-        # Get the config class.
-        c_cls = import_and_get(c_path, config, traceback, self.id)
-        if c_cls is None:
-            return
-
-        try:
-            infos.cls = c_cls
-        except TypeError:
-            msg = '{} should a subclass of AbstractConfig.\n{}'
-            traceback[self.id] = msg.format(c_cls, format_exc())
-            return
-
-        # Get the config view.
-        view = import_and_get(v_path, view, traceback, self.id)
-        if view is None:
-            return
-
-        try:
-            infos.view = view
-        except TypeError:
-            msg = '{} should a subclass of AbstractConfigView.\n{}'
-            traceback[self.id] = msg.format(c_cls, format_exc())
-            return
+        # The config class and view are imported on first access.
+        infos = ConfigInfos(cls_path=(c_path, config),
+                            view_path=(v_path, view))
 
         collector.contributions[s_cls] = infos
 
@@ -410,32 +369,11 @@ class Context(Declarator):
             traceback[err_id] = msg.format(context, c_path)
             return
 
+        # The context class and view are imported on first access.
         infos = ContextInfos(metadata=self.metadata,
-                             instruments=self.instruments)
-
-        # Get the sequence class.
-        c_cls = import_and_get(c_path, context, traceback, context_id)
-        if c_cls is None:
-            return
-
-        try:
-            infos.cls = c_cls
-        except TypeError:
-            msg = '{} should be a subclass of BaseContext. \n{}'
-            traceback[context_id] = msg.format(c_cls, format_exc())
-            return
-
-        # Get the context view.
-        c_view = import_and_get(v_path, view, traceback, context_id)
-        if c_view is None:
-            return
-
-        try:
-            infos.view = c_view
-        except TypeError:
-            msg = '{} should be a subclass of BaseContextView,.\n{}'
-            traceback[context_id] = msg.format(c_view, format_exc())
-            return
+                             instruments=self.instruments,
+                             cls_path=(c_path, context),
+                             view_path=(v_path, view))
 
         # Add group and add to collector
         infos.metadata['group'] = self.get_group()
@@ -574,31 +512,10 @@ class Shape(Declarator):
             traceback[err_id] = msg.format(shape, s_path)
             return
 
-        infos = ShapeInfos(metadata=self.metadata)
-
-        # Get the sequence class.
-        s_cls = import_and_get(s_path, shape, traceback, shape_id)
-        if s_cls is None:
-            return
-
-        try:
-            infos.cls = s_cls
-        except TypeError:
-            msg = '{} should be a subclass of AbstractShape. \n{}'
-            traceback[shape_id] = msg.format(s_cls, format_exc())
-            return
-
-        # Get the shape view.
-        s_view = import_and_get(v_path, view, traceback, shape_id)
-        if s_view is None:
-            return
-
-        try:
-            infos.view = s_view
-        except TypeError:
-            msg = '{} should be a subclass of AbstractShapeView,.\n{}'
-            traceback[shape_id] = msg.format(s_view, format_exc())
-            return
+        # The shape class and view are imported on first access.
+        infos = ShapeInfos(metadata=self.metadata,
+                           cls_path=(s_path, shape),
+                           view_path=(v_path, view))
 
         # Add group and add to collector
         infos.metadata['group'] = self.get_group()
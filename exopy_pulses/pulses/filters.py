@@ -15,6 +15,7 @@ from enaml.core.api import d_func, d_
 from exopy.utils.declarator import Declarator
 
 from .item import Item
+from .infos import InfosImportError
 
 
 class SequenceFilter(Declarator):
@@ -85,7 +86,12 @@ class SubclassSequenceFilter(SequenceFilter):
         """
         sequences = []
         for name, infos in py_sequences.items():
-            if issubclass(infos.cls, self.subclass):
+            # Items whose class cannot be imported are reported when used.
+            try:
+                cls = infos.cls
+            except (InfosImportError, TypeError):
+                continue
+            if issubclass(cls, self.subclass):
                 sequences.append(name)
 
         return sequences
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Rebuild and compile sequences without starting the application.
+
+The declarations contributed to the sequences, shapes and contexts extension
+points are read directly from the manifests of the extension packages, so
+that saved sequences can be rebuilt, evaluated and rendered without a
+workbench (for example on a build server).
+
+"""
+from importlib.metadata import entry_points
+from time import perf_counter
+
+from atom.api import Atom, Dict, List
+from enaml.workbench.api import Extension
+from exopy.utils.declarator import Declarator
+from exopy.utils.traceback import format_exc
+
+from .infos import InfosImportError
+from .item import DEP_TYPE as ITEM_DEP_TYPE
+from .pulse import Pulse
+from .shapes.base_shape import DEP_TYPE as SHAPE_DEP_TYPE
+from .shapes.modulation import Modulation, DEP_TYPE as MODULATION_DEP_TYPE
+from .contexts.template_context import TemplateContext
+from .sequences.template_sequence import (TemplateBody, TemplateSequence,
+                                          DEP_TYPE as TEMPLATE_DEP_TYPE)
+from .utils.sequences_io import ID_KEYS, load_sequence_prefs
+from .utils.templates_index import list_template_files
+
+
+#: Extension points whose contributions are collected.
+SEQUENCES_POINT = 'exopy.pulses.sequences'
+SHAPES_POINT = 'exopy.pulses.shapes'
+CONTEXTS_POINT = 'exopy.pulses.contexts'
+
+
+def _iter_entry_points(group):
+    """Iterate over the installed entry points of a group.
+
+    """
+    eps = entry_points()
+    # Python < 3.10 returns a dict mapping groups to entry points.
+    if hasattr(eps, 'select'):
+        return eps.select(group=group)
+    return eps.get(group, ())
+
+
+def list_extension_manifests():
+    """List the manifests contributed by the installed extension packages.
+
+    Returns
+    -------
+    manifests : list
+        Manifest classes returned by the exopy_package_extension entry
+        points. The manifests of exopy_pulses are always included.
+
+    """
+    from .. import list_manifests
+    manifests = list_manifests()
+    for ep in _iter_entry_points('exopy_package_extension'):
+        for manifest in ep.load()():
+            if manifest not in manifests:
+                manifests.append(manifest)
+
+    return manifests
+
+
+class HeadlessManager(Atom):
+    """Minimal replacement for the pulses manager plugin.
+
+    Only the contributions required to rebuild sequences (items, shapes,
+    contexts and templates) are handled.
+
+    """
+    #: Infos of the contributed sequences.
+    sequences = Dict()
+
+    #: Infos of the contributed shapes.
+    shapes = Dict()
+
+    #: Infos of the contributed contexts.
+    contexts = Dict()
+
+    #: Paths of the known templates files.
+    templates = Dict()
+
+    #: Errors which occurred while registering the declarations.
+    errors = Dict()
+
+    def load_declarations(self, manifests=None):
+        """Register the declarations contributed by some manifests.
+
+        Parameters
+        ----------
+        manifests : list, optional
+            Manifest classes whose extensions should be inspected. By default
+            the manifests of all the installed extension packages are used.
+
+        """
+        if manifests is None:
+            manifests = list_extension_manifests()
+
+        declarators = {SEQUENCES_POINT: [], SHAPES_POINT: [],
+                       CONTEXTS_POINT: []}
+        for manifest in manifests:
+            for extension in manifest().children:
+                if (isinstance(extension, Extension) and
+                        extension.point in declarators):
+                    declarators[extension.point].extend(
+                        extension.get_children(Declarator))
+
+        for point, name in ((SEQUENCES_POINT, 'sequences'),
+                            (SHAPES_POINT, 'shapes'),
+                            (CONTEXTS_POINT, 'contexts')):
+            collector = _Collector(contributions=getattr(self, name))
+            collector.register(declarators[point], self.errors)
+            setattr(self, name, collector.contributions)
+
+    def add_templates_folders(self, folders):
+        """Make the templates stored in some folders available.
+
+        """
+        self.templates.update(list_template_files(folders))
+
+    def collect_dependencies(self, config):
+        """Collect the build dependencies of a config.
+
+        Parameters
+        ----------
+        config : dict
+            Config of the object to rebuild.
+
+        Returns
+        -------
+        dependencies : dict
+            Classes (or template bodies) needed to rebuild the config, sorted
+            by dependency type.
+
+        errors : dict
+            Objects which could not be resolved.
+
+        """
+        dependencies = {dep_type: {} for dep_type in ID_KEYS}
+        errors = {}
+        self._collect(config, dependencies, errors)
+        return dependencies, errors
+
+    def get_template_body(self, template_id):
+        """Build the body of a template, reusing the one built previously.
+
+        """
+        if template_id not in self._bodies:
+            config, doc = load_sequence_prefs(self.templates[template_id])
+            config['item_id'] = 'exopy_pulses.BaseSequence'
+            dependencies, errors = self.collect_dependencies(config)
+            if errors:
+                raise ValueError('Failed to resolve the dependencies of '
+                                 'template {} : {}'.format(template_id,
+                                                           errors))
+            body = TemplateBody.build_from_config(config, dependencies)
+            body.template_id = template_id
+            body.doc = doc
+            self._bodies[template_id] = body
+
+        return self._bodies[template_id]
+
+    def build_sequence(self, config):
+        """Rebuild a root sequence from its config.
+
+        Returns
+        -------
+        sequence : RootSequence or None
+            Rebuilt sequence or None if some dependencies could not be
+            resolved.
+
+        errors : dict
+            Errors which occurred while resolving the dependencies.
+
+        """
+        dependencies, errors = self.collect_dependencies(config)
+        if errors:
+            return None, errors
+
+        cls = dependencies[ITEM_DEP_TYPE][config[ID_KEYS[ITEM_DEP_TYPE]]]
+        return cls.build_from_config(config, dependencies), {}
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Template bodies already built.
+    _bodies = Dict()
+
+    def _resolve(self, dep_type, obj_id):
+        """Access the class (or the template body) matching an id.
+
+        """
+        if dep_type == TEMPLATE_DEP_TYPE:
+            if obj_id not in self.templates:
+                raise KeyError('Unknown template.')
+            return self.get_template_body(obj_id)
+
+        if dep_type == MODULATION_DEP_TYPE:
+            if obj_id != 'exopy_pulses.Modulation':
+                raise KeyError('Unknown modulation.')
+            return Modulation
+
+        if dep_type == ITEM_DEP_TYPE:
+            if obj_id == 'exopy_pulses.Pulse':
+                return Pulse
+            if obj_id == 'exopy_pulses.__template__':
+                return TemplateSequence
+            infos = self.sequences.get(obj_id)
+        elif dep_type == SHAPE_DEP_TYPE:
+            infos = self.shapes.get(obj_id)
+        else:
+            if obj_id == 'exopy_pulses.TemplateContext':
+                return TemplateContext
+            infos = self.contexts.get(obj_id)
+
+        if infos is None:
+            raise KeyError('Unknown {}.'.format(dep_type.rsplit('.', 1)[1]))
+        return infos.cls
+
+    def _collect(self, config, dependencies, errors):
+        """Walk a config and resolve all the dependencies it declares.
+
+        """
+        dep_type = config.get('dep_type')
+        if dep_type in ID_KEYS:
+            obj_id = config.get(ID_KEYS[dep_type])
+            if obj_id not in dependencies[dep_type]:
+                try:
+                    dependencies[dep_type][obj_id] = \
+                        self._resolve(dep_type, obj_id)
+                except KeyError as e:
+                    errors[obj_id] = e.args[0]
+                except (InfosImportError, TypeError, ValueError):
+                    errors[obj_id] = format_exc()
+
+        for value in config.values():
+            if isinstance(value, dict):
+                self._collect(value, dependencies, errors)
+
+
+def compile_sequence(sequence, external_vars=None):
+    """Evaluate, simplify and render a sequence, timing each step.
+
+    Parameters
+    ----------
+    sequence : RootSequence
+        Sequence to compile. Its context is used to render the pulses.
+
+    external_vars : dict, optional
+        Values of the external variables of the sequence to use.
+
+    Returns
+    -------
+    buffers : dict or None
+        Rendered waveform of each channel of the context, None if the
+        evaluation failed.
+
+    timings : dict
+        Duration in seconds of the evaluation, simplification and rendering.
+
+    errors : dict
+        Errors which occurred during the evaluation.
+
+    """
+    if external_vars:
+        sequence.external_vars.update(external_vars)
+
+    timings = {}
+    start = perf_counter()
+    res, missings, errors = sequence.evaluate_sequence(True)
+    timings['evaluate'] = perf_counter() - start
+    if not res:
+        if missings:
+            msg = 'The following variables were never computed : %s'
+            errors['Unknown variables'] = msg % missings
+        return None, timings, errors
+
+    start = perf_counter()
+    items = sequence.simplify_sequence()
+    timings['simplify'] = perf_counter() - start
+
+    start = perf_counter()
+    duration = sequence.duration if sequence.time_constrained else None
+    buffers = sequence.context.render_sequence(items, duration)
+    timings['render'] = perf_counter() - start
+
+    return buffers, timings, errors
+
+
+class _Collector(Atom):
+    """Collector mimicking the plugin ones for the declarators.
+
+    """
+    #: Infos registered by the declarators.
+    contributions = Dict()
+
+    #: Declarators whose registering is delayed.
+    _delayed = List()
+
+    def register(self, declarators, traceback):
+        """Register declarators, retrying the delayed ones.
+
+        """
+        for declarator in declarators:
+            declarator.register(self, traceback)
+
+        old = 0
+        while old != len(self._delayed) and self._delayed:
+            delayed = self._delayed[:]
+            old = len(delayed)
+            self._delayed = []
+            for declarator in delayed:
+                declarator.register(self, traceback)
+
+        if self._delayed:
+            msg = 'Some declarations have not been registered : {}'
+            traceback['Missing declarations'] = msg.format(self._delayed)
@@ -8,28 +8,109 @@
 # -----------------------------------------------------------------------------
 """Objects used to store filters, sequences and configs in the manager.
 
+The classes and enaml views contributed through declarators are only imported
+when first requested so that the objects can be used without a graphical
+environment and the start-up does not import all extensions.
+
 """
 import enaml
-from atom.api import Atom, Subclass, Dict, Coerced
+from atom.api import Atom, Subclass, ForwardSubclass, Dict, Coerced, Tuple
+from exopy.utils.declarator import import_and_get
 
 from .sequences.base_sequences import AbstractSequence
+from .sequences.template_sequence import TemplateSequence
 from .configs.base_config import AbstractConfig
 from .contexts.base_context import BaseContext
+from .contexts.template_context import TemplateContext
 from .shapes.base_shape import AbstractShape
 from .pulse import Pulse
 
-with enaml.imports():
-    from .sequences.views.abstract_sequence_view import AbstractSequenceView
-    from .configs.base_config_views import AbstractConfigView
-    from .shapes.views.base_shape_view import AbstractShapeView
-    from .contexts.views.base_context_view import BaseContextView
-    from .pulse_view import PulseView
+
+def abstract_sequence_view():
+    with enaml.imports():
+        from .sequences.views.abstract_sequence_view import \
+            AbstractSequenceView
+    return AbstractSequenceView
+
+
+def abstract_config_view():
+    with enaml.imports():
+        from .configs.base_config_views import AbstractConfigView
+    return AbstractConfigView
+
+
+def abstract_shape_view():
+    with enaml.imports():
+        from .shapes.views.base_shape_view import AbstractShapeView
+    return AbstractShapeView
+
+
+def base_context_view():
+    with enaml.imports():
+        from .contexts.views.base_context_view import BaseContextView
+    return BaseContextView
+
+
+def pulse_view():
+    with enaml.imports():
+        from .pulse_view import PulseView
+    return PulseView
+
+
+def template_sequence_view():
+    with enaml.imports():
+        from .sequences.views.template_view import TemplateSequenceView
+    return TemplateSequenceView
+
+
+def template_context_view():
+    with enaml.imports():
+        from .contexts.views.template_context_view import TemplateContextView
+    return TemplateContextView
+
+
+class InfosImportError(Exception):
+    """Raised when the class or the view of an infos cannot be imported.
+
+    """
+    pass
+
+
+class LazyInfos(Atom):
+    """Base class for infos whose class and view are imported on first access.
+
+    Subclasses should use _import to compute the default value of their cls
+    and view members. Importing a class or a view which does not exist raises
+    an InfosImportError and one which does not have the right type a
+    TypeError.
+
+    """
+    #: Path of the module defining the class and name of the class.
+    cls_path = Tuple()
+
+    #: Path of the module defining the view and name of the view.
+    view_path = Tuple()
+
+    def _import(self, member):
+        """Import the object whose path is stored in member_path.
+
+        """
+        path = getattr(self, member + '_path')
+        if not path:
+            raise InfosImportError('No path specified for the %s' % member)
+
+        traceback = {}
+        obj = import_and_get(path[0], path[1], traceback, member)
+        if obj is None:
+            raise InfosImportError(traceback[member])
+
+        return obj
 
 
 # HINT : the notion of dependencies is currently unused but there in case
 # we need it
 
-class ObjectDependentInfos(Atom):
+class ObjectDependentInfos(LazyInfos):
     """ Base info object for everything with dependencies.
 
     """
@@ -45,12 +126,18 @@ class SequenceInfos(ObjectDependentInfos):
     cls = Subclass(AbstractSequence)
 
     #: Widget associated with this sequence.
-    view = Subclass(AbstractSequenceView)
+    view = ForwardSubclass(abstract_sequence_view)
 
     #: Metadata associated with this sequence such as group, looping
     #: capabilities, etc
     metadata = Dict()
 
+    def _default_cls(self):
+        return self._import('cls')
+
+    def _default_view(self):
+        return self._import('view')
+
 
 class PulseInfos(ObjectDependentInfos):
     """An object used to store the informations about a pulse.
@@ -60,14 +147,20 @@ class PulseInfos(ObjectDependentInfos):
     cls = Subclass(Pulse)
 
     #: Widget associated with this pulse.
-    view = Subclass(PulseView)
+    view = ForwardSubclass(pulse_view)
 
     #: Metadata associated with this sequence such as group, looping
     #: capabilities, etc
     metadata = Dict()
 
+    def _default_cls(self):
+        return Pulse
 
-class ConfigInfos(Atom):
+    def _default_view(self):
+        return pulse_view()
+
+
+class ConfigInfos(LazyInfos):
     """An object used to store the informations about a sequence configurer.
 
     """
@@ -75,18 +168,25 @@ class ConfigInfos(Atom):
     cls = Subclass(AbstractConfig)
 
     #: Widget associated with this configurer.
-    view = Subclass(AbstractConfigView)
+    view = ForwardSubclass(abstract_config_view)
+
+    def _default_cls(self):
+        return self._import('cls')
+
+    def _default_view(self):
+        return self._import('view')
 
 
 class ContextInfos(ObjectDependentInfos):
-    """Object used to store informations about a Context, declared in a manifest.
+    """Object used to store informations about a Context, declared in a
+    manifest.
 
     """
     #: Class representing this context.
     cls = Subclass(BaseContext)
 
     #: Widget associated with this context.
-    view = Subclass(BaseContextView)
+    view = ForwardSubclass(base_context_view)
 
     #: List of instrument supported by this context.
     instruments = Coerced(set, ())
@@ -94,6 +194,12 @@ class ContextInfos(ObjectDependentInfos):
     #: Metadata associated with this context such as who knows what.
     metadata = Dict()
 
+    def _default_cls(self):
+        return self._import('cls')
+
+    def _default_view(self):
+        return self._import('view')
+
 
 class ShapeInfos(ObjectDependentInfos):
     """Object used to store informations about a shape.
@@ -103,7 +209,35 @@ class ShapeInfos(ObjectDependentInfos):
     cls = Subclass(AbstractShape)
 
     #: Widget associated with this Shape.
-    view = Subclass(AbstractShapeView)
+    view = ForwardSubclass(abstract_shape_view)
 
     #: Metadata associated with this shape such as I have no idea what.
     metadata = Dict()
+
+    def _default_cls(self):
+        return self._import('cls')
+
+    def _default_view(self):
+        return self._import('view')
+
+
+class TemplateSequenceInfos(SequenceInfos):
+    """Infos of a template sequence whose view is imported on first access.
+
+    """
+    def _default_cls(self):
+        return TemplateSequence
+
+    def _default_view(self):
+        return template_sequence_view()
+
+
+class TemplateContextInfos(ContextInfos):
+    """Infos of the template context whose view is imported on first access.
+
+    """
+    def _default_cls(self):
+        return TemplateContext
+
+    def _default_view(self):
+        return template_context_view()
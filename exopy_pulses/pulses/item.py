@@ -236,6 +236,20 @@ class Item(HasEvaluableFields):
         pack, _ = self.__module__.split('.', 1)
         return pack + '.' + type(self).__name__
 
+    def _evaluation_state(self):
+        """Add the timing of the item to the evaluation state.
+
+        """
+        state = super(Item, self)._evaluation_state()
+        state.update(start=self.start, stop=self.stop, duration=self.duration)
+        return state
+
+    def _hash_parent(self):
+        """Items invalidate the content hash of their parent sequence.
+
+        """
+        return self.parent if self.parent is not None else self._hash_owner
+
     def _post_setattr_root(self, old, new):
         """Make sure that all children get all the info they need to behave
         correctly when the item get its root parent.
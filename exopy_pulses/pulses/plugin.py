@@ -12,27 +12,28 @@ objects : sequences, shapes, configs, contexts
 """
 import os
 import logging
-import enaml
+from threading import Lock, Thread, current_thread, main_thread
 
 from watchdog.observers import Observer
-from atom.api import (Dict, List, Str, Typed, ForwardTyped)
+from atom.api import (Bool, Dict, Int, List, Str, Typed, ForwardTyped,
+                      Value)
+from enaml.application import Application, deferred_call
 from exopy.utils.plugin_tools import (HasPreferencesPlugin,
                                       ExtensionsCollector,
                                       DeclaratorsCollector)
-from exopy.utils.watchdog import SystematicFileUpdater
+from exopy.utils.traceback import format_exc
 
-from .pulse import Pulse
 from .filters import SequenceFilter
 from .utils.sequences_io import load_sequence_prefs
+from .utils.templates_index import (TemplatesIndex, TemplatesUpdater,
+                                    TEMPLATE_EXT, list_template_files)
 from .declarations import (Sequence, Sequences, SequenceConfig,
                            SequenceConfigs, Contexts, Context, Shapes, Shape)
 from .shapes.modulation import Modulation
-from .infos import SequenceInfos, PulseInfos
-from .sequences.template_sequence import TemplateSequence
-
-with enaml.imports():
-    from .pulse_view import PulseView
-    from .sequences.views.template_view import TemplateSequenceView
+from .infos import (SequenceInfos, PulseInfos, TemplateSequenceInfos,
+                    TemplateContextInfos, InfosImportError)
+from .sequences.template_sequence import TemplateBody
+from .contexts.base_context import LOCAL_SETTINGS
 
 
 FILTERS_POINT = 'exopy.pulses.filters'
@@ -79,6 +80,20 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
     #: Reference to the workspace state.
     workspace_state = ForwardTyped(workspace_state)
 
+    #: Folder in which the contexts store the rendered waveforms as memory
+    #: mapped files. If empty the waveforms are kept in memory.
+    buffers_folder = Str().tag(pref=True)
+
+    #: Number of samples rendered at once by the contexts when writing memory
+    #: mapped waveforms.
+    buffers_chunk_size = Int(2**20).tag(pref=True)
+
+    #: Address on which to run a compilation server shared with the other
+    #: applications running on the machine (see pulses.server). The contexts
+    #: delegate the compilation to the server found at this address. If empty
+    #: no server is started.
+    compilation_server = Str().tag(pref=True)
+
     def start(self):
         """ Start the plugin life-cycle.
 
@@ -129,6 +144,14 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
                                             point=SHAPES_POINT,
                                             ext_class=(Shapes, Shape))
 
+        # Known templates are first taken from the index saved during the
+        # last session, the folders are then scanned to take into account the
+        # changes (the modified templates being read in the background).
+        self._templates_index = TemplatesIndex(
+            path=os.path.join(p_dir, 'templates_index.json'))
+        self._templates_index.load()
+        self._refresh_template_sequences_infos()
+
         # Bind the observers before starting the collectors so that they will
         # update the lists of known seq, configs, filters, contexts...
         self._bind_observers()
@@ -139,10 +162,14 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
         self._contexts.start()
         self._shapes.start()
 
-        # Populate the Pulse Info Object
+        # Populate the Pulse Info Object (the view is imported on first
+        # access).
         self._pulse_infos = PulseInfos()
-        self._pulse_infos.cls = Pulse
-        self._pulse_infos.view = PulseView
+
+        self._refresh_known_template_sequences(background=True)
+
+        if self.compilation_server:
+            self.start_compilation_server()
 
         core.invoke_command('exopy.app.errors.exit_error_gathering')
 
@@ -154,7 +181,13 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
 
         """
         super(PulsesManagerPlugin, self).stop()
+        self.stop_compilation_server()
         self._unbind_observers()
+        if self._templates_scanner is not None:
+            self._templates_scanner.join()
+            self._templates_scanner = None
+        self._templates_changed = set()
+        self._templates_dirty = False
         self._template_sequences_data.clear()
         self._template_sequences_infos.clear()
 
@@ -165,6 +198,43 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
         self._contexts.stop()
         self._shapes.stop()
 
+    def start_compilation_server(self):
+        """Start the compilation server on the address set in the preferences.
+
+        Returns
+        -------
+        started : bool
+            Whether the server was started. If the address is already in use,
+            the server of another application is assumed to be running.
+
+        """
+        from .server import CompilationServer
+
+        self.stop_compilation_server()
+        server = CompilationServer(address=self.compilation_server)
+        logger = logging.getLogger(__name__)
+        try:
+            server.start()
+        except (ValueError, PermissionError) as e:
+            logger.error('Did not start a compilation server on %s : %s',
+                         self.compilation_server, e)
+            return False
+        except OSError:
+            logger.info('Did not start a compilation server on %s as the '
+                        'address is already in use.', self.compilation_server)
+            return False
+
+        self._compilation_server = server
+        return True
+
+    def stop_compilation_server(self):
+        """Stop the compilation server if it was started by this plugin.
+
+        """
+        if self._compilation_server is not None:
+            self._compilation_server.stop()
+            self._compilation_server = None
+
     def get_item_infos(self, item_id):
         """Give access to an item infos.
 
@@ -181,26 +251,80 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
             The required item infos or None if it was not found.
 
         """
+        self._wait_templates_scan()
         if item_id == "exopy_pulses.Pulse":
             return self._pulse_infos
         if item_id in self._sequences.contributions:
             return self._sequences.contributions[item_id]
         elif item_id in self._template_sequences_infos:
             t_info = self._template_sequences_infos[item_id]
+            # The body of the template is only parsed when first needed and
+            # is then shared by all the users of the infos.
             if not t_info.metadata['loaded']:
                 config, doc = load_sequence_prefs(t_info.metadata['path'])
+                # The body of a template is built as a simple sequence.
+                config['item_id'] = 'exopy_pulses.BaseSequence'
                 t_info.metadata['template_config'] = config
                 t_info.metadata['template_doc'] = doc
                 t_info.metadata['loaded'] = True
             return t_info
         elif item_id == "exopy_pulses.__template__":
-            infos = SequenceInfos()
-            infos.cls = TemplateSequence
-            infos.view = TemplateSequenceView
-            return infos
+            return TemplateSequenceInfos()
         else:
             return None
 
+    def get_template_body(self, template_id):
+        """Access the body of a template, building it on first access.
+
+        The body is shared by all the template sequences relying on the
+        template.
+
+        Parameters
+        ----------
+        template_id : unicode
+            Id of the template whose body should be returned.
+
+        Returns
+        -------
+        body : TemplateBody or None
+            Body of the template or None if it could not be built.
+
+        errors : dict
+            Errors which occured when building the body.
+
+        """
+        self._wait_templates_scan()
+        if template_id not in self._template_sequences_infos:
+            return None, {template_id: 'Unknown template.'}
+
+        metadata = self.get_item_infos(template_id).metadata
+        if 'template_body' not in metadata:
+            config = metadata['template_config']
+            core = self.workbench.get_plugin('enaml.workbench.core')
+            cmd = 'exopy.app.dependencies.analyse'
+            cont = core.invoke_command(cmd, {'obj': config})
+            if cont.errors:
+                return None, cont.errors
+
+            cmd = 'exopy.app.dependencies.collect'
+            cont = core.invoke_command(cmd,
+                                       {'kind': 'build',
+                                        'dependencies': cont.dependencies})
+            if cont.errors:
+                return None, cont.errors
+
+            try:
+                body = TemplateBody.build_from_config(config,
+                                                      cont.dependencies)
+            except Exception:
+                return None, {template_id: format_exc()}
+
+            body.template_id = template_id
+            body.doc = metadata['template_doc']
+            metadata['template_body'] = body
+
+        return metadata['template_body'], {}
+
     def get_item(self, item_id, view=False):
         """Access a given item class.
 
@@ -223,10 +347,7 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
 
         """
         infos = self.get_item_infos(item_id)
-        if not infos:
-            return None if not view else (None, None)
-        else:
-            return infos.cls if not view else (infos.cls, infos.view)
+        return self._access_infos(infos, SEQUENCES_POINT, item_id, view)
 
     def get_items(self, item_ids):
         """Access the classes associated to a set of items.
@@ -271,6 +392,8 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
             found.
 
         """
+        if context_id == 'exopy_pulses.TemplateContext':
+            return TemplateContextInfos()
         return self._contexts.contributions.get(context_id)
 
     def get_context(self, context_id, view=False):
@@ -295,10 +418,7 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
 
         """
         infos = self.get_context_infos(context_id)
-        if not infos:
-            return None if not view else (None, None)
-        else:
-            return infos.cls if not view else (infos.cls, infos.view)
+        return self._access_infos(infos, CONTEXTS_POINT, context_id, view)
 
     def get_shape_infos(self, shape_id):
         """ Give access to a shape infos.
@@ -340,10 +460,7 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
 
         """
         infos = self.get_shape_infos(shape_id)
-        if not infos:
-            return None if not view else (None, None)
-        else:
-            return infos.cls if not view else (infos.cls, infos.view)
+        return self._access_infos(infos, SHAPES_POINT, shape_id, view)
 
     # TODO for future easiness of extension
     # Note that the pulse view should be updated too
@@ -380,13 +497,20 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
         of the returned config object.
 
         """
+        self._wait_templates_scan()
         templates = self._template_sequences_data
         if sequence_id in templates:
             config_infos = self._configs.contributions['__template__']
-            conf_cls = config_infos.cls
-            conf_view = config_infos.view
-            t_config, t_doc = load_sequence_prefs(templates[sequence_id])
+            conf_cls, conf_view = self._access_infos(config_infos,
+                                                     CONFIGS_POINT,
+                                                     '__template__', True)
+            if conf_cls is None:
+                return None, None
+            t_metadata = self.get_item_infos(sequence_id).metadata
+            t_config = t_metadata['template_config']
+            t_doc = t_metadata['template_doc']
             conf = conf_cls(manager=self,
+                            template_id=sequence_id,
                             template_config=t_config,
                             template_doc=t_doc,
                             root=self.workspace.state.sequence)
@@ -397,11 +521,15 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
             configs = self._configs.contributions
             # Look up the hierarchy of the selected sequence to get the
             # appropriate SequenceConfig
-            sequence_class = self._sequences.contributions[sequence_id].cls
+            sequence_class = self.get_item(sequence_id)
+            if sequence_class is None:
+                return None, None
             for i_class in type.mro(sequence_class):
                 if i_class in configs:
-                    conf_cls = configs[i_class].cls
-                    conf_view = configs[i_class].view
+                    conf_cls, conf_view = self._access_infos(
+                        configs[i_class], CONFIGS_POINT, sequence_id, True)
+                    if conf_cls is None:
+                        return None, None
                     conf = conf_cls(manager=self,
                                     sequence_class=sequence_class)
                     view = conf_view(model=conf)
@@ -468,56 +596,199 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
     #: Configuration object used to insert new sequences in existing ones.
     _configs = Typed(DeclaratorsCollector)
 
-    # Watchdog observer
-    _observer = Typed(Observer, ())
+    #: Watchdog observer, only existing while the workspace is active.
+    _observer = Typed(Observer)
+
+    #: Index of the known templates persisted between sessions.
+    _templates_index = Typed(TemplatesIndex)
+
+    #: Lock preventing concurrent updates of the known templates.
+    _templates_lock = Value(factory=Lock)
+
+    #: Thread reading the templates modified since the last session at
+    #: start-up.
+    _templates_scanner = Typed(Thread)
+
+    #: Paths of the templates read again whose infos have not been updated
+    #: yet.
+    _templates_changed = Typed(set, ())
+
+    #: Whether the known templates should be updated from the index.
+    _templates_dirty = Bool()
 
-    def _refresh_known_template_sequences(self):
+    #: Compilation server started by the plugin.
+    _compilation_server = Value()
+
+    def _access_infos(self, infos, point, obj_id, view):
+        """Access the class and optionally the view stored in an infos object.
+
+        The class and view of contributed objects are imported on first
+        access, failures are reported to the errors plugin.
+
+        Parameters
+        ----------
+        infos : LazyInfos or None
+            Infos whose class and view should be accessed.
+
+        point : unicode
+            Extension point to which the object was contributed.
+
+        obj_id : unicode
+            Id of the object used to report errors.
+
+        view : bool
+            Whether or not to return the view.
+
+        """
+        if not infos:
+            return None if not view else (None, None)
+
+        try:
+            return infos.cls if not view else (infos.cls, infos.view)
+        except (InfosImportError, TypeError):
+            core = self.workbench.get_plugin('enaml.workbench.core')
+            core.invoke_command('exopy.app.errors.signal',
+                                {'kind': 'extensions', 'point': point,
+                                 'errors': {obj_id: format_exc()}})
+            return None if not view else (None, None)
+
+    def _refresh_known_template_sequences(self, paths=None,
+                                          background=False):
         """Refresh the known template sequences.
 
+        The index is looked up immediately and only the templates whose file
+        changed are read again. The known templates are always updated on the
+        main thread.
+
+        Parameters
+        ----------
+        paths : list, optional
+            Paths of the template files which changed. If None, all the
+            templates folders are scanned.
+
+        background : bool, optional
+            Whether to read the modified templates in a background thread.
+
         """
-        templates = {}
-        for path in self.templates_folders:
-            if os.path.isdir(path):
-                filenames = [f for f in os.listdir(path)
-                             if (os.path.isfile(os.path.join(path, f)) and
-                                 f.endswith('.temp_pulse.ini'))]
-                filenames.sort()
-                for filename in filenames:
-                    template_name = filename[:-len('.temp_pulse.ini')]
-                    template_path = os.path.join(path, filename)
-
-                    # Beware redundant names are overwrited
-                    templates[template_name] = template_path
+        with self._templates_lock:
+            index = self._templates_index
+            if paths is None:
+                found = set(list_template_files(self.templates_folders)
+                            .values())
+                removed = set(index.entries) - found
+                index.discard(removed)
             else:
-                logger = logging.getLogger(__name__)
-                logger.warning('{} is not a valid directory'.format(path))
+                folders = set(self.templates_folders)
+                found = [p for p in paths if os.path.dirname(p) in folders]
+                removed = ()
+            stale = index.stale(found)
+
+        force = paths is None or bool(removed)
+        if stale and background:
+            self._templates_scanner = Thread(target=self._read_templates,
+                                             args=(stale, force),
+                                             daemon=True)
+            self._templates_scanner.start()
+        else:
+            self._read_templates(stale, force)
 
-        self._template_sequences_data = templates
-        aux = (list(self._sequences.contributions) +
-               list(templates))
+    def _read_templates(self, paths, force):
+        """Read the templates whose file changed and schedule the update of
+        the known templates.
 
-        self.sequences = aux
-        self._refresh_template_sequences_infos()
+        Parameters
+        ----------
+        paths : list
+            Paths of the templates to read again.
 
-    def _refresh_template_sequences_infos(self):
-        """ Refresh the known template sequence infos.
+        force : bool
+            Whether to update the known templates even if none changed.
 
         """
-        # TODO Should be more proper in case of update
+        with self._templates_lock:
+            changed, removed = self._templates_index.update(paths)
+            self._templates_changed.update(changed)
+            if force or changed or removed:
+                self._templates_dirty = True
 
-        templates = self._template_sequences_data
-        templates_infos = {}
+        if current_thread() is main_thread():
+            self._update_known_templates()
+        # Without application the update occurs when the templates are next
+        # accessed (see _wait_templates_scan).
+        elif Application.instance() is not None:
+            deferred_call(self._update_known_templates)
 
-        for template_name, template_path in templates.items():
+    def _update_known_templates(self):
+        """Update the known templates from the index and save it.
 
-            metadata = {'is_template': True, 'path': template_path,
-                        'loaded': False}
-            infos = SequenceInfos(metadata=metadata)
-            infos.cls = TemplateSequence
-            infos.view = TemplateSequenceView
+        This should only be called from the main thread.
+
+        """
+        with self._templates_lock:
+            if not self._templates_dirty:
+                return
+            changed = self._templates_changed
+            self._templates_changed = set()
+            self._templates_dirty = False
+            self._refresh_template_sequences_infos(changed)
+            self._templates_index.save()
+
+    def _wait_templates_scan(self):
+        """Wait for the templates read at start-up to be known.
+
+        """
+        # A new scan may have been started while waiting for the previous one.
+        scanner = self._templates_scanner
+        while scanner is not None:
+            scanner.join()
+            if self._templates_scanner is scanner:
+                self._templates_scanner = None
+            scanner = self._templates_scanner
+        if current_thread() is main_thread():
+            self._update_known_templates()
+
+    def _refresh_template_sequences_infos(self, changed=()):
+        """ Refresh the known template sequence infos.
+
+        Parameters
+        ----------
+        changed : iterable, optional
+            Paths of the templates whose infos should be rebuilt. The infos of
+            the other templates are kept as is.
+
+        """
+        templates = {}
+        entries = self._templates_index.entries
+        # Follow the order of the templates folders so that, as in
+        # list_template_files, the last folder wins for redundant names.
+        folders = {os.path.normpath(f): i
+                   for i, f in enumerate(self.templates_folders)}
+
+        def key(path):
+            folder = os.path.normpath(os.path.dirname(path))
+            return folders.get(folder, -1), path
+
+        for template_path in sorted(entries, key=key):
+            template_name = os.path.basename(template_path)
+            # Beware redundant names are overwritten
+            templates[template_name[:-len(TEMPLATE_EXT)]] = template_path
+
+        old_infos = self._template_sequences_infos
+        templates_infos = {}
+        for template_name, template_path in templates.items():
+            infos = old_infos.get(template_name)
+            if (infos is None or template_path in changed or
+                    infos.metadata['path'] != template_path):
+                # Only the header is indexed, the template body is parsed on
+                # demand in get_item_infos.
+                metadata = dict(entries[template_path]['metadata'])
+                infos = TemplateSequenceInfos(metadata=metadata)
             templates_infos[template_name] = infos
 
         self._template_sequences_infos = templates_infos
+        self._template_sequences_data = templates
+        self.sequences = (list(self._sequences.contributions) +
+                          list(templates))
 
     def _update_filters(self, change):
         """ Update the list of known filters.
@@ -535,11 +806,10 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
         """ Update the list of known sequences.
 
         """
-        self.sequences = list(self._sequences.contributions.keys())
-
-        #: Always refresh the list of known templates after refreshing
-        #: sequences, as we could have just added a template.
-        self._refresh_known_template_sequences()
+        #: Always include the known templates as they are considered as
+        #: sequences.
+        self.sequences = (list(self._sequences.contributions) +
+                          list(self._template_sequences_data))
 
     def _update_known_shapes(self, change):
         """ Update the list of known shapes.
@@ -550,14 +820,9 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
     def _bind_observers(self):
         """ Setup the observers for the plugin.
 
-        """
-        for folder in self.templates_folders:
-            handler = SystematicFileUpdater(
-                self._refresh_known_template_sequences)
-            self._observer.schedule(handler, folder, recursive=True)
-
-        self._observer.start()
+        The templates folders are only watched while the workspace is active.
 
+        """
         self._contexts.observe('contributions', self._update_known_contexts)
         self._shapes.observe('contributions', self._update_known_shapes)
         self._sequences.observe('contributions', self._update_known_sequences)
@@ -571,21 +836,72 @@ class PulsesManagerPlugin(HasPreferencesPlugin):
         """
         self.unobserve('templates_folders', self._update_templates)
         self._filters.unobserve('contributions', self._update_filters)
-        self._observer.unschedule_all()
-        self._observer.stop()
-        self._observer.join()
+        self._stop_templates_observer()
 
-    def _update_templates(self, change):
-        """Observer ensuring that we observe the right template folders.
+    def _start_templates_observer(self):
+        """Start watching the templates folders for changes.
 
         """
-        self._observer.unschedule_all()
+        self._observer = Observer()
+        self._schedule_templates_folders()
+        self._observer.start()
+
+    def _stop_templates_observer(self):
+        """Stop watching the templates folders.
+
+        """
+        if self._observer is not None:
+            self._observer.unschedule_all()
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
 
+    def _schedule_templates_folders(self):
+        """Schedule the watching of all valid templates folders.
+
+        """
         for folder in self.templates_folders:
             if not os.path.isdir(folder):
                 continue
-            handler = SystematicFileUpdater(
-                self._refresh_known_template_sequences)
+            handler = TemplatesUpdater(self._refresh_known_template_sequences)
             self._observer.schedule(handler, folder, recursive=True)
 
+    def _update_templates(self, change):
+        """Observer ensuring that we observe the right template folders.
+
+        """
+        if self._observer is not None:
+            self._observer.unschedule_all()
+            self._schedule_templates_folders()
+
         self._refresh_known_template_sequences()
+
+    def _post_setattr_buffers_folder(self, old, new):
+        """Make the contexts use the buffers folder of this machine.
+
+        """
+        LOCAL_SETTINGS.buffers_folder = new
+
+    def _post_setattr_buffers_chunk_size(self, old, new):
+        """Make the contexts use the chunk size set for this machine.
+
+        """
+        LOCAL_SETTINGS.buffers_chunk_size = new
+
+    def _post_setattr_compilation_server(self, old, new):
+        """Make the contexts use the compilation server of this machine.
+
+        """
+        LOCAL_SETTINGS.compilation_server = new
+
+    def _post_setattr_workspace(self, old, new):
+        """Watch the templates folders only while the workspace is active.
+
+        """
+        if new is not None and self._observer is None:
+            self._start_templates_observer()
+            # Take into account the changes which occured while the folders
+            # were not watched.
+            self._refresh_known_template_sequences()
+        elif new is None:
+            self._stop_templates_observer()
@@ -13,9 +13,10 @@ import numpy as np
 from atom.api import (Str, Enum, Typed, Property, set_default)
 from exopy.utils.atom_util import (update_members_from_preferences)
 
-from .shapes.base_shape import AbstractShape
+from .shapes.base_shape import AbstractShape, DEP_TYPE as SHAPE_DEP_TYPE
 from .shapes.modulation import Modulation
 from .item import Item
+from .utils.sequences_io import ID_KEYS
 
 
 class Pulse(Item):
@@ -110,8 +111,8 @@ class Pulse(Item):
         if 'shape' in config:
             shape_config = config['shape']
             if not shape_config == 'None':
-                s_id = shape_config.pop('shape_id')
-                s_cls = dependencies['exopy.pulses.shape'][s_id]
+                s_id = shape_config[ID_KEYS[SHAPE_DEP_TYPE]]
+                s_cls = dependencies[SHAPE_DEP_TYPE][s_id]
                 shape = s_cls()
                 pulse.shape = shape
 
@@ -142,6 +143,46 @@ class Pulse(Item):
             if self.shape:
                 yield self.shape
 
+    def compute_waveform(self, first=0, last=None):
+        """Compute a part of the waveform of the pulse.
+
+        Only the samples in the requested range are computed, unless the
+        shape of the pulse is not local in which case the full shape is
+        computed and then sliced.
+
+        Parameters
+        ----------
+        first : int, optional
+            Index of the first sample to compute (relative to the start of
+            the pulse).
+
+        last : int, optional
+            Index of the sample at which to stop (excluded). By default the
+            waveform is computed till the end of the pulse.
+
+        Returns
+        -------
+        waveform : ndarray
+            Values of the pulse for the requested samples.
+
+        """
+        context = self.root.context
+        n_points = context.len_sample(self.duration)
+        last = n_points if last is None else min(last, n_points)
+        if self.kind == 'Analogical':
+            step = self.duration / n_points if n_points else 0
+            time = self.start + np.arange(first, last) * step
+            mod = self.modulation.compute(time, context.time_unit)
+            if self.shape.is_local:
+                shape = self.shape.compute(time, context.time_unit)
+            else:
+                full_time = self.start + np.arange(n_points) * step
+                shape = self.shape.compute(full_time,
+                                           context.time_unit)[first:last]
+            return mod * shape
+        else:
+            return np.ones(max(last - first, 0), dtype=np.int8)
+
     def clean_cached_values(self):
         """Also clean modualtion and shape if necessary.
 
@@ -159,12 +200,4 @@ class Pulse(Item):
         """ Getter for the waveform property.
 
         """
-        context = self.root.context
-        n_points = context.len_sample(self.duration)
-        if self.kind == 'Analogical':
-            time = np.linspace(self.start, self.stop, n_points, False)
-            mod = self.modulation.compute(time, context.time_unit)
-            shape = self.shape.compute(time, context.time_unit)
-            return mod * shape
-        else:
-            return np.ones(n_points, dtype=np.int8)
+        return self.compute_waveform()
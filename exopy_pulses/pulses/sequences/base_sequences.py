@@ -9,26 +9,32 @@
 """Base classes for pulse sequences.
 
 """
-from copy import deepcopy
 from collections import OrderedDict
 from collections.abc import Mapping
+from contextlib import contextmanager, ExitStack
 from numbers import Real
 
 from atom.api import (Int, Instance, Str, Bool, List,
-                      Signal, set_default, Typed)
+                      Signal, set_default, Typed, Value)
 from exopy.utils.traceback import format_exc
 from exopy.utils.container_change import ContainerChange
 from exopy.utils.atom_util import (update_members_from_preferences,
                                    ordered_dict_to_pref,
                                    ordered_dict_from_pref)
 
-from ..contexts.base_context import BaseContext
-from ..utils.entry_eval import eval_entry, MissingLocalVars
+from ..contexts.base_context import BaseContext, DEP_TYPE as CONTEXT_DEP_TYPE
+from ..utils.entry_eval import (eval_entry, parse_entry, MissingLocalVars,
+                                HasEvaluableFields)
 from ..utils.validators import SkipEmpty
-from ..item import Item
+from ..utils.sequences_io import ID_KEYS
+from ..item import Item, DEP_TYPE as ITEM_DEP_TYPE
 from ..pulse import Pulse
 
 
+#: Marker used in the memoization keys for the variables which are not known.
+_MISSING = object()
+
+
 class AbstractSequence(Item):
     """ Base class for all sequences.
 
@@ -73,6 +79,7 @@ class AbstractSequence(Item):
         """
         super(AbstractSequence, self).clean_cached_values()
         self._evaluated = []
+        self._eval_key = None
         for i in self.items:
             i.clean_cached_values()
 
@@ -165,7 +172,138 @@ class AbstractSequence(Item):
     #: List of already evaluated items.
     _evaluated = List()
 
-    def _evaluate_items(self, root_vars, sequence_locals, missings, errors):
+    #: Adding, moving or removing items changes the content hash.
+    _hash_watched = ('items', 'items_changed')
+
+    #: Key of the last successful evaluation of the sequence, None if it was
+    #: not evaluated through _evaluate_memoized.
+    _eval_key = Value()
+
+    #: Result of the last successful evaluation as a (key, global values,
+    #: evaluation states) tuple.
+    _eval_memo = Value()
+
+    #: Result of the last simplification as a (evaluation key, supported
+    #: sequences, items) tuple.
+    _simplify_memo = Value()
+
+    #: Variables read by the sequence, prefixes of the variables it defines
+    #: and evaluable objects it contains, valid for a (content hash, index).
+    _memo_inputs = Value()
+
+    def _formulas(self):
+        """Add the formulas of the local variables.
+
+        """
+        formulas = super(AbstractSequence, self)._formulas()
+        return formulas + list(self.local_vars.values())
+
+    def _evaluation_state(self):
+        """Add the list of evaluated items and the evaluation key.
+
+        """
+        state = super(AbstractSequence, self)._evaluation_state()
+        state.update(_evaluated=self._evaluated, _eval_key=self._eval_key)
+        return state
+
+    def _analyse_inputs(self):
+        """Identify the variables read by the sequence and its content.
+
+        Variables prefixed by the index of one of the items of the sequence
+        are produced by the evaluation and are hence not considered inputs.
+
+        """
+        key = (self.content_hash, self.index)
+        inputs = self._memo_inputs
+        if inputs is not None and inputs[0] == key:
+            return inputs
+
+        names = set()
+        prefixes = set()
+        objects = []
+        for obj in self.traverse():
+            if not isinstance(obj, HasEvaluableFields):
+                continue
+            objects.append(obj)
+            if isinstance(obj, Item):
+                prefixes.add(str(obj.index))
+            for formula in obj._formulas():
+                names.update(n.split(':')[0].split('!')[0]
+                             for n in parse_entry(formula)[1])
+
+        names = tuple(sorted(n for n in names
+                             if n.split('_', 1)[0] not in prefixes))
+        self._memo_inputs = (key, names, prefixes, objects)
+        return self._memo_inputs
+
+    def _evaluate_memoized(self, root_vars, sequence_locals, missings,
+                           errors):
+        """Evaluate the sequence unless it was already evaluated with the
+        same content, index, context and input variables.
+
+        When the previous result is reused, the values it computed are
+        restored on all the objects of the sequence and the global variables
+        it defined are added back to the namespaces.
+
+        """
+        key, names, prefixes, objects = self._analyse_inputs()
+        values = tuple(sequence_locals.get(n, _MISSING) for n in names)
+        key = (key, self.root.context.content_hash, values)
+
+        memo = self._eval_memo
+        try:
+            hit = memo is not None and bool(memo[0] == key)
+        except (TypeError, ValueError):
+            hit = False
+
+        if hit:
+            _, outputs, states = memo
+            for obj, state in states:
+                obj._restore_evaluation_state(state)
+            root_vars.update(outputs)
+            prefix = '{}_'.format(self.index)
+            sequence_locals.update((k, v) for k, v in outputs.items()
+                                   if k.startswith(prefix))
+            return True
+
+        self._eval_key = None
+        res = self.evaluate_sequence(root_vars, sequence_locals, missings,
+                                     errors)
+        if res and not errors:
+            self._eval_key = key
+            outputs = {k: v for k, v in root_vars.items()
+                       if k.split('_', 1)[0] in prefixes}
+            states = [(obj, obj._evaluation_state()) for obj in objects]
+            self._eval_memo = (key, outputs, states)
+
+        return res
+
+    def _simplify_memoized(self, supported):
+        """Simplify the sequence unless it was already simplified after the
+        same evaluation.
+
+        """
+        memo = self._simplify_memo
+        key = self._eval_key
+        if (key is not None and memo is not None and memo[0] is key and
+                memo[1] == supported):
+            return list(memo[2])
+
+        items = self.simplify_sequence()
+        if key is not None:
+            self._simplify_memo = (key, list(supported), list(items))
+        return items
+
+    def _hash_content(self):
+        """Add the content hashes of the items.
+
+        """
+        content = super(AbstractSequence, self)._hash_content()
+        content.append(('items', [i.content_hash for i in self.items]))
+        return content
+
+    def _evaluate_items(self, root_vars, sequence_locals, missings, errors,
+                        items=None, order=None):
         """Evaluate all the children item of the sequence
 
         Parameters
@@ -183,16 +321,28 @@ class AbstractSequence(Item):
         errors : dict
             Dict of the errors which happened when performing the evaluation.
 
+        items : list, optional
+            Items to evaluate. By default the items of the sequence are used.
+
+        order : list, optional
+            List to which the items are appended in the order in which they
+            were successfully evaluated.
+
         Returns
         -------
         flag : bool
             Boolean indicating whether or not the evaluation succeeded.
 
         """
+        # Only the items of the sequence itself are memoized, the items of a
+        # template body being shared by several sequences.
+        memoize = items is None
+        if items is None:
+            items = self.items
 
         # Inplace modification during evaluation will update self._evaluated.
         if not self._evaluated:
-            self._evaluated = [None for i in self.items if i.enabled]
+            self._evaluated = [None for i in items if i.enabled]
         evaluated = self._evaluated
 
         # Compilation of items in multiple passes.
@@ -200,7 +350,7 @@ class AbstractSequence(Item):
             miss = set()
 
             index = -1
-            for item in self.items:
+            for item in items:
                 # Skip disabled items
                 if not item.enabled:
                     continue
@@ -220,14 +370,21 @@ class AbstractSequence(Item):
                                                 miss, errors)
                     if success:
                         evaluated[index] = [item]
+                        if order is not None:
+                            order.append(item)
 
-                # Here we got a sequence so we must try to compile it.
+                # Here we got a sequence so we must try to compile it. The
+                # sequences whose content and inputs did not change since the
+                # last evaluation reuse its results.
                 else:
-                    success = item.evaluate_sequence(root_vars,
-                                                     sequence_locals,
-                                                     miss, errors)
+                    evaluate = (item._evaluate_memoized if memoize else
+                                item.evaluate_sequence)
+                    success = evaluate(root_vars, sequence_locals, miss,
+                                       errors)
                     if success:
                         evaluated[index] = item
+                        if order is not None:
+                            order.append(item)
 
             known_locals = set(sequence_locals.keys())
             # If none of the variables found missing during last pass is now
@@ -347,7 +504,7 @@ class BaseSequence(AbstractSequence):
             if isinstance(item, Pulse) or type(item) in supported:
                 seq.append(item)
             else:
-                seq.extend(item.simplify_sequence())
+                seq.extend(item._simplify_memoized(supported))
 
         return seq
 
@@ -501,8 +658,8 @@ class BaseSequence(AbstractSequence):
             if item_name not in config:
                 break
             item_config = config[item_name]
-            i_id = item_config.pop('item_id')
-            i_cls = dependencies['exopy.pulses.item'][i_id]
+            i_id = item_config[ID_KEYS[ITEM_DEP_TYPE]]
+            i_cls = dependencies[ITEM_DEP_TYPE][i_id]
             item = i_cls.build_from_config(item_config,
                                            dependencies)
             sequence.add_child_item(i, item)
@@ -634,9 +791,23 @@ class RootSequence(BaseSequence):
     #: and duration of most items.
     global_vars = List()
 
+    #: Whether to suppress the notifications of the items while the sequence
+    #: is evaluated. Observers should then rely on evaluation_finished. This
+    #: is meant for the private copies compiled outside of the editor (for
+    #: example by the compilation server).
+    suppress_evaluation_notifications = Bool(False)
+
+    #: Signal emitted once at the end of each evaluation. The payload is a
+    #: dict containing the success, missings and errors of the evaluation.
+    evaluation_finished = Signal()
+
     index = set_default(0)
     name = set_default('Root')
 
+    #: The values of the external variables are not part of the content hash,
+    #: they are inputs of the evaluation.
+    _hash_excluded = ('external_vars',)
+
     def __init__(self, **kwargs):
         super(RootSequence, self).__init__(**kwargs)
         self.root = self
@@ -650,9 +821,18 @@ class RootSequence(BaseSequence):
         super(RootSequence, self).clean_cached_values()
         self.context.clean_cached_values()
 
-    def evaluate_sequence(self):
+    def evaluate_sequence(self, suppress_notifications=None):
         """Evaluate the root sequence entries and all sub items.
 
+        evaluation_finished is emitted once the evaluation is over.
+
+        Parameters
+        ----------
+        suppress_notifications : bool, optional
+            Whether the components of the sequence should not emit any
+            notification while being evaluated. Defaults to the value of
+            suppress_evaluation_notifications.
+
         Returns
         -----------
         result : bool
@@ -666,55 +846,60 @@ class RootSequence(BaseSequence):
             Dict describing the errors that occured during evaluation.
 
         """
-        # First make sure the cache is clean
-        self.clean_cached_values()
+        if suppress_notifications is None:
+            suppress_notifications = self.suppress_evaluation_notifications
+        if suppress_notifications:
+            with self._suppress_tree_notifications():
+                res, missings, errors = self._evaluate_root()
+        else:
+            res, missings, errors = self._evaluate_root()
 
-        missings = set()
-        errors = {}
-        root_vars = self.external_vars.copy()
+        self.evaluation_finished({'success': res, 'missings': missings,
+                                  'errors': errors})
+        return res, missings, errors
 
-        # Local vars computation.
-        for name, formula in self.local_vars.items():
-            if name not in self._cache:
-                try:
-                    val = eval_entry(formula, root_vars)
-                    self._cache[name] = val
-                except MissingLocalVars as e:
-                    missings.update(e.missings)
-                except Exception:
-                    errors['root_' + name] = format_exc()
+    def snapshot(self):
+        """Build a lightweight read-only copy of the sequence.
 
-        root_vars.update(self._cache)
+        The snapshot can be pickled and its restore method builds an
+        independent sequence, which makes it suitable to hand the sequence to
+        a worker thread or process.
 
-        if self.time_constrained:
-            try:
-                duration = eval_entry(self.sequence_duration, root_vars)
-                self.stop = self.duration = duration
-                root_vars['sequence_end'] = duration
-            except MissingLocalVars as e:
-                missings.update(e.missings)
-            except Exception:
-                errors['root_seq_duration'] = format_exc()
+        Returns
+        -------
+        snapshot : Snapshot
+            Frozen copy of the definition of the sequence and its context.
 
-        res = self.context.eval_entries(root_vars, root_vars, missings, errors)
+        """
+        from ..utils.snapshot import Snapshot
+        return Snapshot.from_object(self)
 
-        res &= self._evaluate_items(root_vars, root_vars, missings, errors)
+    def evaluate(self, external_vars=None):
+        """Evaluate the sequence without modifying it.
 
-        if not res:
-            return False, missings, errors
+        A private copy of the sequence (one per thread) is evaluated instead,
+        so that the sequence can be evaluated concurrently for different
+        values of the external variables and its views are not notified.
+        This is used to compile the variants of a sequence table, while
+        preprocess_sequence evaluates the sequence itself.
 
-        if self.time_constrained:
-            overtime = []
-            self._validate_times(self.items, overtime)
+        Parameters
+        ----------
+        external_vars : dict, optional
+            Values of the external variables overriding the ones of the
+            sequence.
 
-            if overtime:
-                mess = ('The stop time of the following pulses {} is larger '
-                        'than the duration of the sequence.')
-                ind = [p.index for p in overtime]
-                errors['root-stop'] = mess.format(ind)
-                return False, missings, errors
+        Returns
+        -------
+        result : EvaluationResult
+            Immutable result holding the times and values of the items and
+            the simplified pulses.
 
-        return True, missings, errors
+        """
+        if self._evaluator is None:
+            from ..utils.evaluation import SequenceEvaluator
+            self._evaluator = SequenceEvaluator(sequence=self)
+        return self._evaluator.evaluate(external_vars)
 
     def get_accessible_vars(self):
         """ Access the list of local variables for the sequence.
@@ -744,13 +929,12 @@ class RootSequence(BaseSequence):
             Newly created and initiliazed sequence.
 
         """
-        config = deepcopy(config)
         seq = super(RootSequence, cls).build_from_config(config,
                                                          dependencies)
         if 'context' in config and isinstance(config['context'], Mapping):
             context_config = config['context']
-            c_id = context_config.pop('context_id')
-            c_cls = dependencies['exopy.pulses.context'][c_id]
+            c_id = context_config[ID_KEYS[CONTEXT_DEP_TYPE]]
+            c_cls = dependencies[CONTEXT_DEP_TYPE][c_id]
             context = c_cls()
 
             context.update_members_from_preferences(context_config)
@@ -770,6 +954,73 @@ class RootSequence(BaseSequence):
 
     # --- Private API ---------------------------------------------------------
 
+    #: Object evaluating private copies of the sequence.
+    _evaluator = Value()
+
+    @contextmanager
+    def _suppress_tree_notifications(self):
+        """Suppress the notifications of all the components of the sequence.
+
+        """
+        with ExitStack() as stack:
+            for component in self.traverse():
+                stack.enter_context(component.suppress_notifications())
+            yield
+
+    def _evaluate_root(self):
+        """Evaluate the root sequence entries and all sub items.
+
+        """
+        # First make sure the cache is clean
+        self.clean_cached_values()
+
+        missings = set()
+        errors = {}
+        root_vars = self.external_vars.copy()
+
+        # Local vars computation.
+        for name, formula in self.local_vars.items():
+            if name not in self._cache:
+                try:
+                    val = eval_entry(formula, root_vars)
+                    self._cache[name] = val
+                except MissingLocalVars as e:
+                    missings.update(e.missings)
+                except Exception:
+                    errors['root_' + name] = format_exc()
+
+        root_vars.update(self._cache)
+
+        if self.time_constrained:
+            try:
+                duration = eval_entry(self.sequence_duration, root_vars)
+                self.stop = self.duration = duration
+                root_vars['sequence_end'] = duration
+            except MissingLocalVars as e:
+                missings.update(e.missings)
+            except Exception:
+                errors['root_seq_duration'] = format_exc()
+
+        res = self.context.eval_entries(root_vars, root_vars, missings, errors)
+
+        res &= self._evaluate_items(root_vars, root_vars, missings, errors)
+
+        if not res:
+            return False, missings, errors
+
+        if self.time_constrained:
+            overtime = []
+            self._validate_times(self.items, overtime)
+
+            if overtime:
+                mess = ('The stop time of the following pulses {} is larger '
+                        'than the duration of the sequence.')
+                ind = [p.index for p in overtime]
+                errors['root-stop'] = mess.format(ind)
+                return False, missings, errors
+
+        return True, missings, errors
+
     def _validate_times(self, items, overtime):
         """Check The timing of the pulses respect the duration of the sequence.
 
@@ -787,7 +1038,10 @@ class RootSequence(BaseSequence):
                 if i.stop > self.stop:
                     overtime.append(i)
             else:
-                self._validate_times(i.items, overtime)
+                # Other sequences (such as templates) validate the timing of
+                # their own content.
+                if isinstance(i, BaseSequence):
+                    self._validate_times(i.items, overtime)
                 if i.duration and i.stop > self.stop:
                     overtime.append(i)
 
@@ -8,19 +8,35 @@
 # -----------------------------------------------------------------------------
 """Sequence use to insert another premade sequence.
 
+The content of a template is parsed and built only once as a TemplateBody
+which is shared by all the TemplateSequence using that template. Each
+TemplateSequence only stores its own template vars and channel mapping and
+keeps its own copy of the evaluated pulses.
+
+After its first successful evaluation the body is compiled : the order in
+which its items can be evaluated is recorded and the values of the formulas
+which do not depend on any variable are kept, so that later evaluations only
+have to compute the fields depending on the template vars.
+
 """
-# TODO this is unfinished and requires a update to exopy to support declaring
-# multiple build dependencies
-from copy import deepcopy
+from copy import copy
 from ast import literal_eval
+from threading import RLock
+from hashlib import sha1
+from collections import OrderedDict
 
-from atom.api import (Dict, ForwardTyped, Str, List)
+from atom.api import (Constant, Dict, ForwardTyped, Str, List, Instance,
+                      Tuple, Typed, Value, Property)
 
-from exopy.utils.atom_util import update_members_from_preferences
+from exopy.utils.atom_util import (HasPrefAtom, tagged_members,
+                                   update_members_from_preferences)
 from exopy.utils.traceback import format_exc
 
+from ..item import Item
 from ..pulse import Pulse
-from ..utils.entry_eval import eval_entry
+from ..utils.entry_eval import (eval_entry, MissingLocalVars,
+                                HasEvaluableFields)
+from ..utils.sequences_io import ID_KEYS
 from .base_sequences import AbstractSequence, BaseSequence
 
 
@@ -29,7 +45,226 @@ def context():
     return TemplateContext
 
 
-# TODO need a custom dep_id to also collect the config of the template
+#: Id used to identify dependencies type.
+DEP_TYPE = 'exopy.pulses.template'
+
+
+class TemplateBody(HasPrefAtom):
+    """Content of a template shared by all the sequences using it.
+
+    The items of the body are built once and used by all TemplateSequence
+    relying on the same template. They are evaluated by each sequence in turn
+    and should never be edited.
+
+    """
+    #: Identifier for the build dependency collector
+    dep_type = Constant(DEP_TYPE).tag(pref=True)
+
+    #: Id of the template.
+    template_id = Str().tag(pref=True)
+
+    #: Documentation of the template as provided by the user.
+    doc = Str()
+
+    #: Declared template vars with their default values.
+    template_vars = Dict()
+
+    #: Local variables of the template.
+    local_vars = Typed(OrderedDict, ())
+
+    #: Analogical channels used in the template.
+    analogical_channels = Tuple()
+
+    #: Logical channels used in the template.
+    logical_channels = Tuple()
+
+    #: Items of the template.
+    items = List(Instance(Item))
+
+    #: Context of the template sequence currently evaluating the body. The
+    #: items of the body access it as their root context.
+    context = Value()
+
+    #: Ids of the global linkable vars of the items.
+    global_vars = List()
+
+    #: Items in the order in which they can be evaluated. Empty as long as
+    #: the body has not been compiled.
+    evaluation_order = List()
+
+    #: Values of the local vars which do not depend on any variable.
+    constant_vars = Dict()
+
+    #: Hash of the content of the template. As the body is never edited it is
+    #: computed only once.
+    content_hash = Property(cached=True)
+
+    @classmethod
+    def build_from_config(cls, config, dependencies):
+        """ Create a new instance using the provided infos for initialisation.
+
+        Parameters
+        ----------
+        config : dict(str)
+            Configuration of the template as found in the template file. It is
+            not modified.
+
+        dependencies : dict
+            Dictionary holding the necessary classes needed when rebuilding.
+
+        Returns
+        -------
+        body : TemplateBody
+            Newly created and initiliazed body.
+
+        """
+        seq = BaseSequence.build_from_config(config, dependencies)
+        context_config = config.get('context', {})
+        body = cls(template_vars=literal_eval(config.get('template_vars',
+                                                         '{}')),
+                   local_vars=seq.local_vars,
+                   analogical_channels=tuple(literal_eval(
+                       context_config.get('analogical_channels', '[]'))),
+                   logical_channels=tuple(literal_eval(
+                       context_config.get('logical_channels', '[]'))))
+
+        items = list(seq.items)
+        seq.items = []
+        body.items = items
+        body._index_items()
+        return body
+
+    def clean_cached_values(self):
+        """Clean the values cached by the items during the last evaluation.
+
+        """
+        for item in self.items:
+            item.clean_cached_values()
+
+        # Restore the values which never change.
+        for obj, values in self._constants:
+            obj._cache.update(values)
+
+    def compile(self, order, evaluated_vars):
+        """Record the results of a successful evaluation of the body.
+
+        Parameters
+        ----------
+        order : list
+            Items in the order in which they were successfully evaluated.
+
+        evaluated_vars : dict
+            Values of the template vars and local vars used for the
+            evaluation.
+
+        """
+        self.constant_vars = {name: evaluated_vars[name]
+                              for name, formula in self.local_vars.items()
+                              if _is_constant(formula)}
+
+        constants = []
+        for item in self.items:
+            for obj in item.traverse():
+                if not isinstance(obj, HasEvaluableFields):
+                    continue
+                cache = obj._cache
+                values = {}
+                for name, m in tagged_members(obj, 'feval').items():
+                    formula = getattr(obj, name)
+                    # Values stored as global vars have to be evaluated to be
+                    # published.
+                    if (name in cache and _is_constant(formula) and
+                            not m.metadata['feval'].store_global):
+                        values[name] = cache[name]
+                if values:
+                    constants.append((obj, values))
+
+        self._constants = constants
+        self.evaluation_order = order
+
+    def create_context(self):
+        """Create a template context matching the channels of the template.
+
+        """
+        channels = self.logical_channels + self.analogical_channels
+        return context()(logical_channels=list(self.logical_channels),
+                         analogical_channels=list(self.analogical_channels),
+                         channel_mapping={c: '' for c in channels})
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Lock preventing two sequences from evaluating the body at once.
+    _lock = Value(factory=RLock)
+
+    #: Objects of the body and the values of their fields not depending on
+    #: any variable.
+    _constants = List()
+
+    def _reduce_definition(self):
+        """Reduce the body to its definition when pickled by dumps_sequence.
+
+        The values derived from the evaluations are recomputed the next time
+        the body is evaluated.
+
+        """
+        state = self.__getstate__()
+        for name in ('_lock', '_constants', 'evaluation_order',
+                     'constant_vars', 'context'):
+            state.pop(name, None)
+        return _restore_body, (type(self), state)
+
+    def _index_items(self):
+        """Do the indexing of the items once and for all.
+
+        """
+        i = 1
+        for item in self.items:
+            item.parent = None
+            item.index = i
+            item.root = self
+            if isinstance(item, BaseSequence):
+                item._recompute_indexes()
+                i = item._last_index + 1
+            else:
+                i += 1
+
+    def _get_content_hash(self):
+        """Hash the variables, channels and items of the template.
+
+        """
+        content = [self.template_id, sorted(self.template_vars.items()),
+                   list(self.local_vars.items()), self.analogical_channels,
+                   self.logical_channels,
+                   [i.content_hash for i in self.items]]
+        return sha1(repr(content).encode()).hexdigest()
+
+
+def _is_constant(formula):
+    """Check whether a formula always evaluates to the same value.
+
+    Only formulas referencing neither variables nor names (and hence calling
+    no function) are considered constant.
+
+    """
+    if '{' in formula:
+        return False
+    try:
+        code = compile(formula, '<formula>', 'eval')
+    except (SyntaxError, ValueError):
+        return False
+    return not code.co_names
+
+
+def _restore_body(cls, state):
+    """Rebuild a body pickled by dumps_sequence and index its items.
+
+    """
+    body = cls.__new__(cls)
+    body.__setstate__(state)
+    body._index_items()
+    return body
+
+
 class TemplateSequence(AbstractSequence):
     """ Sequence used to represent a template in a Sequence.
 
@@ -46,77 +281,126 @@ class TemplateSequence(AbstractSequence):
     #: Special context providing channel mapping.
     context = ForwardTyped(context).tag(pref=True)
 
-    #: Ids of the global linkable vars. Those are for example the start, stop
-    #: and duration of most items.
-    global_vars = List()
+    #: Body of the template shared with all the sequences using the same
+    #: template.
+    body = Typed(TemplateBody).tag(pref=True)
+
+    def clean_cached_values(self):
+        """ Clear all internal caches.
+
+        """
+        super(TemplateSequence, self).clean_cached_values()
+        self._evaluated_vars = {}
+        self._simplified = []
 
     def evaluate_sequence(self, root_vars, sequence_locals, missings, errors):
         """Evaluate the entries of the items making the context.
 
         """
         # Check the channel mapping makes sense.
-        if not self.context.prepare_compilation(errors):
+        if not self.context.prepare_evaluation(errors):
             return False
 
         # Definition evaluation.
-        self.eval_entries(root_vars, sequence_locals, missings, errors)
+        res = self.eval_entries(root_vars, sequence_locals, missings, errors)
 
         prefix = '{}_'.format(self.index)
         # Template vars evaluation.
         for name, formula in self.template_vars.items():
             if name not in self._evaluated_vars:
                 try:
-                    val = eval_entry(formula, sequence_locals, missings)
+                    val = eval_entry(formula, sequence_locals)
                     self._evaluated_vars[name] = val
+                except MissingLocalVars as e:
+                    res = False
+                    missings.update(e.missings)
                 except Exception:
+                    res = False
                     errors[prefix + name] = format_exc()
 
-        # Local vars computation.
-        for name, formula in self.local_vars.items():
-            if name not in self._evaluated_vars:
+        # Local vars computation, those can only access the template vars.
+        constants = self.body.constant_vars
+        for name, formula in self.body.local_vars.items():
+            if name in constants:
+                self._evaluated_vars.setdefault(name, constants[name])
+            elif name not in self._evaluated_vars:
                 try:
-                    val = eval_entry(formula, sequence_locals, missings)
+                    val = eval_entry(formula, self._evaluated_vars)
                     self._evaluated_vars[name] = val
+                except MissingLocalVars as e:
+                    res = False
+                    missings.update(e.missings)
                 except Exception:
+                    res = False
                     errors[prefix + name] = format_exc()
 
+        if not res:
+            return False
+
         local_namespace = self._evaluated_vars.copy()
         local_namespace['sequence_end'] = self.duration
 
-        res = self._evaluate_items(local_namespace, local_namespace,
-                                   missings, errors)
-
-        if res:
-            overtime = []
-            self._update_times(self.items, errors, overtime)
-
-            if overtime:
-                msg = ('The stop time of the following items {} is larger '
-                       'than the stop time of the sequence {}')
-                ind = [p.index for p in overtime]
-                errors[self.name + '-stop'] = msg.format(ind, self.index)
+        # The body is shared so it must be evaluated from scratch and the
+        # results copied before another sequence use it. Sequences evaluated
+        # in different threads hence use it in turn.
+        body = self.body
+        with body._lock:
+            body.context = self.context
+            body.clean_cached_values()
+            self._evaluated = []
+
+            if body.evaluation_order:
+                res = self._evaluate_items(local_namespace, local_namespace,
+                                           missings, errors,
+                                           body.evaluation_order)
+            else:
+                order = []
+                res = self._evaluate_items(local_namespace, local_namespace,
+                                           missings, errors, body.items,
+                                           order)
+                if res and not errors:
+                    body.compile(order, self._evaluated_vars)
+
+            if res:
+                overtime = []
+                self._simplified = self._copy_pulses(body.items, errors,
+                                                     overtime)
+
+                if overtime:
+                    msg = ('The stop time of the following items {} is larger '
+                           'than the stop time of the sequence {}')
+                    ind = [p.index for p in overtime]
+                    errors[self.name + '-stop'] = msg.format(ind, self.index)
 
         if errors:
             return False
 
-        return True
+        return res
 
     def simplify_sequence(self):
-        """Inline the sequences not supported by the context.
+        """Return the pulses evaluated for this sequence.
+
+        As the body of the template is shared, all the items it contains are
+        always inlined.
 
         """
-        supported = self.root.context.supported_sequences
+        return list(self._simplified)
 
-        seq = []
-        for item in self.items:
-            if not item.enabled:
-                continue
-            if isinstance(item, Pulse) or type(item) in supported:
-                seq.append(item)
-            else:
-                seq.extend(item.simplify_sequence())
+    def traverse(self, depth=-1):
+        """Yield the sequence, its body and its context.
 
-        return seq
+        The items of the body are not yielded as they are not needed to
+        rebuild the sequence.
+
+        """
+        for i in super(TemplateSequence, self).traverse(depth=depth):
+            yield i
+
+        if self.body:
+            yield self.body
+
+        if self.context:
+            yield self.context
 
     @classmethod
     def build_from_config(cls, config, dependencies):
@@ -132,6 +416,7 @@ class TemplateSequence(AbstractSequence):
 
         dependencies : dict
             Dictionary holding the necessary classes needed when rebuilding.
+            The shared body of the template is retrieved from it.
 
         Returns
         -------
@@ -139,61 +424,49 @@ class TemplateSequence(AbstractSequence):
             Newly created and initiliazed sequence.
 
         """
-        # TOOD this is not correct as the template config is never retrieved
+        body = dependencies[DEP_TYPE][config[ID_KEYS[DEP_TYPE]]]
 
-        # First get the underlying template from the dependencies and merge
-        # config into it as it has more recent infos about the context and
-        # the vars.
-        dep = dependencies
+        seq = cls(body=body, context=body.create_context(), docs=body.doc)
+        update_members_from_preferences(seq, config)
 
-        # Don't want to alter the dependencies dict in case somebody else use
-        # the same template.
-        t_config = deepcopy(config)
+        # Make sure the template_vars match the one declared in the template.
+        t_vars = seq.template_vars
+        seq.template_vars = {k: t_vars.get(k, v)
+                             for k, v in body.template_vars.items()}
 
-        # Make sure the template_vars stored in the config match the one
-        # declared in the template.
-        t_vars = literal_eval(config.pop('template_vars'))
-        declared_t_vars = literal_eval(t_config['template_vars'])
-        for var in declared_t_vars:
-            declared_t_vars[var] = t_vars.get(var, '')
-        t_config['template_vars'] = repr(declared_t_vars)
+        return seq
 
-        t_config.merge(config)
-        config = t_config
+    # --- Private API ---------------------------------------------------------
 
-        context_config = config['context']
-        context_id_name = context_config.pop('context_id')
-        context_id = dep['exopy.pulses.context'][context_id_name]
-        context = context_id()
-        update_members_from_preferences(context, context_config)
+    #: Values of the template vars and local vars of the template.
+    _evaluated_vars = Dict()
 
-        seq = super(TemplateSequence, cls).build_from_config(t_config,
-                                                             dependencies)
-        seq.docs = config['template_doc']
-        seq.context = context
+    #: Pulses resulting from the evaluation of the body for this sequence.
+    _simplified = List()
 
-        # Do the indexing of the children once and for all.
-        i = 1
-        for item in seq.items:
-            item.index = i
-            item.root = seq
-            if isinstance(item, BaseSequence):
-                item._recompute_indexes()
-                i = item._last_index + 1
-            else:
-                i += 1
+    def _formulas(self):
+        """Add the formulas of the template variables.
 
-        return seq
+        """
+        formulas = super(TemplateSequence, self)._formulas()
+        return formulas + list(self.template_vars.values())
 
-    # --- Private API ---------------------------------------------------------
+    def _evaluation_state(self):
+        """Add the values of the variables and the copied pulses.
+
+        """
+        state = super(TemplateSequence, self)._evaluation_state()
+        state.update(_evaluated_vars=dict(self._evaluated_vars),
+                     _simplified=self._simplified)
+        return state
 
-    def _update_times(self, items, errors, overtime):
-        """Offset all the timing of the items and check it still make sense.
+    def _copy_pulses(self, items, errors, overtime):
+        """Copy the evaluated pulses of the body, offsetting their timing.
 
         Parameters
         ----------
         items : list
-            List of items whose end time should be checked.
+            List of items whose pulses should be copied.
 
         errors : dict
             Dict in which to report errors.
@@ -201,24 +474,48 @@ class TemplateSequence(AbstractSequence):
         overtime : list
             List of items which do not respect the time constraint.
 
+        Returns
+        -------
+        pulses : list
+            Copies of the pulses specific to this sequence.
+
         """
         t_start = self.start
         c_mapping = self.context.channel_mapping
+        pulses = []
         for i in items:
+            if not i.enabled:
+                continue
             if isinstance(i, Pulse):
-                i.start += t_start
-                i.stop += t_start
+                p = copy(i)
+                p.parent = None
+                p.root = self.root
+                p.start += t_start
+                p.stop += t_start
+                if i.kind == 'Analogical':
+                    p.modulation = copy(i.modulation)
+                    p.shape = copy(i.shape)
                 try:
-                    i.channel = c_mapping[i.channel]
+                    p.channel = c_mapping[i.channel]
                 except KeyError as e:
                     errors[self.name + '-channels'] = \
                         'Channel mapping is corrupted : {}'.format(e)
-                if i.stop > self.stop:
-                    overtime.append(i)
+                if p.stop > self.stop:
+                    overtime.append(p)
+                pulses.append(p)
             else:
-                self._update_times(i.items, errors, overtime)
-                if i.duration and i.stop > self.stop:
+                if i.duration and i.stop + t_start > self.stop:
                     overtime.append(i)
+                pulses.extend(self._copy_pulses(i.simplify_sequence(), errors,
+                                                overtime))
+
+        return pulses
+
+    def _default_item_id(self):
+        """Templates sequences are registered under a special id.
+
+        """
+        return 'exopy_pulses.__template__'
 
     def _post_setattr_context(self, old, new):
         """ Make sure the context has a ref to the sequence.
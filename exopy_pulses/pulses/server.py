@@ -0,0 +1,648 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Local compilation server shared by several applications.
+
+The server listens on a Unix socket (or a named pipe on Windows) or on a
+localhost port and compiles the sequences sent by the clients using a pool of
+worker threads. As all the clients share the same process, the caches stay
+warm from one request to the next and between clients :
+
+- the sequences are transferred pickled (see utils.snapshot) only if their
+  content is not known yet and each worker keeps its copy, so that the
+  evaluation of the subsequences which do not depend on the external
+  variables is memoized.
+- the template bodies are shared between all the sequences using them.
+- the rendered waveforms are cached by content and external variables, the
+  total size of the cached waveforms being bounded.
+
+The waveforms are returned through shared memory blocks, which are unlinked by
+the client once copied. This requires Python 3.8 or later.
+
+The requests carry pickled sequences which the server loads, so the channel
+must only be used by trusted clients : anybody able to connect and
+authenticate can run arbitrary code in the server. The connections are
+authenticated using a random key stored in a file only readable by the
+current user (see load_authkey), and the server refuses to listen on an
+address which is not local unless explicitly allowed to.
+
+Usage : python -m exopy_pulses.pulses.server ADDRESS [--workers N]
+        [--cache-size N] [--cache-memory MB] [--authkey-file PATH]
+        [--allow-remote]
+
+"""
+import os
+import sys
+import stat
+import pickle
+import socket
+import logging
+import argparse
+import ipaddress
+from secrets import token_hex
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock, Thread, current_thread, local
+
+import numpy as np
+from atom.api import Atom, Bool, Bytes, Int, Str, Typed, Value
+
+from .utils.snapshot import dumps_sequence
+
+#: File storing the key used to authenticate the connections when none is
+#: provided.
+AUTHKEY_PATH = os.path.join(os.path.expanduser('~'), '.exopy_pulses',
+                            'server_key')
+
+logger = logging.getLogger(__name__)
+
+
+def parse_address(address):
+    """Convert an address to the format expected by multiprocessing.
+
+    Parameters
+    ----------
+    address : unicode
+        Either host:port or the path of a Unix socket (or of a named pipe on
+        Windows).
+
+    """
+    host, sep, port = address.rpartition(':')
+    if sep and host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def is_local_address(address):
+    """Check whether an address can only be reached from this machine.
+
+    Parameters
+    ----------
+    address : unicode
+        Address in the format accepted by parse_address.
+
+    """
+    address = parse_address(address)
+    if not isinstance(address, tuple):
+        return True
+    try:
+        ip = ipaddress.ip_address(socket.gethostbyname(address[0]))
+    except (OSError, ValueError):
+        return False
+    return ip.is_loopback
+
+
+def load_authkey(path=None):
+    """Load the key shared by the server and the clients of the current user.
+
+    The key is randomly generated the first time and stored in a file which
+    only the current user can read.
+
+    Parameters
+    ----------
+    path : unicode, optional
+        Path of the file storing the key. Defaults to AUTHKEY_PATH.
+
+    Raises
+    ------
+    PermissionError
+        Raised if the file can be accessed by other users.
+
+    """
+    path = path or AUTHKEY_PATH
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(token_hex(32))
+
+    if os.name == 'posix':
+        mode = os.stat(path).st_mode
+        if mode & (stat.S_IRWXG | stat.S_IRWXO):
+            msg = 'The key file {} must only be accessible by its owner.'
+            raise PermissionError(msg.format(path))
+    with open(path) as f:
+        key = f.read().strip()
+    if not key:
+        raise ValueError('The key file {} is empty.'.format(path))
+    return key.encode()
+
+
+class CompilationServer(Atom):
+    """Server compiling the sequences sent by CompilationClient.
+
+    """
+    #: Address on which to listen (see parse_address).
+    address = Str()
+
+    #: Key used to authenticate the clients. Defaults to the key of the
+    #: current user (see load_authkey).
+    authkey = Bytes()
+
+    #: Whether to accept to listen on an address reachable from other
+    #: machines. Only clients on a trusted network should be able to reach
+    #: such an address.
+    allow_remote = Bool()
+
+    #: Number of sequences compiled at once.
+    workers = Int(4)
+
+    #: Number of sequences and of rendered waveforms kept in the caches.
+    cache_size = Int(32)
+
+    #: Total size in bytes of the rendered waveforms kept in the cache.
+    #: Waveforms larger than this are not cached.
+    cache_bytes = Int(256 * 2**20)
+
+    #: Whether the server is accepting connections.
+    running = Bool()
+
+    def start(self):
+        """Start listening in a background thread.
+
+        Raises
+        ------
+        OSError
+            Raised if the address is already in use, for example by a server
+            started by another application.
+
+        ValueError
+            Raised if the address is not local and allow_remote is False.
+
+        """
+        if not self.allow_remote and not is_local_address(self.address):
+            msg = ('Refusing to listen on {}, which is not a local address, '
+                   'as the clients can run arbitrary code in the server.')
+            raise ValueError(msg.format(self.address))
+
+        self._listener = Listener(parse_address(self.address),
+                                  authkey=self.authkey)
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._stopping = False
+        self._thread = Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self.running = True
+
+    def stop(self):
+        """Stop accepting connections and wait for the workers.
+
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        # Accept does not return when the listener is closed, so connect to
+        # unblock it.
+        try:
+            Client(self._listener.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+        self._thread.join()
+        self._listener.close()
+        for thread in list(self._connections):
+            thread.join()
+        self._executor.shutdown()
+        self.running = False
+
+    def serve_forever(self):
+        """Start the server and block until it is stopped.
+
+        """
+        self.start()
+        self._thread.join()
+
+    def add_sequence(self, content_hash, data):
+        """Register a pickled sequence.
+
+        Parameters
+        ----------
+        content_hash : unicode
+            Hash of the content of the sequence.
+
+        data : bytes
+            Pickled sequence.
+
+        """
+        with self._lock:
+            self._sequences[content_hash] = data
+            self._sequences.move_to_end(content_hash)
+            while len(self._sequences) > self.cache_size:
+                self._sequences.popitem(last=False)
+
+    def compile(self, content_hash, external_vars):
+        """Compile a registered sequence.
+
+        Parameters
+        ----------
+        content_hash : unicode
+            Hash of the content of the sequence.
+
+        external_vars : dict
+            Values of the external variables of the sequence.
+
+        Returns
+        -------
+        result : bool
+            Whether the compilation succeeded.
+
+        buffers : dict or None
+            Rendered waveform of each channel of the context.
+
+        errors : dict
+            Errors which occurred during the compilation.
+
+        Raises
+        ------
+        KeyError
+            Raised if the sequence is not registered (or was evicted from the
+            cache).
+
+        """
+        key = (content_hash, repr(sorted(external_vars.items())))
+        with self._lock:
+            if key in self._waveforms:
+                self._waveforms.move_to_end(key)
+                return True, self._waveforms[key], {}
+
+        sequence = self._get_copy(content_hash)
+        sequence.external_vars = OrderedDict(external_vars)
+        context = sequence.context
+        items, errors = context.preprocess_sequence(sequence)
+        if errors:
+            return False, None, errors
+        duration = sequence.duration if sequence.time_constrained else None
+        buffers = context.render_sequence(items, duration)
+
+        nbytes = sum(b.nbytes for b in buffers.values())
+        with self._lock:
+            if key not in self._waveforms and nbytes <= self.cache_bytes:
+                self._waveforms[key] = buffers
+                self._waveforms_nbytes += nbytes
+            while (len(self._waveforms) > self.cache_size or
+                   self._waveforms_nbytes > self.cache_bytes):
+                _, evicted = self._waveforms.popitem(last=False)
+                self._waveforms_nbytes -= sum(b.nbytes
+                                              for b in evicted.values())
+        return True, buffers, {}
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Listener accepting the connections of the clients.
+    _listener = Value()
+
+    #: Pool of threads compiling the sequences.
+    _executor = Typed(ThreadPoolExecutor)
+
+    #: Thread accepting the connections.
+    _thread = Typed(Thread)
+
+    #: Threads handling the open connections.
+    _connections = Typed(set, ())
+
+    #: Flag signaling the threads to stop.
+    _stopping = Bool()
+
+    #: Lock protecting the caches.
+    _lock = Value(factory=Lock)
+
+    #: Pickled sequences by content hash.
+    _sequences = Typed(OrderedDict, ())
+
+    #: Rendered waveforms by content hash and external variables.
+    _waveforms = Typed(OrderedDict, ())
+
+    #: Total size in bytes of the cached waveforms.
+    _waveforms_nbytes = Int()
+
+    #: Template bodies shared by all the sequences by content hash.
+    _bodies = Typed(dict, ())
+
+    #: Storage of the copies of the sequences used by each worker.
+    _local = Value(factory=local)
+
+    def _default_authkey(self):
+        """Use the key of the current user.
+
+        """
+        return load_authkey()
+
+    def _get_copy(self, content_hash):
+        """Access the copy of a sequence used by the current worker.
+
+        """
+        copies = getattr(self._local, 'copies', None)
+        if copies is None:
+            copies = self._local.copies = {}
+        if content_hash in copies:
+            return copies[content_hash]
+
+        with self._lock:
+            data = self._sequences[content_hash]
+            # Forget the copies of the sequences evicted from the cache.
+            for h in [h for h in copies if h not in self._sequences]:
+                del copies[h]
+
+        sequence = pickle.loads(data)
+        # The server compiles locally and never writes to the buffers folder
+        # of the client.
+        sequence.context.compilation_server = ''
+        sequence.context.buffers_folder = ''
+        # Nobody observes the copies of the server.
+        sequence.suppress_evaluation_notifications = True
+        for item in sequence.traverse():
+            body = getattr(item, 'body', None)
+            if body is not None:
+                with self._lock:
+                    item.body = self._bodies.setdefault(body.content_hash,
+                                                        body)
+
+        copies[content_hash] = sequence
+        return sequence
+
+    def _serve(self):
+        """Accept the connections until the server is stopped.
+
+        """
+        while True:
+            try:
+                connection = self._listener.accept()
+            except (AuthenticationError, EOFError):
+                logger.warning('Rejected a connection which failed to '
+                               'authenticate')
+                continue
+            except OSError:
+                if self._stopping:
+                    break
+                logger.exception('Failed to accept a connection')
+                continue
+            if self._stopping:
+                connection.close()
+                break
+            thread = Thread(target=self._handle, args=(connection,),
+                            daemon=True)
+            self._connections.add(thread)
+            thread.start()
+
+    def _handle(self, connection):
+        """Answer the requests of a client.
+
+        """
+        # Shared memory blocks are kept open until the client sends its next
+        # request, by which time it has copied them.
+        blocks = []
+        try:
+            while not self._stopping:
+                if not connection.poll(0.2):
+                    continue
+                request = connection.recv()
+                for block in blocks:
+                    block.close()
+                blocks = []
+                connection.send(self._answer(request, blocks))
+        except (EOFError, OSError):
+            pass
+        finally:
+            # The client normally unlinked the blocks already, but may have
+            # been interrupted before copying them.
+            for block in blocks:
+                block.close()
+                _unlink(block)
+            connection.close()
+            self._connections.discard(current_thread())
+
+    def _answer(self, request, blocks):
+        """Build the answer to a request.
+
+        """
+        content_hash = request['hash']
+        if request['sequence'] is not None:
+            self.add_sequence(content_hash, request['sequence'])
+        elif content_hash not in self._sequences:
+            return {'unknown': True}
+
+        future = self._executor.submit(self.compile, content_hash,
+                                       request['external_vars'])
+        try:
+            res, buffers, errors = future.result()
+        except Exception as e:
+            logger.exception('Failed to compile a sequence')
+            return {'success': False,
+                    'errors': {'Compilation server': repr(e)}}
+
+        if not res:
+            return {'success': False, 'errors': errors}
+        return {'success': True, 'errors': {},
+                'buffers': _export_buffers(buffers, blocks)}
+
+
+class CompilationClient(Atom):
+    """Client delegating the compilation of sequences to a server.
+
+    """
+    #: Address of the server (see parse_address).
+    address = Str()
+
+    #: Key used to authenticate with the server. Defaults to the key of the
+    #: current user (see load_authkey).
+    authkey = Bytes()
+
+    def compile(self, sequence, external_vars=None):
+        """Compile a sequence on the server.
+
+        Parameters
+        ----------
+        sequence : RootSequence
+            Sequence to compile. Its context is used for rendering.
+
+        external_vars : dict, optional
+            Values of the external variables overriding the ones of the
+            sequence.
+
+        Returns
+        -------
+        result : bool
+            Whether the compilation succeeded.
+
+        buffers : dict or None
+            Rendered waveform of each channel of the context.
+
+        errors : dict
+            Errors which occurred during the compilation.
+
+        Raises
+        ------
+        OSError
+            Raised if the server cannot be reached.
+
+        """
+        variables = dict(sequence.external_vars)
+        if external_vars:
+            variables.update(external_vars)
+        content_hash = sequence.content_hash
+
+        with self._lock:
+            # The sequence is sent only if the server does not know it yet,
+            # possibly because another client already sent it.
+            request = {'hash': content_hash, 'external_vars': variables,
+                       'sequence': None}
+            answer = self._request(request)
+            if answer.get('unknown'):
+                request['sequence'] = dumps_sequence(sequence)
+                answer = self._request(request)
+
+        if not answer['success']:
+            return False, None, answer['errors']
+        return True, _import_buffers(answer['buffers']), {}
+
+    def close(self):
+        """Close the connection to the server.
+
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Connection to the server.
+    _connection = Value()
+
+    #: Lock serializing the requests.
+    _lock = Value(factory=Lock)
+
+    def _default_authkey(self):
+        """Use the key of the current user.
+
+        """
+        return load_authkey()
+
+    def _request(self, request):
+        """Send a request, connecting (again) to the server if needed.
+
+        """
+        for attempt in (0, 1):
+            if self._connection is None:
+                self._connection = Client(parse_address(self.address),
+                                          authkey=self.authkey)
+            try:
+                self._connection.send(request)
+                return self._connection.recv()
+            except (EOFError, OSError):
+                # The server may have been restarted since the last request.
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+
+
+def _export_buffers(buffers, blocks):
+    """Copy the waveforms into shared memory blocks.
+
+    """
+    infos = {}
+    for channel, waveform in buffers.items():
+        waveform = np.ascontiguousarray(waveform)
+        block = SharedMemory(create=True, size=max(waveform.nbytes, 1))
+        np.ndarray(waveform.shape, waveform.dtype,
+                   buffer=block.buf)[:] = waveform
+        # The client is responsible for unlinking the block.
+        _untrack(block)
+        blocks.append(block)
+        infos[channel] = (block.name, waveform.dtype.str, waveform.shape)
+    return infos
+
+
+def _import_buffers(infos):
+    """Copy the waveforms out of the shared memory blocks and unlink them.
+
+    """
+    buffers = {}
+    for channel, (name, dtype, shape) in infos.items():
+        block = SharedMemory(name=name)
+        try:
+            buffers[channel] = np.ndarray(shape, dtype,
+                                          buffer=block.buf).copy()
+        finally:
+            block.close()
+            block.unlink()
+    return buffers
+
+
+def _untrack(block):
+    """Prevent the resource tracker from unlinking a block at exit.
+
+    """
+    if os.name == 'posix':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(block._name, 'shared_memory')
+
+
+def _unlink(block):
+    """Unlink a block created by the server if the client did not.
+
+    """
+    if os.name == 'posix':
+        from multiprocessing import resource_tracker
+        # Unlinking unregisters the block from the resource tracker.
+        resource_tracker.register(block._name, 'shared_memory')
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        if os.name == 'posix':
+            resource_tracker.unregister(block._name, 'shared_memory')
+
+
+def main(argv=None):
+    """Run a compilation server until interrupted.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='exopy_pulses_server',
+        description='Compile pulse sequences for the applications running '
+                    'on this machine.')
+    parser.add_argument('address',
+                        help='Path of the Unix socket or host:port on which '
+                             'to listen.')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='Number of sequences compiled at once.')
+    parser.add_argument('-c', '--cache-size', type=int, default=32,
+                        help='Number of sequences and waveforms cached.')
+    parser.add_argument('-m', '--cache-memory', type=int, default=256,
+                        help='Total size in MB of the waveforms cached.')
+    parser.add_argument('-k', '--authkey-file',
+                        help='File storing the key used to authenticate the '
+                             'clients (created if missing).')
+    parser.add_argument('--allow-remote', action='store_true',
+                        help='Accept to listen on an address reachable from '
+                             'other machines. The clients can run arbitrary '
+                             'code in the server.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = CompilationServer(address=args.address, workers=args.workers,
+                              cache_size=args.cache_size,
+                              cache_bytes=args.cache_memory * 2**20,
+                              authkey=load_authkey(args.authkey_file),
+                              allow_remote=args.allow_remote)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
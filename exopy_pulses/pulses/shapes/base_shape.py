@@ -40,6 +40,10 @@ class AbstractShape(HasEvaluableFields):
     #: Index of the parent pulse. This is set when evaluating the entries.
     index = Int()
 
+    #: Whether the value of the shape at a given time only depends on that
+    #: time, in which case a pulse can be computed by parts.
+    is_local = True
+
     def compute(self, time, unit):
         """ Computes the shape of the pulse at a given time.
 
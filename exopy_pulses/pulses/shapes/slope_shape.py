@@ -34,6 +34,9 @@ class SlopeShape(AbstractShape):
     #: Second input parameter, will be interpreted based on the selected mode.
     def2 = Str('1.0').tag(pref=True, feval=Feval(types=Real))
 
+    #: The ramp is computed from the number of points of the whole pulse.
+    is_local = False
+
     def eval_entries(self, root_vars, sequence_locals, missing, errors):
         """ Evaluate the parameters of the pulse shape.
 
@@ -10,7 +10,10 @@
 objects of the sequence.
 
 """
+from copy import copy
 from inspect import cleandoc
+from functools import lru_cache
+from hashlib import sha1
 from textwrap import fill
 from math import (cos, sin, tan, acos, asin, atan, sqrt, log10,
                   exp, log, cosh, sinh, tanh, atan2)
@@ -18,7 +21,7 @@ from cmath import pi as Pi
 import cmath as cm
 
 import numpy as np
-from atom.api import Dict
+from atom.api import Dict, Property, Value
 from exopy.utils.atom_util import tagged_members, HasPrefAtom
 from exopy.utils.traceback import format_exc
 
@@ -48,30 +51,65 @@ class MissingLocalVars(Exception):
 def eval_entry(string, seq_locals):
     """Evaluate a formula found in pulse sequence using the provided variables
 
-    """
-    aux_strings = string.split('{')
-    if len(aux_strings) > 1:
-        elements = [el for aux in aux_strings
-                    for el in aux.split('}')]
+    The parsing and compilation of the formula are cached so that evaluating
+    many times the same formula only costs the binding of the variables.
 
-        missings = [el for el in elements[1::2] if el not in seq_locals]
+    """
+    expr, names = parse_entry(string)
+    if names:
+        missings = [name for name in names if name not in seq_locals]
         if missings:
             raise MissingLocalVars(missings)
 
-        replacement_token = ['_a{}'.format(i)
-                             for i in range(len(elements[1::2]))]
         replacement_values = {'_a{}'.format(i): seq_locals[key]
-                              for i, key in enumerate(elements[1::2])}
-
-        str_to_eval = ''.join(key + '{}' for key in elements[::2])
-        str_to_eval = str_to_eval[:-2]
-
-        expr = str_to_eval.format(*replacement_token)
+                              for i, key in enumerate(names)}
     else:
         replacement_values = {}
-        expr = string
 
-    return eval(expr, globals(), replacement_values)
+    return eval(compile_entry(expr), globals(), replacement_values)
+
+
+@lru_cache(maxsize=4096)
+def parse_entry(string):
+    """Parse a formula and identify the variables it references.
+
+    Parameters
+    ----------
+    string : unicode
+        Formula in which variables are delimited by '{' and '}'.
+
+    Returns
+    -------
+    expr : unicode
+        Python expression in which the i-th variable is replaced by _ai.
+
+    names : tuple
+        Names of the variables in the order in which they appear.
+
+    """
+    aux_strings = string.split('{')
+    if len(aux_strings) == 1:
+        return string, ()
+
+    elements = [el for aux in aux_strings
+                for el in aux.split('}')]
+    names = tuple(elements[1::2])
+    replacement_token = ['_a{}'.format(i) for i in range(len(names))]
+
+    str_to_eval = ''.join(key + '{}' for key in elements[::2])
+    str_to_eval = str_to_eval[:-2]
+
+    return str_to_eval.format(*replacement_token), names
+
+
+@lru_cache(maxsize=4096)
+def compile_entry(expr):
+    """Compile a python expression.
+
+    Constant subexpressions are folded by the compiler.
+
+    """
+    return compile(expr, '<formula>', 'eval')
 
 
 class HasEvaluableFields(HasPrefAtom):
@@ -82,6 +120,13 @@ class HasEvaluableFields(HasPrefAtom):
     result should be stored as a global variables. In the second case, the
     value should be a Feval instance.
 
+    The object also maintains a hash of its content (the members tagged as
+    pref and its children). The hash is computed when first accessed and
+    invalidated, along with the one of the object owning it, when one of those
+    members changes, so that unchanged subtrees are identified without
+    serializing them. Containers should be replaced rather than modified in
+    place for the changes to be detected.
+
     Notes
     -----
     Feval should be imported from exopy_pulses.pulses.api not
@@ -89,6 +134,8 @@ class HasEvaluableFields(HasPrefAtom):
 
 
     """
+    #: Hash of the content of the object and of its children.
+    content_hash = Property()
 
     def eval_entries(self, global_vars, local_vars, missings, errors):
         """Evaluate and format all tagged members.
@@ -200,3 +247,103 @@ class HasEvaluableFields(HasPrefAtom):
     #: Dictionary in which the values computed by the eval_entries method are
     #: stored.
     _cache = Dict()
+
+    #: Names of the pref members which are not part of the content hash.
+    _hash_excluded = ()
+
+    #: Names of members, which are not tagged as pref, whose changes should
+    #: invalidate the content hash.
+    _hash_watched = ()
+
+    #: Cached value of the content hash (None when it should be recomputed).
+    _content_hash = Value()
+
+    #: Object whose pref member holds this object. Used to propagate the
+    #: invalidation of the content hash.
+    _hash_owner = Value()
+
+    def _formulas(self):
+        """List the formulas evaluated or formatted by the object.
+
+        """
+        members = list(tagged_members(self, 'fmt'))
+        members += list(tagged_members(self, 'feval'))
+        return [v for v in (getattr(self, m) for m in members)
+                if isinstance(v, str)]
+
+    def _evaluation_state(self):
+        """Copy the values computed during the last evaluation.
+
+        """
+        return {'_cache': dict(self._cache)}
+
+    def _restore_evaluation_state(self, state):
+        """Restore values computed previously (see _evaluation_state).
+
+        """
+        for name, value in state.items():
+            setattr(self, name, copy(value))
+
+    def _get_content_hash(self):
+        """Compute the content hash if it is not already known.
+
+        """
+        if self._content_hash is None:
+            cls = type(self)
+            if '_hash_observed' not in cls.__dict__:
+                cls._install_hash_observers()
+            content = sha1(cls.__name__.encode())
+            for name, value in self._hash_content():
+                if isinstance(value, HasEvaluableFields):
+                    value._hash_owner = self
+                if hasattr(value, 'content_hash'):
+                    value = value.content_hash
+                content.update('{}={!r};'.format(name, value).encode())
+            self._content_hash = content.hexdigest()
+
+        return self._content_hash
+
+    def _hash_content(self):
+        """List the (name, value) pairs entering the content hash.
+
+        Objects exposing a content_hash are replaced by their hash.
+
+        """
+        members = tagged_members(self, 'pref')
+        return [(name, getattr(self, name)) for name in sorted(members)
+                if name not in self._hash_excluded]
+
+    def _hash_parent(self):
+        """Object whose content hash depends on the one of this object.
+
+        """
+        return self._hash_owner
+
+    def _invalidate_content_hash(self, change=None):
+        """Invalidate the content hash of the object and of its ancestors.
+
+        """
+        if isinstance(change, dict):
+            value = change.get('value')
+            if isinstance(value, HasEvaluableFields):
+                value._hash_owner = self
+        self._content_hash = None
+        parent = self._hash_parent()
+        while (isinstance(parent, HasEvaluableFields) and
+               parent._content_hash is not None):
+            parent._content_hash = None
+            parent = parent._hash_parent()
+
+    @classmethod
+    def _install_hash_observers(cls):
+        """Observe the members entering the content hash of the instances.
+
+        """
+        members = cls.members()
+        names = set(tagged_members(cls, 'pref')) - set(cls._hash_excluded)
+        names.update(cls._hash_watched)
+        for name in names:
+            member = members[name]
+            if not member.has_observer('_invalidate_content_hash'):
+                member.add_static_observer('_invalidate_content_hash')
+        cls._hash_observed = True
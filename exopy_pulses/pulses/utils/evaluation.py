@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Evaluation of sequences leaving the edited model untouched.
+
+Evaluating a sequence writes the computed values (cache, start, stop, ...) on
+the items themselves, which prevents evaluating the same sequence for several
+sets of parameters at once and notifies the views of every change. The tools
+defined here evaluate a private copy of the sequence instead and return the
+results as an immutable object, whose mappings are read-only. They are used by
+BaseContext.compile_sequence_table to evaluate the variants of a table.
+
+"""
+import threading
+from copy import copy
+from collections import OrderedDict
+from types import MappingProxyType
+
+from atom.api import Atom, Bool, Float, Int, Str, Tuple, Value
+
+from ..item import Item
+from ..pulse import Pulse
+
+
+def copy_sequence(sequence):
+    """Build an independent copy of a root sequence.
+
+    The copy is rebuilt from a snapshot of the sequence, so that no plugin is
+    required. Template bodies are shared with the original sequence.
+
+    """
+    return sequence.snapshot().restore()
+
+
+class ItemResult(Atom):
+    """Values computed for an item during an evaluation.
+
+    """
+    #: Index of the item in the sequence.
+    index = Int()
+
+    #: Start instant of the item.
+    start = Float()
+
+    #: Stop instant of the item.
+    stop = Float()
+
+    #: Duration of the item.
+    duration = Float()
+
+    #: Read-only values of the evaluated fields of the item. For analogical
+    #: pulses the values of the shape and modulation are stored under the
+    #: 'shape' and 'modulation' keys.
+    values = Value(MappingProxyType({}))
+
+    #: Channel of the pulse once the channel mapping of the templates applied.
+    #: Empty for sequences.
+    channel = Str()
+
+    @classmethod
+    def from_item(cls, item):
+        """Collect the values computed for an evaluated item.
+
+        """
+        values = dict(item._cache)
+        channel = ''
+        if isinstance(item, Pulse):
+            channel = item.channel
+            if item.kind == 'Analogical':
+                values['modulation'] = dict(item.modulation._cache)
+                values['shape'] = dict(item.shape._cache)
+        result = cls(index=item.index, start=item.start, stop=item.stop,
+                     duration=item.duration, values=_freeze_mapping(values),
+                     channel=channel)
+        result.freeze()
+        return result
+
+
+class EvaluationResult(Atom):
+    """Immutable result of the evaluation of a sequence.
+
+    """
+    #: Whether the evaluation succeeded.
+    success = Bool()
+
+    #: Names of the variables which were never computed.
+    missings = Value(frozenset())
+
+    #: Read-only mapping of the errors which occurred during the evaluation.
+    errors = Value(MappingProxyType({}))
+
+    #: Read-only values of the external and local variables of the root.
+    variables = Value(MappingProxyType({}))
+
+    #: Read-only mapping of the results of the items of the sequence by
+    #: index.
+    items = Value(MappingProxyType({}))
+
+    #: Duration of the sequence if it is time constrained, None otherwise.
+    duration = Value()
+
+    #: Results of the pulses left after simplification, in the order of the
+    #: simplified sequence (pulses coming from templates included).
+    pulses = Tuple()
+
+    #: Copies of the simplified pulses which can be rendered by the context.
+    #: They are detached from the evaluated sequence.
+    simplified = Tuple()
+
+    @classmethod
+    def from_sequence(cls, root, res, missings, errors):
+        """Collect the results of the evaluation of a root sequence.
+
+        Parameters
+        ----------
+        root : RootSequence
+            Sequence which was just evaluated.
+
+        res : bool
+            Result of the evaluation.
+
+        missings : set
+            Variables which were never computed.
+
+        errors : dict
+            Errors which occurred during the evaluation.
+
+        """
+        items = {}
+        pulses = ()
+        simplified = ()
+        if res:
+            for item in root.traverse():
+                if isinstance(item, Item) and item is not root:
+                    items[item.index] = ItemResult.from_item(item)
+            simplified = tuple(_detach(p) for p in root.simplify_sequence())
+            pulses = tuple(ItemResult.from_item(p) for p in simplified)
+
+        variables = dict(root.external_vars)
+        variables.update(root._cache)
+        duration = root.duration if res and root.time_constrained else None
+        result = cls(success=bool(res), missings=frozenset(missings),
+                     errors=_freeze_mapping(errors),
+                     variables=_freeze_mapping(variables),
+                     items=MappingProxyType(items), duration=duration,
+                     pulses=pulses, simplified=simplified)
+        result.freeze()
+        return result
+
+
+class SequenceEvaluator(Atom):
+    """Evaluate a sequence using one private copy per thread.
+
+    The copy is rebuilt only when the content of the sequence changes so that
+    successive evaluations for different values of the external variables
+    reuse the results of the parts of the sequence which do not depend on
+    them.
+
+    """
+    #: Sequence to evaluate. It is never modified by the evaluations.
+    sequence = Value()
+
+    def evaluate(self, external_vars=None):
+        """Evaluate the sequence.
+
+        Parameters
+        ----------
+        external_vars : dict, optional
+            Values of the external variables overriding the ones of the
+            sequence.
+
+        Returns
+        -------
+        result : EvaluationResult
+            Immutable result of the evaluation.
+
+        """
+        seq = self._get_copy()
+        variables = OrderedDict(self.sequence.external_vars)
+        if external_vars:
+            variables.update(external_vars)
+        seq.external_vars = variables
+
+        res, missings, errors = seq.evaluate_sequence(True)
+        return EvaluationResult.from_sequence(seq, res, missings, errors)
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Thread local storage holding the copies.
+    _local = Value(factory=threading.local)
+
+    def _get_copy(self):
+        """Access the copy of the sequence used by the current thread.
+
+        """
+        local = self._local
+        content_hash = self.sequence.content_hash
+        if getattr(local, 'content_hash', None) != content_hash:
+            local.copy = copy_sequence(self.sequence)
+            local.content_hash = content_hash
+        return local.copy
+
+
+def _freeze_mapping(mapping):
+    """Build a read-only copy of a mapping and of the mappings it contains.
+
+    """
+    return MappingProxyType({k: (_freeze_mapping(v) if isinstance(v, dict)
+                                 else v)
+                             for k, v in mapping.items()})
+
+
+def _detach(pulse):
+    """Copy an evaluated pulse so that it is not affected by later
+    evaluations.
+
+    """
+    p = copy(pulse)
+    p.parent = None
+    p._cache = dict(pulse._cache)
+    if pulse.kind == 'Analogical':
+        p.modulation = copy(pulse.modulation)
+        p.modulation._cache = dict(pulse.modulation._cache)
+        p.shape = copy(pulse.shape)
+        p.shape._cache = dict(pulse.shape._cache)
+    return p
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Detection of periodic repetitions of identical pulses.
+
+Sequences built by copying a sub-sequence rather than by using a loop produce
+long runs of identical, evenly spaced groups of pulses once simplified. Those
+runs can be described by a single loop which is much cheaper to transfer to
+instruments supporting it.
+
+"""
+from hashlib import sha1
+
+from atom.api import Atom, Int, List, Str
+
+
+class PulseLoop(Atom):
+    """Repetition of a block of pulses at a fixed period.
+
+    """
+    #: Channel on which the pulses are played.
+    channel = Str()
+
+    #: Pulses of the first occurrence of the block, sorted by start.
+    block = List()
+
+    #: Index of the sample at which the first occurrence starts.
+    start = Int()
+
+    #: Number of samples between the starts of two consecutive occurrences.
+    period = Int()
+
+    #: Number of occurrences of the block.
+    count = Int()
+
+
+def find_loops(items, context, min_count=2, max_block=8):
+    """Rewrite the periodic runs of identical pulses of each channel as loops.
+
+    Two pulses are considered identical if they have the same kind and the
+    same waveform. A run is made of the repetitions of a block of
+    consecutive pulses of a channel, each occurrence of the block starting
+    after the end of the previous one.
+
+    Parameters
+    ----------
+    items : list
+        Simplified pulses as returned by preprocess_sequence.
+
+    context : BaseContext
+        Context used to convert times into samples.
+
+    min_count : int, optional
+        Minimal number of occurrences of a block to create a loop.
+
+    max_block : int, optional
+        Maximal number of pulses in a block.
+
+    Returns
+    -------
+    channels : dict
+        Mapping between the channels used by the pulses and the list of
+        pulses and PulseLoop describing them, sorted by start.
+
+    """
+    pulses = {}
+    for pulse in items:
+        pulses.setdefault(pulse.channel, []).append(pulse)
+
+    channels = {}
+    for channel, ch_pulses in pulses.items():
+        described = [(context.len_sample(p.start),
+                      context.len_sample(p.duration), _pulse_key(p), p)
+                     for p in ch_pulses]
+        described.sort(key=lambda d: d[0])
+        channels[channel] = _compress(channel, described, min_count,
+                                      max_block)
+
+    return channels
+
+
+def _pulse_key(pulse):
+    """Build a key identifying the waveform of a pulse.
+
+    """
+    if pulse.kind != 'Analogical':
+        return (pulse.kind,)
+    waveform = pulse.waveform
+    return (pulse.kind, len(waveform), sha1(waveform.tobytes()).hexdigest())
+
+
+def _compress(channel, described, min_count, max_block):
+    """Greedily replace the runs covering the most pulses by loops.
+
+    """
+    result = []
+    n = len(described)
+    i = 0
+    while i < n:
+        best = None
+        for size in range(1, min(max_block, (n - i) // 2) + 1):
+            block = described[i:i + size]
+            period = described[i + size][0] - block[0][0]
+            # Occurrences should not overlap.
+            if period < max(s + l for s, l, _, _ in block) - block[0][0]:
+                continue
+
+            count = 1
+            while i + (count + 1)*size <= n:
+                following = described[i + count*size:i + (count + 1)*size]
+                if any(f[2] != b[2] or f[1] != b[1] or
+                       f[0] - b[0] != count*period
+                       for f, b in zip(following, block)):
+                    break
+                count += 1
+
+            if count >= min_count and (best is None or
+                                       count*size > best[0]*best[1]):
+                best = (count, size, period)
+
+        if best is None:
+            result.append(described[i][3])
+            i += 1
+        else:
+            count, size, period = best
+            result.append(PulseLoop(channel=channel,
+                                    block=[d[3] for d in
+                                           described[i:i + size]],
+                                    start=described[i][0], period=period,
+                                    count=count))
+            i += count*size
+
+    return result
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Sparse representation of the waveform of a channel.
+
+A channel is described by a sorted list of non-overlapping segments, each
+segment being the index of its first sample and its values. The samples which
+do not belong to any segment are zero.
+
+Segments can be further deduplicated into a library of unique waveforms and a
+sequencer table referencing them, as expected by sequencer based AWGs.
+
+"""
+from hashlib import sha1
+
+import numpy as np
+from atom.api import Atom, Int, List, Dict, Value, Property
+
+
+class SparseChannel(Atom):
+    """Waveform of a channel stored as a list of non-zero segments.
+
+    """
+    #: Total number of samples of the channel.
+    length = Int()
+
+    #: Type of the samples.
+    dtype = Value(np.dtype(np.float64))
+
+    #: Sorted list of (start, values) tuples. Segments never overlap.
+    segments = List()
+
+    #: Number of samples stored in the segments.
+    nonzero_length = Property()
+
+    @classmethod
+    def from_pulses(cls, pulses, length, dtype, max_gap=0,
+                    split_abutting=False):
+        """Build a channel from evaluated pulses.
+
+        Overlapping pulses are summed for analogical channels and combined
+        using a logical or for logical ones.
+
+        Parameters
+        ----------
+        pulses : list
+            (start, values) tuples describing the pulses of the channel. The
+            pulses do not need to be sorted.
+
+        length : int
+            Total number of samples of the channel. Pulses extending past the
+            end are truncated.
+
+        dtype : numpy.dtype
+            Type of the samples of the channel.
+
+        max_gap : int, optional
+            Segments separated by at most this number of zero samples are
+            merged.
+
+        split_abutting : bool, optional
+            Keep the pulses starting exactly at the end of the previous ones
+            in their own segments, so that a WaveformLibrary can play
+            identical back to back pulses as repetitions.
+
+        """
+        dtype = np.dtype(dtype)
+        pulses = sorted((p for p in pulses if len(p[1]) and p[0] < length),
+                        key=lambda p: p[0])
+
+        # Group the pulses which overlap or are close enough.
+        groups = []
+        for start, values in pulses:
+            stop = min(start + len(values), length)
+            if (groups and start <= groups[-1][1] + max_gap and
+                    not (split_abutting and start == groups[-1][1])):
+                groups[-1][1] = max(groups[-1][1], stop)
+                groups[-1][2].append((start, values))
+            else:
+                groups.append([start, stop, [(start, values)]])
+
+        segments = []
+        for start, stop, members in groups:
+            if len(members) == 1 and len(members[0][1]) == stop - start:
+                values = np.asarray(members[0][1], dtype=dtype)
+            else:
+                values = np.zeros(stop - start, dtype=dtype)
+                for p_start, p_values in members:
+                    p_values = p_values[:stop - p_start]
+                    view = values[p_start - start:p_start - start +
+                                  len(p_values)]
+                    if dtype.kind == 'f':
+                        view += p_values
+                    else:
+                        view |= p_values
+            segments.append((start, values))
+
+        return cls(length=length, dtype=dtype, segments=segments)
+
+    @classmethod
+    def from_dense(cls, array, max_gap=0):
+        """Build a channel from a dense array by extracting its non-zero runs.
+
+        """
+        array = np.asarray(array)
+        nonzero = np.flatnonzero(array)
+        segments = []
+        if len(nonzero):
+            breaks = np.flatnonzero(np.diff(nonzero) > max_gap + 1)
+            starts = np.concatenate(([nonzero[0]], nonzero[breaks + 1]))
+            stops = np.concatenate((nonzero[breaks] + 1, [nonzero[-1] + 1]))
+            segments = [(int(start), array[start:stop].copy())
+                        for start, stop in zip(starts, stops)]
+
+        return cls(length=len(array), dtype=array.dtype, segments=segments)
+
+    def densify(self, start=0, stop=None):
+        """Build a dense array of the samples of the channel.
+
+        Parameters
+        ----------
+        start : int, optional
+            Index of the first sample to include.
+
+        stop : int, optional
+            Index of the last sample (excluded). By default the end of the
+            channel.
+
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        array = np.zeros(max(stop - start, 0), dtype=self.dtype)
+        for s_start, values in self.segments:
+            s_stop = s_start + len(values)
+            if s_stop <= start:
+                continue
+            if s_start >= stop:
+                break
+            first = max(start - s_start, 0)
+            last = min(stop - s_start, len(values))
+            offset = s_start + first - start
+            array[offset:offset + last - first] = values[first:last]
+
+        return array
+
+    # --- Private API ---------------------------------------------------------
+
+    def _get_nonzero_length(self):
+        """Getter for the nonzero_length property.
+
+        """
+        return sum(len(values) for _, values in self.segments)
+
+
+class WaveformLibrary(Atom):
+    """Library of unique waveforms and sequencer table using them.
+
+    """
+    #: Total number of samples of the channel.
+    length = Int()
+
+    #: Unique waveforms, the index of a waveform being its segment id.
+    waveforms = List()
+
+    #: Sequencer table as a list of (segment id, start, repeat) tuples sorted
+    #: by start. A segment repeated several times is played back to back.
+    table = List()
+
+    #: Ratio between the number of samples played by the table and the number
+    #: of samples stored in the library.
+    compression_ratio = Property()
+
+    @classmethod
+    def from_channel(cls, channel):
+        """Build the library of a sparse channel.
+
+        Parameters
+        ----------
+        channel : SparseChannel
+            Channel whose segments should be deduplicated.
+
+        """
+        library = cls(length=channel.length)
+        for start, values in channel.segments:
+            library.add_segment(start, values)
+        return library
+
+    def add_segment(self, start, values):
+        """Add a segment to the library and the sequencer table.
+
+        Segments should be added in increasing order of start.
+
+        Returns
+        -------
+        segment_id : int
+            Index of the waveform of the segment in the library.
+
+        """
+        values = np.ascontiguousarray(values)
+        key = (values.dtype.str, len(values), sha1(values).hexdigest())
+        segment_id = self._index.get(key)
+        if segment_id is None or not np.array_equal(self.waveforms[segment_id],
+                                                    values):
+            segment_id = len(self.waveforms)
+            self.waveforms.append(values)
+            self._index[key] = segment_id
+
+        if self.table:
+            last_id, last_start, repeat = self.table[-1]
+            if (last_id == segment_id and
+                    last_start + repeat*len(values) == start):
+                self.table[-1] = (last_id, last_start, repeat + 1)
+                return segment_id
+
+        self.table.append((segment_id, start, 1))
+        return segment_id
+
+    def densify(self):
+        """Rebuild the dense waveform described by the sequencer table.
+
+        """
+        dtype = self.waveforms[0].dtype if self.waveforms else np.float64
+        array = np.zeros(self.length, dtype=dtype)
+        for segment_id, start, repeat in self.table:
+            waveform = self.waveforms[segment_id]
+            stop = start + repeat*len(waveform)
+            array[start:stop] = np.tile(waveform, repeat)
+        return array
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Mapping between the hash of the waveforms and their index.
+    _index = Dict()
+
+    def _get_compression_ratio(self):
+        """Getter for the compression_ratio property.
+
+        """
+        stored = sum(len(w) for w in self.waveforms)
+        played = sum(len(self.waveforms[i])*repeat
+                     for i, _, repeat in self.table)
+        return played / stored if stored else 1.0
@@ -9,9 +9,24 @@
 """Helper functions for sequences IO.
 
 """
+import re
 from configobj import ConfigObj
 from textwrap import wrap
 
+#: Name of the entry in a config section identifying the object for each
+#: kind of build dependency.
+ID_KEYS = {'exopy.pulses.item': 'item_id',
+           'exopy.pulses.shape': 'shape_id',
+           'exopy.pulses.modulation': 'modulation_id',
+           'exopy.pulses.context': 'context_id',
+           'exopy.pulses.template': 'template_id'}
+
+#: Top level sections which are part of the header of a template file.
+HEADER_SECTIONS = ('context', 'template_vars')
+
+#: Regular expression matching the line opening a top level section.
+SECTION_START = re.compile(r'^\s*\[\s*([^\[\]]+?)\s*\]')
+
 
 def load_sequence_prefs(path):
     """ Load the preferences of a sequence stored in a file.
@@ -31,12 +46,50 @@ def load_sequence_prefs(path):
 
     """
     config = ConfigObj(path)
-    doc = ''
-    if config.initial_comment:
-        doc_list = [com[1:].strip() for com in config.initial_comment]
-        doc = '\n'.join(doc_list)
+    return config, _extract_doc(config)
 
-    return config, doc
+
+def load_template_header(path):
+    """ Load the header of a template file without parsing its items.
+
+    The header contains all the top level entries (template vars, local vars,
+    ...) and the context section, which are written before the items
+    sections. Parsing stops at the first section which is not part of the
+    header which makes this function much cheaper than load_sequence_prefs
+    for large templates. If the header is incomplete (for example because the
+    file was edited by hand and the items come first), the whole file is
+    parsed.
+
+    Parameters
+    ----------
+        path : unicode
+            Location of the template file.
+
+    Returns
+    -------
+        header : ConfigObj
+            The top level entries and the context section of the template.
+
+        doc : str
+            The doc of the template.
+
+    """
+    lines = []
+    with open(path) as f:
+        for line in f:
+            match = SECTION_START.match(line)
+            if match and match.group(1) not in HEADER_SECTIONS:
+                break
+            lines.append(line.rstrip('\r\n'))
+
+    header = ConfigObj(lines)
+    if 'template_vars' not in header or 'context' not in header:
+        header = ConfigObj(path)
+        for name in list(header.sections):
+            if name not in HEADER_SECTIONS:
+                del header[name]
+
+    return header, _extract_doc(header)
 
 
 def save_sequence_prefs(path, prefs, doc=''):
@@ -61,3 +114,15 @@ def save_sequence_prefs(path, prefs, doc=''):
         config.initial_comment = wrap(doc, 79)
 
     config.write()
+
+
+def _extract_doc(config):
+    """ Rebuild the doc of a sequence from the initial comment of its file.
+
+    """
+    doc = ''
+    if config.initial_comment:
+        doc_list = [com[1:].strip() for com in config.initial_comment]
+        doc = '\n'.join(doc_list)
+
+    return doc
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Lightweight read-only copies of sequences.
+
+A snapshot records the class and the values of the members tagged as pref of
+each component of a sequence (items, shapes, modulations and contexts) in a
+single pass, without converting them to strings. It can be pickled and used to
+rebuild an independent sequence, for example in a worker thread or process.
+
+dumps_sequence pickles a sequence, or any of its components, through their
+snapshots. The copy protocol of the components is not affected.
+
+"""
+import io
+import pickle
+from copy import copy
+
+from atom.api import Atom, Constant, Tuple, Value
+from exopy.utils.atom_util import tagged_members
+
+from .entry_eval import HasEvaluableFields
+from ..item import Item
+from ..sequences.template_sequence import TemplateBody
+
+
+class Snapshot(Atom):
+    """Frozen copy of the definition of a component of a sequence.
+
+    """
+    #: Class of the component.
+    cls = Value()
+
+    #: (name, value) pairs of the members tagged as pref. Evaluable objects
+    #: (shapes, modulations, contexts) are replaced by their snapshot, other
+    #: objects (such as template bodies) are shared.
+    state = Tuple()
+
+    #: Snapshots of the items of a sequence.
+    children = Tuple()
+
+    @classmethod
+    def from_object(cls, obj):
+        """Record the definition of a component and of its children.
+
+        """
+        state = []
+        defaults = _get_defaults(type(obj))
+        for name, member in tagged_members(obj, 'pref').items():
+            if isinstance(member, Constant):
+                continue
+            value = getattr(obj, name)
+            if isinstance(value, HasEvaluableFields):
+                value = cls.from_object(value)
+            # Values equal to the defaults are omitted to keep the snapshot
+            # (and its pickle) compact.
+            elif name in defaults and value == defaults[name]:
+                continue
+            else:
+                value = _copy_container(value)
+            state.append((name, value))
+
+        children = ()
+        if hasattr(obj, 'add_child_item'):
+            children = tuple(cls.from_object(i) for i in obj.items)
+
+        return _make_snapshot(type(obj), tuple(state), children)
+
+    def restore(self):
+        """Build a new object from the snapshot.
+
+        """
+        obj = self.cls()
+        for name, value in self.state:
+            if isinstance(value, Snapshot):
+                value = value.restore()
+            # Values equal to the defaults are not set to avoid triggering
+            # the handlers reacting to changes (such as the one resetting the
+            # linkable vars of the sequences).
+            elif value == getattr(obj, name):
+                continue
+            else:
+                value = _copy_container(value)
+            setattr(obj, name, value)
+
+        if self.children:
+            items = [child.restore() for child in self.children]
+            for item in items:
+                item.parent = obj
+            obj.items = items
+
+        # Root sequences propagate themselves to their items and index them
+        # once all of them are known, rather than once per inserted item. As
+        # when items are added to a sequence having a root, the root observes
+        # the linkable vars of all the items of the tree.
+        if getattr(obj, 'root', None) is obj:
+            obj._post_setattr_root(None, obj)
+            for item in obj.traverse():
+                if isinstance(item, Item) and item is not obj:
+                    item.observe('linkable_vars', obj._update_global_vars)
+            obj._recompute_indexes()
+
+        return obj
+
+    def __reduce__(self):
+        """Pickle the snapshot so that it is frozen once unpickled.
+
+        """
+        return _make_snapshot, (self.cls, self.state, self.children)
+
+
+def dumps_sequence(obj, protocol=pickle.HIGHEST_PROTOCOL):
+    """Pickle only the definition of a sequence or of one of its components.
+
+    The components are pickled as snapshots which hold neither the back
+    references to the parents and the root, nor the values computed during
+    the last evaluation. Loading a root sequence, using pickle.loads, hence
+    rebuilds the parents, roots and indexes of its items.
+
+    Parameters
+    ----------
+    obj : object
+        Sequence, component or any picklable object containing some.
+
+    protocol : int, optional
+        Pickle protocol to use.
+
+    Returns
+    -------
+    data : bytes
+        Pickled object.
+
+    """
+    buffer = io.BytesIO()
+    _SequencePickler(buffer, protocol).dump(obj)
+    return buffer.getvalue()
+
+
+class _SequencePickler(pickle.Pickler):
+    """Pickler replacing the components of sequences by their snapshots.
+
+    """
+    def reducer_override(self, obj):
+        """Reduce the evaluable objects and the template bodies.
+
+        """
+        if isinstance(obj, HasEvaluableFields):
+            return Snapshot.restore, (Snapshot.from_object(obj),)
+        if isinstance(obj, TemplateBody):
+            return obj._reduce_definition()
+        return NotImplemented
+
+
+def _make_snapshot(cls, state, children):
+    """Create a frozen snapshot.
+
+    """
+    snapshot = Snapshot(cls=cls, state=state, children=children)
+    snapshot.freeze()
+    return snapshot
+
+
+#: Default values of the members tagged as pref of the classes already
+#: snapshotted.
+_DEFAULTS = {}
+
+
+def _get_defaults(cls):
+    """Access the default values of the members tagged as pref of a class.
+
+    """
+    if cls not in _DEFAULTS:
+        obj = cls()
+        _DEFAULTS[cls] = {name: getattr(obj, name)
+                          for name in tagged_members(obj, 'pref')
+                          if not isinstance(getattr(obj, name),
+                                            HasEvaluableFields)}
+    return _DEFAULTS[cls]
+
+
+def _copy_container(value):
+    """Copy the containers so that the snapshot is not affected by changes.
+
+    """
+    return copy(value) if isinstance(value, (dict, list, set)) else value
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Persistent index of the templates found in the templates folders.
+
+The index maps the path of each template file to its modification time, size
+and content hash and to the metadata extracted from its header, so that only
+the files which changed since the last scan need to be read again.
+
+"""
+import os
+import json
+import logging
+from ast import literal_eval
+from hashlib import sha1
+
+from atom.api import Atom, Dict, Str
+from watchdog.events import (FileSystemEventHandler, FileCreatedEvent,
+                             FileDeletedEvent, FileModifiedEvent,
+                             FileMovedEvent)
+from exopy.utils.traceback import format_exc
+
+from .sequences_io import load_template_header
+
+
+#: Extension of the files in which templates are stored.
+TEMPLATE_EXT = '.temp_pulse.ini'
+
+#: Version of the format of the persisted index. An index saved with a
+#: different version is discarded.
+INDEX_VERSION = 1
+
+
+def read_template_header(path):
+    """Build the metadata of a template from the header of its file.
+
+    Parameters
+    ----------
+    path : unicode
+        Path to the template file.
+
+    Returns
+    -------
+    metadata : dict
+        Metadata describing the template (doc, vars, channels), the template
+        config itself is not loaded.
+
+    """
+    header, doc = load_template_header(path)
+    context = header.get('context', {})
+    return {'is_template': True, 'path': path, 'loaded': False,
+            'template_doc': doc,
+            'template_vars': literal_eval(header.get('template_vars', '{}')),
+            'analogical_channels':
+                literal_eval(context.get('analogical_channels', '[]')),
+            'logical_channels':
+                literal_eval(context.get('logical_channels', '[]'))}
+
+
+def list_template_files(folders):
+    """List the template files found in a set of folders.
+
+    Parameters
+    ----------
+    folders : list
+        Folders in which to look for templates.
+
+    Returns
+    -------
+    templates : dict
+        Mapping between the name of the templates and the path of the file.
+        If the same name is found in multiple folders the last one wins.
+
+    """
+    templates = {}
+    for path in folders:
+        if os.path.isdir(path):
+            filenames = sorted(entry.name for entry in os.scandir(path)
+                               if (entry.is_file() and
+                                   entry.name.endswith(TEMPLATE_EXT)))
+            for filename in filenames:
+                templates[filename[:-len(TEMPLATE_EXT)]] = \
+                    os.path.join(path, filename)
+        else:
+            logger = logging.getLogger(__name__)
+            logger.warning('{} is not a valid directory'.format(path))
+
+    return templates
+
+
+class TemplatesIndex(Atom):
+    """Index of template files persisted between sessions.
+
+    """
+    #: Path of the file in which the index is saved. If empty the index is
+    #: not persisted.
+    path = Str()
+
+    #: Entries of the index. The keys are the paths of the template files and
+    #: the values dict containing the mtime, size, hash and metadata of the
+    #: template.
+    entries = Dict()
+
+    def load(self):
+        """Load the index from the disk.
+
+        A missing or corrupted index is simply ignored.
+
+        """
+        if not self.path or not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except Exception:
+            logger = logging.getLogger(__name__)
+            msg = 'Failed to load the templates index {} :\n{}'
+            logger.warning(msg.format(self.path, format_exc()))
+            return
+
+        if data.get('version') == INDEX_VERSION:
+            self.entries = data['entries']
+
+    def save(self):
+        """Save the index to the disk.
+
+        """
+        if not self.path:
+            return
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries}, f)
+        os.replace(temp_path, self.path)
+
+    def stale(self, paths):
+        """List the paths whose entries may be outdated.
+
+        Only the modification time and size of the files are checked, which
+        is cheap compared to reading them.
+
+        Parameters
+        ----------
+        paths : iterable
+            Paths of the template files to check.
+
+        Returns
+        -------
+        stale : list
+            Paths which are unknown, modified or do not exist anymore.
+
+        """
+        stale = []
+        entries = self.entries
+        for path in paths:
+            entry = entries.get(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if entry is not None:
+                    stale.append(path)
+                continue
+            if (not entry or entry['mtime'] != stat.st_mtime or
+                    entry['size'] != stat.st_size):
+                stale.append(path)
+        return stale
+
+    def update(self, paths):
+        """Update the entries corresponding to a set of paths.
+
+        Only the files whose modification time or size changed are read and
+        their header only parsed if their content changed.
+
+        Parameters
+        ----------
+        paths : iterable
+            Paths of the template files to update. Paths which do not exist
+            anymore are removed from the index.
+
+        Returns
+        -------
+        changed : list
+            Paths of the templates whose metadata were updated.
+
+        removed : list
+            Paths of the templates removed from the index.
+
+        """
+        changed = []
+        removed = []
+        entries = self.entries
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if entries.pop(path, None) is not None:
+                    removed.append(path)
+                continue
+
+            entry = entries.get(path)
+            if (entry and entry['mtime'] == stat.st_mtime and
+                    entry['size'] == stat.st_size):
+                continue
+
+            with open(path, 'rb') as f:
+                digest = sha1(f.read()).hexdigest()
+            if entry and entry['hash'] == digest:
+                entry['mtime'] = stat.st_mtime
+                entry['size'] = stat.st_size
+                continue
+
+            try:
+                metadata = read_template_header(path)
+            except Exception:
+                logger = logging.getLogger(__name__)
+                msg = 'Failed to read the header of template {} :\n{}'
+                logger.warning(msg.format(path, format_exc()))
+                if entries.pop(path, None) is not None:
+                    removed.append(path)
+                continue
+
+            entries[path] = {'mtime': stat.st_mtime, 'size': stat.st_size,
+                             'hash': digest, 'metadata': metadata}
+            changed.append(path)
+
+        return changed, removed
+
+    def discard(self, paths):
+        """Remove the entries corresponding to a set of paths.
+
+        """
+        for path in paths:
+            self.entries.pop(path, None)
+
+
+class TemplatesUpdater(FileSystemEventHandler):
+    """Watchdog handler calling a function with the paths of the templates
+    which were created, modified, moved or deleted.
+
+    """
+    def __init__(self, handler):
+        self.handler = handler
+
+    def on_created(self, event):
+        """Called on creation of a file.
+
+        """
+        if isinstance(event, FileCreatedEvent):
+            self._notify(event.src_path)
+
+    def on_modified(self, event):
+        """Called on modification of a file.
+
+        """
+        if isinstance(event, FileModifiedEvent):
+            self._notify(event.src_path)
+
+    def on_deleted(self, event):
+        """Called on deletion of a file.
+
+        """
+        if isinstance(event, FileDeletedEvent):
+            self._notify(event.src_path)
+
+    def on_moved(self, event):
+        """Called on displacement of a file.
+
+        """
+        if isinstance(event, FileMovedEvent):
+            self._notify(event.src_path, event.dest_path)
+
+    def _notify(self, *paths):
+        """Call the handler with the paths corresponding to templates.
+
+        """
+        paths = [p for p in paths if p.endswith(TEMPLATE_EXT)]
+        if paths:
+            self.handler(paths)
@@ -12,13 +12,29 @@
 import os
 from pprint import pformat
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from atom.api import Value, Str, Float, Typed
+from atom.api import Value, Str, Float, Bool, Typed, List
 from exopy.tasks.api import InstrumentTask
+from exopy.tasks.tasks.shared_resources import ResourceHolder
 from exopy.utils.atom_util import ordered_dict_from_pref, ordered_dict_to_pref
 from exopy.utils.traceback import format_exc
 
 
+class PrefetchResource(ResourceHolder):
+    """Resource holder stopping the background compilations of the tasks.
+
+    """
+    def release(self):
+        """Stop the background compilations and their executors.
+
+        """
+        with self.locked():
+            for name in list(self):
+                self[name]._stop_prefetch()
+                del self[name]
+
+
 class TransferPulseSequenceTask(InstrumentTask):
     """Build and transfer a pulse sequence to an instrument.
 
@@ -36,6 +52,21 @@ class TransferPulseSequenceTask(InstrumentTask):
     sequence_vars = Typed(OrderedDict, ()).tag(pref=(ordered_dict_to_pref,
                                                      ordered_dict_from_pref))
 
+    #: Whether to transfer all the points of a sweep at once as a sequence
+    #: table and only select the right entry when performing the task.
+    use_sequence_table = Bool().tag(pref=True)
+
+    #: Name of the external variable of the sequence which is swept.
+    sweep_var = Str().tag(pref=True)
+
+    #: Values taken by the swept variable (evaluated once).
+    sweep_values = Str().tag(pref=True)
+
+    #: Whether to compile the sequence for the next swept value in a
+    #: background thread while the current point is acquired. Ignored when
+    #: using a sequence table.
+    prefetch_next = Bool().tag(pref=True)
+
     def check(self, *args, **kwargs):
         """Check that the sequence can be compiled.
 
@@ -61,7 +92,28 @@ class TransferPulseSequenceTask(InstrumentTask):
             return test, traceback
 
         context = seq.context
-        res, infos, errors = context.compile_and_transfer_sequence(seq)
+        if self.use_sequence_table:
+            try:
+                if not context.supports_sequence_table:
+                    raise ValueError('The context does not support sequence '
+                                     'tables.')
+                values, variants = self._build_sweep_variants()
+            except Exception as e:
+                traceback[err_path+'table'] = str(e)
+                return False, traceback
+            res, infos, errors = context.compile_and_transfer_table(seq,
+                                                                    variants)
+        else:
+            if self.prefetch_next:
+                try:
+                    if not context.supports_precompilation:
+                        raise ValueError('The context does not support '
+                                         'compiling ahead of time.')
+                    self._build_sweep_variants()
+                except Exception as e:
+                    traceback[err_path+'prefetch'] = str(e)
+                    return False, traceback
+            res, infos, errors = context.compile_and_transfer_sequence(seq)
 
         if not res:
             traceback[err_path+'compil'] = errors
@@ -87,11 +139,16 @@ class TransferPulseSequenceTask(InstrumentTask):
         for k, v in self.sequence_vars.items():
             seq.external_vars[k] = self.format_and_eval_string(v)
 
-        res, infos, errors = context.compile_and_transfer_sequence(seq,
-                                                                   self.driver)
-        if not res:
-            raise Exception('Failed to compile sequence :\n' +
-                            pformat(errors))
+        if self.use_sequence_table:
+            infos = self._perform_table()
+        elif self.prefetch_next:
+            infos = self._perform_prefetched()
+        else:
+            res, infos, errors = context.compile_and_transfer_sequence(
+                seq, self.driver)
+            if not res:
+                raise Exception('Failed to compile sequence :\n' +
+                                pformat(errors))
 
         for k, v in infos.items():
             self.write_in_database(k, v)
@@ -138,11 +195,148 @@ class TransferPulseSequenceTask(InstrumentTask):
 
         return task
 
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    #: Identify the table last transferred (content of the sequence and
+    #: variables of each point).
+    _table_key = Value()
+
+    #: Values of the swept variable in the transferred table.
+    _table_values = List()
+
+    #: Infos returned by the context when transferring the table.
+    _table_infos = Value()
+
+    def _build_sweep_variants(self):
+        """Evaluate the swept values and build the variables of each point.
+
+        The non-swept variables are supposed to be already evaluated.
+
+        """
+        seq = self.sequence
+        if self.sweep_var not in self.sequence_vars:
+            msg = 'The swept variable {} is not a variable of the sequence.'
+            raise ValueError(msg.format(self.sweep_var))
+
+        values = list(self.format_and_eval_string(self.sweep_values))
+        base = {k: seq.external_vars[k] for k in self.sequence_vars
+                if k != self.sweep_var}
+        variants = [dict(base, **{self.sweep_var: v}) for v in values]
+        return values, variants
+
+    def _perform_table(self):
+        """Transfer the sequence table if necessary and select the entry
+        matching the current value of the swept variable.
+
+        """
+        seq = self.sequence
+        values, variants = self._build_sweep_variants()
+        key = (seq.content_hash,
+               tuple(tuple(sorted(v.items())) for v in variants))
+        if key != self._table_key:
+            res, infos, errors = seq.context.compile_and_transfer_table(
+                seq, variants, self.driver)
+            if not res:
+                raise Exception('Failed to compile sequence table :\n' +
+                                pformat(errors))
+            self._table_key = key
+            self._table_values = values
+            self._table_infos = infos
+
+        value = seq.external_vars[self.sweep_var]
+        try:
+            index = self._table_values.index(value)
+        except ValueError:
+            msg = 'The value {} of {} is not part of the swept values.'
+            raise Exception(msg.format(value, self.sweep_var))
+
+        seq.context.select_table_entry(index, self.driver)
+        return self._table_infos
+
+    #: Executor used to compile the next point in the background.
+    _executor = Value()
+
+    #: Variables of the point being compiled in the background and future
+    #: holding the result of the compilation.
+    _prefetched = Value()
+
+    def _perform_prefetched(self):
+        """Transfer the sequence compiled in the background if it matches the
+        current variables and start compiling the next point.
+
+        """
+        seq = self.sequence
+        context = seq.context
+        values, variants = self._build_sweep_variants()
+        current = {k: seq.external_vars[k] for k in self.sequence_vars}
+
+        compiled = None
+        if self._prefetched and self._prefetched[0] == current:
+            try:
+                res, compiled, _ = self._prefetched[1].result()
+            except Exception:
+                res = False
+            if not res:
+                compiled = None
+        elif self._prefetched:
+            self._prefetched[1].cancel()
+        self._prefetched = None
+
+        if compiled is None:
+            res, compiled, errors = context.compile_sequence(seq)
+            if not res:
+                raise Exception('Failed to compile sequence :\n' +
+                                pformat(errors))
+
+        value = seq.external_vars[self.sweep_var]
+        index = next((i for i, v in enumerate(values) if v == value), None)
+        if index is not None and index + 1 < len(variants):
+            variant = variants[index + 1]
+            copy = self._copy_sequence()
+            copy.external_vars.update(variant)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+                resources = self.root.resources
+                if 'prefetch' not in resources:
+                    resources['prefetch'] = PrefetchResource()
+                resources['prefetch'][self.path + '/' + self.name] = self
+            future = self._executor.submit(copy.context.compile_sequence,
+                                           copy)
+            self._prefetched = (variant, future)
+
+        res, infos, errors = context.transfer_compiled_sequence(compiled,
+                                                                self.driver)
+        if not res:
+            raise Exception('Failed to transfer sequence :\n' +
+                            pformat(errors))
+        return infos
+
+    def _stop_prefetch(self):
+        """Cancel the pending background compilation and stop the executor.
+
+        """
+        if self._prefetched:
+            self._prefetched[1].cancel()
+        self._prefetched = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _copy_sequence(self):
+        """Build an independent copy of the sequence.
+
+        """
+        from exopy_pulses.pulses.utils.evaluation import copy_sequence
+        return copy_sequence(self.sequence)
+
     def _post_setattr_sequence(self, old, new):
         """Set up n observer on the sequence context to properly update the
         database entries.
 
         """
+        self._stop_prefetch()
         entries = self.database_entries.copy()
         if old:
             old.unobserve('context', self._update_database_entries)
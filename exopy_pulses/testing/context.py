@@ -9,7 +9,7 @@
 """Sequence context used for testing.
 
 """
-from atom.api import Float, set_default
+from atom.api import Float, List, set_default
 from exopy_pulses.pulses.contexts.base_context import BaseContext
 
 
@@ -21,7 +21,22 @@ class DummyContext(BaseContext):
 
     analogical_channels = set_default(('Ch1_A', 'Ch2_A'))
 
-    sampling = Float(1.0)
+    supports_precompilation = set_default(True)
+
+    supports_sequence_table = set_default(True)
+
+    supports_async_transfer = set_default(True)
+
+    sampling = Float(1.0).tag(pref=True)
+
+    #: Entries selected using select_table_entry.
+    selected_entries = List()
+
+    #: Sequences passed to transfer_compiled_sequence.
+    transferred = List()
+
+    #: Channels which differed from the loaded ones for each transfer.
+    sent_channels = List()
 
     def compile_and_transfer_sequence(self, sequence, driver=None):
         """Simply evaluate and simplify the underlying sequence.
@@ -32,6 +47,43 @@ class DummyContext(BaseContext):
             return False, {}, errors
         return True, {'test': True}, {}
 
+    def transfer_compiled_sequence(self, compiled, driver):
+        """Record the transferred sequence and the modified channels.
+
+        """
+        self.transferred.append(compiled)
+        self.sent_channels.append(sorted(self.diff_channels(compiled)))
+        self.mark_loaded(compiled)
+        return True, {'test': True}, {}
+
+    def compile_and_transfer_table(self, sequence, variants, driver=None):
+        """Render all the variants.
+
+        """
+        table, waveforms, errors = self.compile_sequence_table(sequence,
+                                                               variants)
+        if errors:
+            return False, {}, errors
+        return True, {'test': True}, {}
+
+    def select_table_entry(self, index, driver):
+        """Record the selected entry.
+
+        """
+        self.selected_entries.append(index)
+
+    async def transfer_channel_async(self, channel, waveform, driver):
+        """Write the waveform using a FakeAsyncDriver.
+
+        """
+        await driver.write_waveform(channel, waveform)
+
+    async def finalize_transfer_async(self, sequence, driver):
+        """Simply return the test infos.
+
+        """
+        return {'test': True}
+
     def list_sequence_infos(self):
         return {'test': False}
 
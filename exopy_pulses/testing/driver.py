@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Fake asynchronous driver used for testing and benchmarking transfers.
+
+"""
+import asyncio
+from time import perf_counter
+
+from atom.api import Atom, Float, Dict, List, Value
+
+
+class FakeAsyncDriver(Atom):
+    """Driver simulating the latency and the bandwidth of an instrument link.
+
+    Transfers are serialized as they would be on a real link.
+
+    """
+    #: Time in seconds needed to start any transfer.
+    latency = Float(1e-3)
+
+    #: Number of bytes transferred per second.
+    bandwidth = Float(100e6)
+
+    #: Waveforms written on the instrument by channel.
+    waveforms = Dict()
+
+    #: Log of the transfers as (channel, start, stop) tuples. The times are
+    #: measured using time.perf_counter.
+    transfers = List()
+
+    async def write_waveform(self, channel, waveform):
+        """Write the waveform of a channel.
+
+        """
+        async with self._get_lock():
+            start = perf_counter()
+            await asyncio.sleep(self.latency +
+                                waveform.nbytes / self.bandwidth)
+            self.waveforms[channel] = waveform.copy()
+            self.transfers.append((channel, start, perf_counter()))
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Lock serializing the transfers.
+    _lock = Value()
+
+    #: Event loop to which the lock belongs.
+    _lock_loop = Value()
+
+    def _get_lock(self):
+        """Get a lock bound to the running event loop.
+
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock_loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
@@ -49,5 +49,8 @@ setup(
     install_requires=['exopy', 'numpy'],
     entry_points={
         'exopy_package_extension':
-        'exopy_pulses = %s:list_manifests' % PROJECT_NAME}
+        'exopy_pulses = %s:list_manifests' % PROJECT_NAME,
+        'console_scripts':
+        ['exopy_pulses_compile = %s.pulses.cli:main' % PROJECT_NAME,
+         'exopy_pulses_server = %s.pulses.server:main' % PROJECT_NAME]}
 )
@@ -10,7 +10,9 @@
 
 """
 import pytest
+import numpy as np
 
+from exopy_pulses.pulses.contexts.base_context import BaseContext
 from exopy_pulses.testing.context import DummyContext
 
 
@@ -61,3 +63,429 @@ def test_context_id(context):
 
     """
     assert context.context_id == 'exopy_pulses.DummyContext'
+
+
+def test_render_sequence(context):
+    """Test rendering simplified pulses into channel buffers.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    pulses = [Pulse(channel='Ch1_L', def_1='0.2', def_2='0.5'),
+              Pulse(channel='Ch1_A', def_1='0.1', def_2='0.4',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5')),
+              Pulse(channel='Ch1_A', def_1='0.3', def_2='0.6',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5'))]
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+
+    items, errors = context.preprocess_sequence(root)
+    assert not errors
+
+    buffers = context.render_sequence(items)
+    assert sorted(buffers) == ['Ch1_A', 'Ch1_L', 'Ch2_A', 'Ch2_L']
+    assert len(buffers['Ch2_A']) == 6
+    assert list(buffers['Ch1_L']) == [0, 0, 1, 1, 1, 0]
+    assert buffers['Ch1_L'].dtype.name == 'int8'
+    assert list(buffers['Ch1_A']) == [0, 0.5, 0.5, 1, 0.5, 0.5]
+
+    buffers = context.render_sequence(items, 0.4)
+    assert list(buffers['Ch1_L']) == [0, 0, 1, 1]
+
+
+def test_iter_rendered_chunks(context):
+    """Test rendering a sequence by chunks.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.shapes.slope_shape import SlopeShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    pulses = [Pulse(channel='Ch1_L', def_1='0.2', def_2='0.5'),
+              Pulse(channel='Ch2_L', def_1='0.7', def_2='0.9'),
+              Pulse(channel='Ch1_A', def_1='0.1', def_2='0.4',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5')),
+              Pulse(channel='Ch1_A', def_1='0.3', def_2='1.2',
+                    kind='Analogical', shape=SlopeShape())]
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+
+    items, errors = context.preprocess_sequence(root)
+    assert not errors
+    full = context.render_sequence(items, 1.5)
+
+    chunks = list(context.iter_rendered_chunks(items, 4, 1.5))
+    assert [offset for offset, _ in chunks] == [0, 4, 8, 12]
+    assert len(chunks[-1][1]['Ch1_A']) == 3
+    for ch in full:
+        rendered = np.concatenate([c[ch] for _, c in chunks])
+        np.testing.assert_array_almost_equal(rendered, full[ch])
+
+    assert not list(context.iter_rendered_chunks([], 4))
+    assert len(context.render_sequence([])['Ch1_A']) == 0
+
+
+def test_render_sequence_memmap(context, tmpdir):
+    """Test rendering a sequence into memory mapped files.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    pulses = [Pulse(channel='Ch1_L', def_1='0.2', def_2='0.9'),
+              Pulse(channel='Ch1_A', def_1='0.1', def_2='1.4',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5'))]
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+    items, errors = context.preprocess_sequence(root)
+    assert not errors
+    in_memory = context.render_sequence(items)
+
+    assert context.load_buffers('test') is None
+    context.buffers_folder = str(tmpdir.join('buffers'))
+    context.buffers_chunk_size = 4
+    assert context.load_buffers('test') is None
+
+    buffers = context.render_sequence(items, name='test')
+    for ch in in_memory:
+        assert isinstance(buffers[ch], np.memmap)
+        np.testing.assert_array_equal(buffers[ch], in_memory[ch])
+        assert buffers[ch].dtype == in_memory[ch].dtype
+    del buffers
+
+    loaded = context.load_buffers('test')
+    assert sorted(loaded) == sorted(in_memory)
+    np.testing.assert_array_equal(loaded['Ch1_A'], in_memory['Ch1_A'])
+    assert not loaded['Ch1_A'].flags.writeable
+    assert context.load_buffers('other') is None
+
+
+def test_render_sequence_temporary_memmap(context, tmpdir):
+    """Test that unnamed sequences are rendered into distinct temporary files.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    root.add_child_item(0, Pulse(channel='Ch1_L', def_1='0.2', def_2='0.9'))
+    items, _ = context.preprocess_sequence(root)
+
+    folder = tmpdir.join('buffers')
+    context.buffers_folder = str(folder)
+    first = context.render_sequence(items)
+    second = context.render_sequence(items[:0], 0.5)
+    assert first['Ch1_L'].sum() == 7 and second['Ch1_L'].sum() == 0
+    del first, second
+    assert not folder.listdir()
+
+
+def test_compile_sequence_table_memmap(context, tmpdir):
+    """Test that the variants of a table rendered into memory mapped files do
+    not overwrite each other.
+
+    """
+    from collections import OrderedDict
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context,
+                        external_vars=OrderedDict({'a': 0.1}))
+    root.add_child_item(0, Pulse(channel='Ch1_A', def_1='0', def_2='0.3',
+                                 kind='Analogical',
+                                 shape=SquareShape(amplitude='{a}')))
+
+    context.buffers_folder = str(tmpdir.join('buffers'))
+    table, waveforms, errors = context.compile_sequence_table(
+        root, [{'a': 0.1}, {'a': 0.5}, {'a': 0.1}])
+    assert not errors
+    assert table == [0, 1, 0]
+    np.testing.assert_array_almost_equal(waveforms[0]['Ch1_A'], [0.1]*3)
+    np.testing.assert_array_almost_equal(waveforms[1]['Ch1_A'], [0.5]*3)
+
+    # The variants are evaluated on a copy of the sequence.
+    assert root.external_vars == {'a': 0.1}
+    assert not root.items[0].shape._cache
+
+
+def test_local_settings(context):
+    """Test that the machine local settings are used as defaults and are not
+    saved with the context.
+
+    """
+    from exopy_pulses.pulses.contexts.base_context import LOCAL_SETTINGS
+    LOCAL_SETTINGS.buffers_folder = 'dummy'
+    try:
+        assert DummyContext().buffers_folder == 'dummy'
+    finally:
+        LOCAL_SETTINGS.buffers_folder = ''
+    assert 'buffers_folder' not in context.preferences_from_members()
+
+
+def test_render_segments(context):
+    """Test rendering a sequence as sparse segments.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    pulses = [Pulse(channel='Ch1_L', def_1='0.2', def_2='0.5'),
+              Pulse(channel='Ch1_L', def_1='1.0', def_2='1.2'),
+              Pulse(channel='Ch1_A', def_1='0.1', def_2='0.4',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5')),
+              Pulse(channel='Ch1_A', def_1='0.3', def_2='0.6',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5'))]
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+    items, errors = context.preprocess_sequence(root)
+    assert not errors
+
+    dense = context.render_sequence(items, 1.5)
+    sparse = context.render_segments(items, 1.5)
+    assert sorted(sparse) == sorted(dense)
+    for ch in dense:
+        np.testing.assert_array_almost_equal(sparse[ch].densify(), dense[ch])
+        assert sparse[ch].dtype == dense[ch].dtype
+
+    assert len(sparse['Ch1_L'].segments) == 2
+    assert len(sparse['Ch1_A'].segments) == 1
+    assert not sparse['Ch2_A'].segments
+
+
+def test_render_markers(context):
+    """Test rendering the logical channels from the pulses edges.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    pulses = [Pulse(channel='Ch1_L', def_1='0.2', def_2='0.5'),
+              Pulse(channel='Ch1_L', def_1='0.4', def_2='0.7'),
+              Pulse(channel='Ch1_L', def_1='0.9', def_2='1.0'),
+              Pulse(channel='Ch2_L', def_1='0.0', def_2='0.3')]
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+    items, errors = context.preprocess_sequence(root)
+    assert not errors
+
+    markers = context.render_markers(items, 1.2)
+    assert sorted(markers) == ['Ch1_L', 'Ch2_L']
+    ch1 = [0, 0, 1, 1, 1, 1, 1, 0, 0, 1, 0, 0]
+    ch2 = [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert list(markers['Ch1_L']) == ch1
+    assert markers['Ch1_L'].dtype == np.int8
+    buffers = context.render_sequence(items, 1.2)
+    assert list(markers['Ch1_L']) == list(buffers['Ch1_L'])
+
+    packed = context.render_markers(items, 1.2, packed=True)
+    assert packed['Ch1_L'].dtype == np.uint8
+    assert len(packed['Ch1_L']) == 2
+    assert list(np.unpackbits(packed['Ch1_L'])[:12]) == ch1
+
+    bitfield = context.render_markers_bitfield(items, 1.2)
+    assert bitfield.dtype == np.uint8
+    assert list(bitfield) == [a + 2*b for a, b in zip(ch1, ch2)]
+    bitfield = context.render_markers_bitfield(items, 1.2, ['Ch2_L'])
+    assert list(bitfield) == ch2
+    with pytest.raises(ValueError):
+        context.render_markers_bitfield(items, 1.2, ['Ch1_L']*65)
+
+    context.inverted_log_channels = ['Ch2_L']
+    assert list(context.render_markers(items, 1.2)['Ch2_L']) == \
+        [1 - v for v in ch2]
+    chunks = context.iter_rendered_chunks(items, 5, 1.2)
+    assert list(np.concatenate([c['Ch2_L'] for _, c in chunks])) == \
+        [1 - v for v in ch2]
+    buffers = context.render_sequence(items, 1.2)
+    assert list(buffers['Ch2_L']) == [1 - v for v in ch2]
+    assert list(buffers['Ch1_L']) == ch1
+
+
+def test_build_waveform_libraries(context):
+    """Test deduplicating the segments of the channels.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    for i in range(4):
+        start = 0.1 + 0.5*i
+        root.add_child_item(i, Pulse(channel='Ch1_A', kind='Analogical',
+                                     def_1=str(start),
+                                     def_2=str(start + 0.3),
+                                     shape=SquareShape(amplitude='0.5')))
+    root.add_child_item(4, Pulse(channel='Ch1_L', def_1='0.0', def_2='1.0'))
+    items, errors = context.preprocess_sequence(root)
+    assert not errors
+
+    libraries, ratio = context.build_waveform_libraries(items)
+    lib = libraries['Ch1_A']
+    assert len(lib.waveforms) == 1
+    assert [(i, s) for i, s, _ in lib.table] == [(0, 1), (0, 6), (0, 11),
+                                                 (0, 16)]
+    assert lib.compression_ratio == 4
+    assert ratio == (12 + 10) / (3 + 10)
+    dense = context.render_sequence(items)
+    for ch, lib in libraries.items():
+        np.testing.assert_array_almost_equal(lib.densify(), dense[ch])
+
+
+def test_build_waveform_libraries_repeats(context):
+    """Test that identical back to back pulses are played as repetitions.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    root = RootSequence(context=context)
+    for i in range(3):
+        root.add_child_item(i, Pulse(channel='Ch1_A', kind='Analogical',
+                                     def_1=str(0.5*i),
+                                     def_2=str(0.5*(i + 1)),
+                                     shape=SquareShape(amplitude='0.5')))
+    root.add_child_item(3, Pulse(channel='Ch1_A', kind='Analogical',
+                                 def_1='1.5', def_2='1.7',
+                                 shape=SquareShape(amplitude='0.2')))
+    items, errors = context.preprocess_sequence(root)
+    assert not errors
+
+    libraries, ratio = context.build_waveform_libraries(items)
+    lib = libraries['Ch1_A']
+    assert len(lib.waveforms) == 2
+    assert lib.table == [(0, 0, 3), (1, 15, 1)]
+    assert ratio == (15 + 2) / (5 + 2)
+    dense = context.render_sequence(items)
+    np.testing.assert_array_almost_equal(lib.densify(), dense['Ch1_A'])
+
+    # Rendering the segments alone still merges the abutting pulses.
+    sparse = context.render_segments(items)
+    assert [s for s, _ in sparse['Ch1_A'].segments] == [0]
+
+
+def test_compile_and_transfer_async(context):
+    """Test transferring the channels as soon as they are rendered.
+
+    """
+    import asyncio
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+    from exopy_pulses.testing.driver import FakeAsyncDriver
+
+    root = RootSequence(context=context)
+    pulses = [Pulse(channel='Ch1_L', def_1='0.2', def_2='0.5'),
+              Pulse(channel='Ch2_L', def_1='0.7', def_2='0.9'),
+              Pulse(channel='Ch1_A', def_1='0.1', def_2='0.4',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5'))]
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+    items, errors = context.preprocess_sequence(root)
+    expected = context.render_sequence(items)
+
+    driver = FakeAsyncDriver(latency=0.01)
+    res, infos, errors = asyncio.run(
+        context.compile_and_transfer_sequence_async(root, driver))
+    assert res and infos == {'test': True} and not errors
+    assert sorted(driver.waveforms) == sorted(expected)
+    for ch in expected:
+        np.testing.assert_array_equal(driver.waveforms[ch], expected[ch])
+    # The transfers are serialized.
+    for (_, _, stop), (_, start, _) in zip(driver.transfers,
+                                          driver.transfers[1:]):
+        assert start >= stop
+
+    # The synchronous wrapper of the base class relies on the async version,
+    # including when called from a running event loop.
+    driver = FakeAsyncDriver()
+    res, infos, errors = BaseContext.compile_and_transfer_sequence(context,
+                                                                   root,
+                                                                   driver)
+    assert res and len(driver.waveforms) == 4
+
+    async def transfer_from_loop():
+        return BaseContext.compile_and_transfer_sequence(context, root,
+                                                         FakeAsyncDriver())
+    res, infos, errors = asyncio.run(transfer_from_loop())
+    assert res and infos == {'test': True}
+
+    root.add_child_item(3, Pulse(def_1='{a}'))
+    res, infos, errors = asyncio.run(
+        context.compile_and_transfer_sequence_async(root, driver))
+    assert not res and errors
+
+
+def test_compile_and_transfer_async_sync_context(context):
+    """Test that contexts implementing only the synchronous API can be used
+    through the asynchronous one.
+
+    """
+    import asyncio
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    context.supports_async_transfer = False
+    root = RootSequence(context=context)
+    root.add_child_item(0, Pulse(channel='Ch1_L', def_1='0.2', def_2='0.5'))
+    res, infos, errors = asyncio.run(
+        context.compile_and_transfer_sequence_async(root, object()))
+    assert res and infos == {'test': True} and not errors
+
+    with pytest.raises(NotImplementedError):
+        BaseContext.compile_and_transfer_sequence(context, root)
+
+
+def test_diff_channels(context):
+    """Test identifying the channels differing from the loaded ones.
+
+    """
+    buffers = {'Ch1_A': np.zeros(4), 'Ch1_L': np.ones(4, dtype=np.int8)}
+    assert sorted(context.diff_channels(buffers)) == ['Ch1_A', 'Ch1_L']
+
+    context.mark_loaded(buffers)
+    assert not context.diff_channels(buffers)
+
+    new = {'Ch1_A': np.zeros(4), 'Ch1_L': np.array([1, 0, 1, 1], np.int8)}
+    assert context.diff_channels(new) == ['Ch1_L']
+    # The type and the length of the waveforms are taken into account.
+    assert context.diff_channels({'Ch1_A': np.zeros(4, np.float32)})
+    assert context.diff_channels({'Ch1_A': np.zeros(5)})
+
+    context.forget_loaded()
+    assert context.diff_channels({'Ch1_A': np.zeros(4)}) == ['Ch1_A']
+
+
+def test_diff_segments(context):
+    """Test identifying the segments differing from the loaded ones.
+
+    """
+    from exopy_pulses.pulses.utils.segments import SparseChannel
+
+    old = SparseChannel(length=20, segments=[(0, np.ones(2)),
+                                             (5, np.ones(3)),
+                                             (10, np.ones(2))])
+    changed, removed = context.diff_segments({'Ch1_A': old})
+    assert len(changed['Ch1_A']) == 3 and not removed
+
+    context.mark_loaded(segments={'Ch1_A': old})
+    assert context.diff_segments({'Ch1_A': old}) == ({}, {})
+
+    new = SparseChannel(length=20, segments=[(0, np.ones(2)),
+                                             (5, 2*np.ones(3)),
+                                             (15, np.ones(2))])
+    changed, removed = context.diff_segments({'Ch1_A': new})
+    assert [s for s, _ in changed['Ch1_A']] == [5, 15]
+    assert removed == {'Ch1_A': [10]}
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the chunked transfer pipeline.
+
+"""
+import threading
+from time import sleep
+
+import pytest
+import numpy as np
+
+from exopy_pulses.pulses.contexts.transfer import (TransferPipeline,
+                                                   ConvertDtype, MergeMarkers)
+from exopy_pulses.testing.context import DummyContext
+
+
+def make_chunks(number, size, produced):
+    """Produce chunks while recording how many were produced.
+
+    """
+    for i in range(number):
+        produced.append(i)
+        yield i*size, {'A': np.full(size, 0.5), 'M': np.ones(size, np.int8)}
+
+
+def test_pipeline_backpressure():
+    """Test that the producer waits for a slow writer.
+
+    """
+    produced = []
+    written = []
+    ahead = []
+
+    def write(offset, buffers):
+        sleep(0.01)
+        written.append(offset)
+        ahead.append(len(produced) - len(written))
+
+    pipeline = TransferPipeline(write=write, max_pending=2)
+    stats = pipeline.run(make_chunks(10, 4, produced))
+    assert written == [4*i for i in range(10)]
+    assert stats['chunks'] == 10 and stats['samples'] == 40
+    assert stats['max_pending'] <= 2
+    # The producer is never more than the queue plus the chunk being written
+    # ahead of the writer.
+    assert max(ahead) <= 3
+    assert stats['waiting'] > 0
+
+
+def test_pipeline_error():
+    """Test that an error in the writer stops the pipeline.
+
+    """
+    produced = []
+
+    def write(offset, buffers):
+        raise RuntimeError()
+
+    threads = threading.active_count()
+    pipeline = TransferPipeline(write=write, max_pending=1)
+    with pytest.raises(RuntimeError):
+        pipeline.run(make_chunks(100, 4, produced))
+    assert len(produced) < 100
+    assert threading.active_count() == threads
+
+
+def test_converters():
+    """Test converting the analogical channels and merging the markers.
+
+    """
+    buffers = {'A': np.array([0.0, 0.5, -1.0, 2.0]),
+               'M1': np.array([1, 0, 1, 0], dtype=np.int8),
+               'M2': np.array([0, 0, 1, 1], dtype=np.int8)}
+    buffers = ConvertDtype(scale=2**13 - 1)(0, buffers)
+    assert buffers['A'].dtype == np.int16
+    assert list(buffers['A']) == [0, 4096, -8191, 16382]
+    assert buffers['M1'].dtype == np.int8
+
+    buffers = MergeMarkers(target='A', markers=('M1', 'M2'), shift=14)(0,
+                                                                       buffers)
+    assert sorted(buffers) == ['A']
+    assert buffers['A'].dtype == np.int16
+    words = buffers['A'].view(np.uint16)
+    assert list(words & 0x3fff) == [0, 4096, (-8191) & 0x3fff, 16382]
+    assert list(words >> 14) == [1, 0, 3, 2]
+
+    clipped = ConvertDtype(dtype=np.dtype(np.int8), scale=200,
+                           channels=('A',))(0, {'A': np.array([1.0, -1.0])})
+    assert list(clipped['A']) == [127, -128]
+
+
+def test_context_transfer_by_chunks():
+    """Test writing the chunks rendered by a context.
+
+    """
+    from exopy_pulses.pulses.pulse import Pulse
+    from exopy_pulses.pulses.shapes.square_shape import SquareShape
+    from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+
+    context = DummyContext(sampling=0.1)
+    root = RootSequence(context=context)
+    pulses = [Pulse(channel='Ch1_L', def_1='0.2', def_2='0.9'),
+              Pulse(channel='Ch1_A', def_1='0.1', def_2='1.4',
+                    kind='Analogical', shape=SquareShape(amplitude='0.5'))]
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+    items, errors = context.preprocess_sequence(root)
+    expected = context.render_sequence(items)
+
+    written = {}
+
+    def write(offset, buffers):
+        for ch, b in buffers.items():
+            written.setdefault(ch, []).append(b)
+
+    stats = context.transfer_by_chunks(items, write, 4,
+                                       [ConvertDtype(scale=100)])
+    assert stats['chunks'] == 4
+    np.testing.assert_array_equal(np.concatenate(written['Ch1_A']),
+                                  (expected['Ch1_A']*100).astype(np.int16))
+    np.testing.assert_array_equal(np.concatenate(written['Ch1_L']),
+                                  expected['Ch1_L'])
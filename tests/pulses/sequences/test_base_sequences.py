@@ -350,3 +350,42 @@ def test_build_from_config():
     seq = aux.items[3]
     assert seq.parent
     assert len(seq.items) == 1
+
+
+def test_content_hash():
+    """Test that the content hash is stable and invalidated incrementally.
+
+    """
+    def build():
+        root = RootSequence(context=DummyContext())
+        for i in range(2):
+            seq = BaseSequence()
+            add_children(seq, [Pulse(kind='Analogical', shape=SquareShape(),
+                                     def_1='1', def_2='2', channel='Ch1_A')])
+            root.add_child_item(i, seq)
+        return root
+
+    root = build()
+    ref = root.content_hash
+    assert ref == build().content_hash
+
+    seq1, seq2 = root.items
+    ref2 = seq2.content_hash
+    seq1.items[0].shape.amplitude = '0.5'
+    assert root._content_hash is None and seq1._content_hash is None
+    assert seq2._content_hash == ref2
+    assert root.content_hash != ref
+
+    seq1.items[0].shape.amplitude = '1.0'
+    assert root.content_hash == ref
+
+    root.external_vars = OrderedDict({'a': 1.5})
+    assert root._content_hash == ref
+
+    seq2.add_child_item(1, Pulse(def_1='3', def_2='4'))
+    assert root.content_hash != ref
+    seq2.remove_child_item(1)
+    assert root.content_hash == ref
+
+    root.context.sampling = 0.5
+    assert root.content_hash != ref
@@ -708,3 +708,103 @@ def test_sequence_compilation18(root):
     res, missings, errors = root.evaluate_sequence()
     assert not res
     assert 'root-stop' in errors
+
+
+def test_sequence_memoization(root, monkeypatch):
+    """Test that only the sequences whose content or inputs changed are
+    evaluated again.
+
+    """
+    root.external_vars = OrderedDict({'a': 1.0})
+    for i in range(3):
+        seq = BaseSequence(local_vars=OrderedDict({'x': '{a}' if i else '1'}))
+        add_children(seq, [Pulse(def_1='{}'.format(2*i), def_2='{x}+0.5',
+                                 def_mode='Start/Duration'),
+                           Pulse(def_1='{{{}_stop}}'.format(2 + 3*i),
+                                 def_2='0.5', def_mode='Start/Duration')])
+        root.add_child_item(i, seq)
+
+    res, missings, errors = root.evaluate_sequence()
+    assert res
+    ref = [(p.start, p.stop) for p in root.simplify_sequence()]
+
+    evaluated = []
+    evaluate = BaseSequence.evaluate_sequence
+
+    def spy(self, *args):
+        evaluated.append(self.index)
+        return evaluate(self, *args)
+
+    monkeypatch.setattr(BaseSequence, 'evaluate_sequence', spy)
+
+    res, missings, errors = root.evaluate_sequence()
+    assert res
+    assert not evaluated
+    assert [(p.start, p.stop) for p in root.simplify_sequence()] == ref
+    assert root.items[2].items[1]._cache == {'def_1': 5.5, 'def_2': 0.5}
+
+    root.items[1].items[0].def_1 = '2.5'
+    res, missings, errors = root.evaluate_sequence()
+    assert res
+    assert evaluated == [4]
+    assert root.items[1].items[1].start == 4.0
+
+    del evaluated[:]
+    root.external_vars['a'] = 2.0
+    res, missings, errors = root.evaluate_sequence()
+    assert res
+    assert evaluated == [4, 7]
+    assert root.items[0].items[0].stop == 1.5
+    assert root.items[2].items[0].stop == 6.5
+
+
+def test_evaluation_notifications(root):
+    """Test that the items do not notify while the sequence is evaluated and
+    that a single signal is emitted at the end.
+
+    """
+    pulse = Pulse(def_1='1.0', def_2='{a}')
+    add_children(root, [pulse])
+    root.external_vars = OrderedDict({'a': 2.0})
+
+    changes = []
+    finished = []
+    pulse.observe('stop', changes.append)
+    pulse.observe('duration', changes.append)
+    root.observe('evaluation_finished', finished.append)
+
+    res, missings, errors = root.evaluate_sequence(True)
+    assert res
+    assert pulse.stop == 2.0
+    assert not changes
+    assert len(finished) == 1
+    assert finished[0] == {'success': True, 'missings': set(), 'errors': {}}
+
+    # The editor views rely on the notifications by default.
+    root.external_vars = OrderedDict({'a': 3.0})
+    res, missings, errors = root.evaluate_sequence()
+    assert res
+    assert {c['name'] for c in changes} == {'stop', 'duration'}
+    assert len(finished) == 2
+
+    del changes[:]
+    root.external_vars = OrderedDict({'a': 4.0})
+    root.suppress_evaluation_notifications = True
+    res, missings, errors = root.evaluate_sequence()
+    assert res
+    assert pulse.stop == 4.0
+    assert not changes
+
+    # The compilation follows the flag of the sequence so that the views of
+    # an edited sequence are refreshed.
+    root.external_vars = OrderedDict({'a': 5.0})
+    items, errors = root.context.preprocess_sequence(root)
+    assert not errors
+    assert pulse.stop == 5.0
+    assert not changes
+
+    root.suppress_evaluation_notifications = False
+    root.external_vars = OrderedDict({'a': 6.0})
+    items, errors = root.context.preprocess_sequence(root)
+    assert not errors
+    assert {c['value'] for c in changes if c['name'] == 'stop'} == {6.0}
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the sharing of template bodies between template sequences.
+
+"""
+import pytest
+
+from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+from exopy_pulses.pulses.sequences.template_sequence import (TemplateSequence,
+                                                             DEP_TYPE)
+
+from exopy_pulses.testing.context import DummyContext
+
+
+@pytest.fixture
+def template_body(pulses_plugin, template_sequence):
+    """Body of the template sequence.
+
+    """
+    body, errors = pulses_plugin.get_template_body(template_sequence)
+    assert body is not None, errors
+    return body
+
+
+def build_template(body, b, mapping):
+    """Build a template sequence relying on the provided body.
+
+    """
+    conf = {'template_id': body.template_id, 'name': 'Template',
+            'template_vars': repr({'b': b})}
+    seq = TemplateSequence.build_from_config(conf,
+                                             {DEP_TYPE:
+                                              {body.template_id: body}})
+    seq.context.channel_mapping = mapping
+    seq.def_1 = '1.0'
+    seq.def_2 = '20.0'
+    return seq
+
+
+def test_body_is_built_once(pulses_plugin, template_body):
+    """Test that the body is cached by the plugin.
+
+    """
+    body, _ = pulses_plugin.get_template_body(template_body.template_id)
+    assert pulses_plugin.get_template_body(body.template_id)[0] is body
+    assert body.template_vars == {'b': ''}
+    assert body.local_vars == {'a': '1.5'}
+    assert body.logical_channels == ('A', 'B')
+    assert body.analogical_channels == ('Ch1', 'Ch2')
+    assert len(body.items) == 4
+    assert body.items[3].index == 5
+    assert body.doc == 'dummy doc'
+
+    assert pulses_plugin.get_template_body('__unknown__')[0] is None
+
+
+def test_building_template_sequence(template_body):
+    """Test building a template sequence from a body.
+
+    """
+    seq = build_template(template_body, '19',
+                         {'A': '', 'B': '', 'Ch1': '', 'Ch2': ''})
+    assert seq.item_id == 'exopy_pulses.__template__'
+    assert seq.body is template_body
+    assert seq.docs == 'dummy doc'
+    assert seq.template_vars == {'b': '19'}
+    assert seq.context.template_sequence is seq
+    assert sorted(seq.context.channel_mapping) == ['A', 'B', 'Ch1', 'Ch2']
+
+
+def test_evaluating_shared_body(template_body):
+    """Test evaluating two template sequences sharing the same body.
+
+    """
+    root = RootSequence()
+    root.context = DummyContext(sampling=0.5)
+    seq1 = build_template(template_body, '19',
+                          {'A': 'Ch1_L', 'B': 'Ch2_L',
+                           'Ch1': 'Ch2_A', 'Ch2': 'Ch1_A'})
+    seq2 = build_template(template_body, '12',
+                          {'A': 'Ch2_L', 'B': 'Ch1_L',
+                           'Ch1': 'Ch1_A', 'Ch2': 'Ch2_A'})
+    seq2.def_1 = '{1_stop}'
+    seq2.def_2 = '40.0'
+    root.add_child_item(0, seq1)
+    root.add_child_item(1, seq2)
+    root.time_constrained = True
+    root.sequence_duration = '40'
+
+    res, missings, errors = root.evaluate_sequence()
+    assert res, (missings, errors)
+
+    pulses = root.simplify_sequence()
+    assert len(pulses) == 8
+    p1, p2, p3, p4 = pulses[:4]
+    assert (p1.start, p1.stop, p1.channel) == (2.0, 2.5, 'Ch1_L')
+    assert (p2.start, p2.stop, p2.channel) == (3.5, 4.0, 'Ch2_L')
+    assert (p3.start, p3.stop, p3.channel) == (4.5, 20.0, 'Ch1_A')
+    assert (p4.start, p4.stop, p4.channel) == (4.5, 20.0, 'Ch2_A')
+
+    p1, p2, p3, p4 = pulses[4:]
+    assert (p1.start, p1.stop, p1.channel) == (21.0, 21.5, 'Ch2_L')
+    assert (p2.start, p2.stop, p2.channel) == (22.5, 23.0, 'Ch1_L')
+    assert (p3.start, p3.stop, p3.channel) == (23.5, 40.0, 'Ch2_A')
+    assert (p4.start, p4.stop, p4.channel) == (23.5, 32.0, 'Ch1_A')
+
+    # The items of the body are left untouched by the copies.
+    assert all(p not in template_body.items for p in pulses)
+    assert template_body.items[0].channel == 'A'
+
+
+def test_evaluating_template_missing_mapping(template_body):
+    """Test that an incomplete mapping is reported.
+
+    """
+    root = RootSequence()
+    root.context = DummyContext(sampling=0.5)
+    seq = build_template(template_body, '19',
+                         {'A': 'Ch1_L', 'B': 'Ch2_L', 'Ch1': 'Ch2_A'})
+    root.add_child_item(0, seq)
+
+    res, missings, errors = root.evaluate_sequence()
+    assert not res
+    assert 'Template-context' in errors
+
+
+def test_compiling_body(template_body):
+    """Test that the body is compiled after its first evaluation.
+
+    """
+    assert not template_body.evaluation_order
+
+    root = RootSequence()
+    root.context = DummyContext(sampling=0.5)
+    mapping = {'A': 'Ch1_L', 'B': 'Ch2_L', 'Ch1': 'Ch2_A', 'Ch2': 'Ch1_A'}
+    root.add_child_item(0, build_template(template_body, '19', mapping))
+
+    res, missings, errors = root.evaluate_sequence()
+    assert res, (missings, errors)
+
+    items = template_body.items
+    assert template_body.evaluation_order == items
+    assert template_body.constant_vars == {'a': 1.5}
+
+    # The constant fields are available as soon as the caches are cleaned.
+    template_body.clean_cached_values()
+    assert items[0]._cache == {'def_1': 1.0}
+    assert items[3]._cache == {}
+    assert items[3].shape._cache == {'amplitude': 1.0}
+
+    seq = build_template(template_body, '12', mapping)
+    root.add_child_item(1, seq)
+    seq.def_1 = '{1_stop}'
+    seq.def_2 = '40.0'
+    root.time_constrained = True
+    root.sequence_duration = '40'
+    res, missings, errors = root.evaluate_sequence()
+    assert res, (missings, errors)
+    pulses = root.simplify_sequence()
+    assert [p.stop for p in pulses] == [2.5, 4.0, 20.0, 20.0,
+                                        21.5, 23.0, 40.0, 32.0]
+
+
+def test_non_constant_formulas(template_body):
+    """Test that only the formulas without variables nor calls are cached.
+
+    """
+    from exopy_pulses.pulses.sequences.template_sequence import _is_constant
+
+    assert _is_constant('1.5') and _is_constant('2*(1 + 3)')
+    assert not _is_constant('{a} + 1')
+    assert not _is_constant('np.random.rand()')
+    assert not _is_constant('pi')
+    assert not _is_constant('1 +')
+
+    items = template_body.items
+    items[0].def_1 = 'abs(-1.0)'
+    root = RootSequence()
+    root.context = DummyContext(sampling=0.5)
+    mapping = {'A': 'Ch1_L', 'B': 'Ch2_L', 'Ch1': 'Ch2_A', 'Ch2': 'Ch1_A'}
+    root.add_child_item(0, build_template(template_body, '19', mapping))
+    res, missings, errors = root.evaluate_sequence()
+    assert res, (missings, errors)
+
+    template_body.clean_cached_values()
+    assert 'def_1' not in items[0]._cache
+    assert items[3].shape._cache == {'amplitude': 1.0}
+
+
+def test_template_content_hash(template_body):
+    """Test that the content of the template enters the hash of the root.
+
+    """
+    root = RootSequence()
+    root.context = DummyContext(sampling=0.5)
+    mapping = {'A': 'Ch1_L', 'B': 'Ch2_L', 'Ch1': 'Ch2_A', 'Ch2': 'Ch1_A'}
+    template = build_template(template_body, '19', mapping)
+    root.add_child_item(0, template)
+
+    ref = root.content_hash
+    template.template_vars = {'b': '20'}
+    assert root._content_hash is None
+    assert root.content_hash != ref
+
+    ref = root.content_hash
+    template.context.channel_mapping = dict(mapping, A='Ch2_L')
+    assert root.content_hash != ref
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the command line compilation of sequences.
+
+"""
+import os
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from exopy_pulses.pulses.pulse import Pulse
+from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+from exopy_pulses.pulses.utils.sequences_io import save_sequence_prefs
+from exopy_pulses.pulses.cli import main, build_points
+from exopy_pulses.testing.context import DummyContext
+
+MANIFEST = 'tests.pulses.contributions:PulsesContributions'
+
+
+def save_sequence(folder):
+    """Save a sequence depending on an external variable.
+
+    """
+    root = RootSequence(context=DummyContext(),
+                        external_vars=OrderedDict({'d': 1.0}))
+    root.add_child_item(0, Pulse(channel='Ch1_L', def_1='1.0',
+                                 def_2='1.0 + {d}'))
+    path = os.path.join(folder, 'test.pulse.ini')
+    save_sequence_prefs(path, root.preferences_from_members())
+    return path
+
+
+def test_build_points(tmpdir):
+    """Test building the external variables of each point.
+
+    """
+    assert build_points([('a', 1)], None, []) == [{'a': 1}]
+
+    points = build_points([('a', 1)], None, [('b', [1, 2]), ('c', (3, 4))])
+    assert len(points) == 4
+    assert points[1] == {'a': 1, 'b': 1, 'c': 4}
+
+    path = str(tmpdir.join('vars.json'))
+    with open(path, 'w') as f:
+        json.dump([{'a': 0, 'e': 1}, {'e': 2}], f)
+    points = build_points([('a', 1)], path, [('b', [1, 2])])
+    assert points == [{'a': 1, 'e': 1, 'b': 1}, {'a': 1, 'e': 1, 'b': 2},
+                      {'a': 1, 'e': 2, 'b': 1}, {'a': 1, 'e': 2, 'b': 2}]
+
+
+def test_compile_single_point(tmpdir, capsys):
+    """Test compiling a sequence and saving it as npz.
+
+    """
+    path = save_sequence(str(tmpdir))
+    out = str(tmpdir.join('out'))
+    assert main([path, '-o', out, '-m', MANIFEST, '-v', 'd=2.0']) == 0
+    assert 'render' in capsys.readouterr().out
+
+    data = np.load(os.path.join(out, 'test.npz'))
+    assert sorted(data) == ['Ch1_A', 'Ch1_L', 'Ch2_A', 'Ch2_L']
+    assert list(data['Ch1_L']) == [0, 1, 1]
+
+
+def test_compile_sweep(tmpdir, capsys):
+    """Test compiling all the points of a sweep as npy files.
+
+    """
+    path = save_sequence(str(tmpdir))
+    out = str(tmpdir.join('out'))
+    assert main([path, '-o', out, '-m', MANIFEST, '-f', 'npy', '-q',
+                 '-s', 'd=[1.0, 3.0]']) == 0
+    assert not capsys.readouterr().out
+
+    assert list(np.load(os.path.join(out, 'test_1', 'Ch1_L.npy'))) == \
+        [0, 1, 1, 1]
+    assert len(np.load(os.path.join(out, 'test_0', 'Ch1_L.npy'))) == 2
+    with open(os.path.join(out, 'test_points.json')) as f:
+        assert json.load(f) == [{'d': 1.0}, {'d': 3.0}]
+
+
+def test_compile_failure(tmpdir, capsys):
+    """Test reporting errors when building or compiling.
+
+    """
+    path = save_sequence(str(tmpdir))
+    out = str(tmpdir.join('out'))
+    assert main([path, '-o', out]) == 1
+    assert 'exopy_pulses.DummyContext' in capsys.readouterr().err
+
+    assert main([path, '-o', out, '-m', MANIFEST, '-v', 'd="a"']) == 1
+    assert 'Failed to compile point 0' in capsys.readouterr().err
+
+    assert main([path, '-m', 'tests.pulses.contributions:Unknown']) == 1
+    assert 'has no attribute' in capsys.readouterr().err
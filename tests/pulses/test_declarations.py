@@ -14,7 +14,7 @@ import enaml
 from atom.api import Atom, Dict, List
 
 from exopy_pulses.pulses.infos import (SequenceInfos, ShapeInfos,
-                                       ContextInfos)
+                                       ContextInfos, InfosImportError)
 from exopy_pulses.pulses.declarations import (Sequences, Sequence,
                                               Shapes, Shape,
                                               SequenceConfigs, SequenceConfig,
@@ -135,8 +135,11 @@ def test_register_sequence_decl_cls1(collector, sequence_decl):
     tb = {}
     sequence_decl.sequence = 'exopy_pulses.foo:BaseSequence'
     sequence_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseSequence' in tb
-    assert 'import' in tb['exopy_pulses.BaseSequence']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'import' in str(e.value)
 
 
 def test_register_sequence_decl_cls1_bis(collector, sequence_decl):
@@ -147,7 +150,11 @@ def test_register_sequence_decl_cls1_bis(collector, sequence_decl):
     tb = {}
     sequence_decl.sequence = 'exopy.testing.broken_module:Sequence'
     sequence_decl.register(collector, tb)
-    assert 'exopy.Sequence' in tb and 'NameError' in tb['exopy.Sequence']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'NameError' in str(e.value)
 
 
 def test_register_sequence_decl_cls2(collector, sequence_decl):
@@ -158,7 +165,11 @@ def test_register_sequence_decl_cls2(collector, sequence_decl):
     sequence_decl.sequence =\
         'exopy_pulses.pulses.sequences.base_sequences:Task'
     sequence_decl.register(collector, tb)
-    assert 'exopy_pulses.Task' in tb and 'attribute' in tb['exopy_pulses.Task']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'attribute' in str(e.value)
 
 
 def test_register_sequence_decl_cls3(collector, sequence_decl):
@@ -168,8 +179,11 @@ def test_register_sequence_decl_cls3(collector, sequence_decl):
     tb = {}
     sequence_decl.sequence = 'exopy.tasks.tasks.database:TaskDatabase'
     sequence_decl.register(collector, tb)
-    assert ('exopy.TaskDatabase' in tb and
-            'subclass' in tb['exopy.TaskDatabase'])
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'subclass' in str(e.value)
 
 
 def test_register_sequence_decl_view1(collector, sequence_decl):
@@ -179,8 +193,11 @@ def test_register_sequence_decl_view1(collector, sequence_decl):
     tb = {}
     sequence_decl.view = 'exopy.tasks.foo:Task'
     sequence_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseSequence' in tb
-    assert'import' in tb['exopy_pulses.BaseSequence']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_sequence_decl_view1_bis(collector, sequence_decl):
@@ -190,9 +207,12 @@ def test_register_sequence_decl_view1_bis(collector, sequence_decl):
     tb = {}
     sequence_decl.view = 'exopy.testing.broken_enaml:Task'
     sequence_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseSequence' in tb
-    assert ('AttributeError' in tb['exopy_pulses.BaseSequence'] or
-            'NameError' in tb['exopy_pulses.BaseSequence'])
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert ('AttributeError' in str(e.value) or
+            'NameError' in str(e.value))
 
 
 def test_register_sequence_decl_view2(collector, sequence_decl):
@@ -202,8 +222,11 @@ def test_register_sequence_decl_view2(collector, sequence_decl):
     tb = {}
     sequence_decl.view = 'exopy.tasks.tasks.base_views:Task'
     sequence_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseSequence' in tb
-    assert 'import' in tb['exopy_pulses.BaseSequence']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_sequence_decl_view3(collector, sequence_decl):
@@ -213,8 +236,11 @@ def test_register_sequence_decl_view3(collector, sequence_decl):
     tb = {}
     sequence_decl.view = 'exopy.tasks.tasks.database:TaskDatabase'
     sequence_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseSequence' in tb
-    assert 'subclass' in tb['exopy_pulses.BaseSequence']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'subclass' in str(e.value)
 
 
 def test_unregister_sequence_decl1(collector, sequence_decl):
@@ -357,8 +383,11 @@ def test_register_shape_decl_cls1(collector, shape_decl):
     tb = {}
     shape_decl.shape = 'exopy_pulses.foo:SquareShape'
     shape_decl.register(collector, tb)
-    assert 'exopy_pulses.SquareShape' in tb
-    assert 'import' in tb['exopy_pulses.SquareShape']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'import' in str(e.value)
 
 
 def test_register_shape_decl_cls1_bis(collector, shape_decl):
@@ -369,7 +398,11 @@ def test_register_shape_decl_cls1_bis(collector, shape_decl):
     tb = {}
     shape_decl.shape = 'exopy.testing.broken_module:SquareShape'
     shape_decl.register(collector, tb)
-    assert 'exopy.SquareShape' in tb and 'NameError' in tb['exopy.SquareShape']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'NameError' in str(e.value)
 
 
 def test_register_shape_decl_cls2(collector, shape_decl):
@@ -379,7 +412,11 @@ def test_register_shape_decl_cls2(collector, shape_decl):
     tb = {}
     shape_decl.shape = 'exopy_pulses.pulses.shapes.base_shape:Task'
     shape_decl.register(collector, tb)
-    assert 'exopy_pulses.Task' in tb and 'attribute' in tb['exopy_pulses.Task']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'attribute' in str(e.value)
 
 
 def test_register_shape_decl_cls3(collector, shape_decl):
@@ -389,8 +426,11 @@ def test_register_shape_decl_cls3(collector, shape_decl):
     tb = {}
     shape_decl.shape = 'exopy.tasks.tasks.database:TaskDatabase'
     shape_decl.register(collector, tb)
-    assert ('exopy.TaskDatabase' in tb and
-            'subclass' in tb['exopy.TaskDatabase'])
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'subclass' in str(e.value)
 
 
 def test_register_shape_decl_view1(collector, shape_decl):
@@ -400,8 +440,11 @@ def test_register_shape_decl_view1(collector, shape_decl):
     tb = {}
     shape_decl.view = 'exopy.tasks.foo:Task'
     shape_decl.register(collector, tb)
-    assert 'exopy_pulses.SquareShape' in tb
-    assert'import' in tb['exopy_pulses.SquareShape']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_shape_decl_view1_bis(collector, shape_decl):
@@ -411,9 +454,12 @@ def test_register_shape_decl_view1_bis(collector, shape_decl):
     tb = {}
     shape_decl.view = 'exopy.testing.broken_enaml:Task'
     shape_decl.register(collector, tb)
-    assert 'exopy_pulses.SquareShape' in tb
-    assert ('AttributeError' in tb['exopy_pulses.SquareShape'] or
-            'NameError' in tb['exopy_pulses.SquareShape'])
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert ('AttributeError' in str(e.value) or
+            'NameError' in str(e.value))
 
 
 def test_register_shape_decl_view2(collector, shape_decl):
@@ -423,8 +469,11 @@ def test_register_shape_decl_view2(collector, shape_decl):
     tb = {}
     shape_decl.view = 'exopy.tasks.tasks.base_views:Task'
     shape_decl.register(collector, tb)
-    assert 'exopy_pulses.SquareShape' in tb
-    assert 'import' in tb['exopy_pulses.SquareShape']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_shape_decl_view3(collector, shape_decl):
@@ -434,8 +483,11 @@ def test_register_shape_decl_view3(collector, shape_decl):
     tb = {}
     shape_decl.view = 'exopy.tasks.tasks.database:TaskDatabase'
     shape_decl.register(collector, tb)
-    assert 'exopy_pulses.SquareShape' in tb
-    assert 'subclass' in tb['exopy_pulses.SquareShape']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'subclass' in str(e.value)
 
 
 def test_unregister_shape_decl1(collector, shape_decl):
@@ -586,8 +638,11 @@ def test_register_context_decl_cls1(collector, context_decl):
     tb = {}
     context_decl.context = 'exopy_pulses.foo:BaseContext'
     context_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseContext' in tb
-    assert 'import' in tb['exopy_pulses.BaseContext']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'import' in str(e.value)
 
 
 def test_register_context_decl_cls1_bis(collector, context_decl):
@@ -598,7 +653,11 @@ def test_register_context_decl_cls1_bis(collector, context_decl):
     tb = {}
     context_decl.context = 'exopy.testing.broken_module:Context'
     context_decl.register(collector, tb)
-    assert 'exopy.Context' in tb and 'NameError' in tb['exopy.Context']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'NameError' in str(e.value)
 
 
 def test_register_context_decl_cls2(collector, context_decl):
@@ -608,7 +667,11 @@ def test_register_context_decl_cls2(collector, context_decl):
     tb = {}
     context_decl.context = 'exopy_pulses.pulses.sequences.base_sequences:Task'
     context_decl.register(collector, tb)
-    assert 'exopy_pulses.Task' in tb and 'attribute' in tb['exopy_pulses.Task']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'attribute' in str(e.value)
 
 
 def test_register_context_decl_cls3(collector, context_decl):
@@ -618,8 +681,11 @@ def test_register_context_decl_cls3(collector, context_decl):
     tb = {}
     context_decl.context = 'exopy.tasks.tasks.database:TaskDatabase'
     context_decl.register(collector, tb)
-    assert ('exopy.TaskDatabase' in tb and
-            'subclass' in tb['exopy.TaskDatabase'])
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'subclass' in str(e.value)
 
 
 def test_register_context_decl_view1(collector, context_decl):
@@ -629,8 +695,11 @@ def test_register_context_decl_view1(collector, context_decl):
     tb = {}
     context_decl.view = 'exopy.tasks.foo:Task'
     context_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseContext' in tb
-    assert'import' in tb['exopy_pulses.BaseContext']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_context_decl_view1_bis(collector, context_decl):
@@ -640,9 +709,12 @@ def test_register_context_decl_view1_bis(collector, context_decl):
     tb = {}
     context_decl.view = 'exopy.testing.broken_enaml:Task'
     context_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseContext' in tb
-    assert ('AttributeError' in tb['exopy_pulses.BaseContext'] or
-            'NameError' in tb['exopy_pulses.BaseContext'])
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert ('AttributeError' in str(e.value) or
+            'NameError' in str(e.value))
 
 
 def test_register_context_decl_view2(collector, context_decl):
@@ -652,8 +724,11 @@ def test_register_context_decl_view2(collector, context_decl):
     tb = {}
     context_decl.view = 'exopy.tasks.tasks.base_views:Task'
     context_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseContext' in tb
-    assert 'import' in tb['exopy_pulses.BaseContext']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_context_decl_view3(collector, context_decl):
@@ -663,8 +738,11 @@ def test_register_context_decl_view3(collector, context_decl):
     tb = {}
     context_decl.view = 'exopy.tasks.tasks.database:TaskDatabase'
     context_decl.register(collector, tb)
-    assert 'exopy_pulses.BaseContext' in tb
-    assert 'subclass' in tb['exopy_pulses.BaseContext']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'subclass' in str(e.value)
 
 
 def test_unregister_context_decl1(collector, context_decl):
@@ -806,7 +884,11 @@ def test_register_config_decl_cls1(collector, config_decl):
     tb = {}
     config_decl.config = 'exopy.tasks.foo:Task'
     config_decl.register(collector, tb)
-    assert 'exopy.Task' in tb and 'import' in tb['exopy.Task']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'import' in str(e.value)
 
 
 def test_register_config_decl_cls1_bis(collector, config_decl):
@@ -816,7 +898,11 @@ def test_register_config_decl_cls1_bis(collector, config_decl):
     tb = {}
     config_decl.config = 'exopy.testing.broken_module:Task'
     config_decl.register(collector, tb)
-    assert 'exopy.Task' in tb and 'NameError' in tb['exopy.Task']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'NameError' in str(e.value)
 
 
 def test_register_config_decl_cls2(collector, config_decl):
@@ -826,7 +912,11 @@ def test_register_config_decl_cls2(collector, config_decl):
     tb = {}
     config_decl.config = 'exopy.tasks.tasks.base_tasks:Task'
     config_decl.register(collector, tb)
-    assert 'exopy.Task' in tb and 'attribute' in tb['exopy.Task']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'attribute' in str(e.value)
 
 
 def test_register_config_decl_cls3(collector, config_decl):
@@ -836,8 +926,11 @@ def test_register_config_decl_cls3(collector, config_decl):
     tb = {}
     config_decl.config = 'exopy.tasks.tasks.database:TaskDatabase'
     config_decl.register(collector, tb)
-    assert ('exopy.TaskDatabase' in tb and
-            'subclass' in tb['exopy.TaskDatabase'])
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.cls
+    assert 'subclass' in str(e.value)
 
 
 def test_register_config_decl_view1(collector, config_decl):
@@ -847,8 +940,11 @@ def test_register_config_decl_view1(collector, config_decl):
     tb = {}
     config_decl.view = 'exopy.tasks.foo:Task'
     config_decl.register(collector, tb)
-    assert 'exopy_pulses.SequenceConfig' in tb
-    assert 'import' in tb['exopy_pulses.SequenceConfig']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_config_decl_view1bis(collector, config_decl):
@@ -858,8 +954,11 @@ def test_register_config_decl_view1bis(collector, config_decl):
     tb = {}
     config_decl.view = 'exopy.testing.broken_module:Task'
     config_decl.register(collector, tb)
-    assert 'exopy_pulses.SequenceConfig' in tb
-    assert 'NameError' in tb['exopy_pulses.SequenceConfig']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'NameError' in str(e.value)
 
 
 def test_register_config_decl_view2(collector, config_decl):
@@ -869,8 +968,11 @@ def test_register_config_decl_view2(collector, config_decl):
     tb = {}
     config_decl.view = 'exopy.tasks.tasks.base_views:Task'
     config_decl.register(collector, tb)
-    assert 'exopy_pulses.SequenceConfig' in tb
-    assert 'import' in tb['exopy_pulses.SequenceConfig']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'import' in str(e.value)
 
 
 def test_register_config_decl_view3(collector, config_decl):
@@ -880,8 +982,11 @@ def test_register_config_decl_view3(collector, config_decl):
     tb = {}
     config_decl.view = 'exopy.tasks.tasks.database:TaskDatabase'
     config_decl.register(collector, tb)
-    assert 'exopy_pulses.SequenceConfig' in tb
-    assert 'subclass' in tb['exopy_pulses.SequenceConfig']
+    assert not tb
+    infos, = collector.contributions.values()
+    with pytest.raises((InfosImportError, TypeError)) as e:
+        infos.view
+    assert 'subclass' in str(e.value)
 
 
 def test_unregister_config_decl1(collector, config_decl):
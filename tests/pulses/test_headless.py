@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test rebuilding and compiling sequences without the application.
+
+"""
+import os
+from collections import OrderedDict
+
+import pytest
+import enaml
+
+from exopy_pulses.pulses.pulse import Pulse
+from exopy_pulses.pulses.shapes.square_shape import SquareShape
+from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+from exopy_pulses.pulses.sequences.template_sequence import TemplateSequence
+from exopy_pulses.pulses.contexts.template_context import TemplateContext
+from exopy_pulses.pulses.utils.sequences_io import save_sequence_prefs
+from exopy_pulses.pulses import headless
+from exopy_pulses.pulses.headless import (HeadlessManager, compile_sequence,
+                                          list_extension_manifests)
+from exopy_pulses.testing.context import DummyContext
+
+with enaml.imports():
+    from exopy_pulses.pulses.manifest import PulsesManagerManifest
+    from .contributions import PulsesContributions
+
+
+def save_template(folder):
+    """Save a simple template in a folder and return its id.
+
+    """
+    root = RootSequence()
+    root.context = TemplateContext(logical_channels=['A'],
+                                   analogical_channels=['Ch1'],
+                                   channel_mapping={'A': '', 'Ch1': ''})
+    root.local_vars = OrderedDict({'a': '1.0'})
+    root.add_child_item(0, Pulse(channel='A', def_1='{a}', def_2='2.0'))
+    root.add_child_item(1, Pulse(channel='Ch1', def_1='0.0', def_2='{b}',
+                                 kind='Analogical',
+                                 shape=SquareShape(amplitude='0.5')))
+    pref = root.preferences_from_members()
+    pref['template_vars'] = repr(dict(b=''))
+    del pref['item_id']
+    del pref['external_vars']
+    del pref['time_constrained']
+    save_sequence_prefs(os.path.join(folder, 'simple.temp_pulse.ini'), pref)
+    return 'simple'
+
+
+@pytest.fixture
+def manager(tmpdir):
+    """Headless manager aware of a template and of the dummy context.
+
+    """
+    manager = HeadlessManager()
+    manager.load_declarations([PulsesManagerManifest, PulsesContributions])
+    save_template(str(tmpdir))
+    manager.add_templates_folders([str(tmpdir)])
+    return manager
+
+
+def build_sequence_config(manager):
+    """Build the config of a sequence using the template.
+
+    """
+    root = RootSequence(context=DummyContext(),
+                        external_vars=OrderedDict({'d': 1.0}))
+    root.add_child_item(0, Pulse(channel='Ch2_L', def_1='0.0',
+                                 def_2='{d}'))
+    body = manager.get_template_body('simple')
+    template = TemplateSequence(template_id='simple', body=body,
+                                context=body.create_context(),
+                                template_vars={'b': '{d} + 1.0'},
+                                def_1='{1_stop}', def_2='5.0')
+    template.context.channel_mapping = {'A': 'Ch1_L', 'Ch1': 'Ch1_A'}
+    root.add_child_item(1, template)
+    return root.preferences_from_members()
+
+
+def test_list_extension_manifests(monkeypatch):
+    """Test that the manifests of the extension packages are collected.
+
+    """
+    class FalseEntryPoint(object):
+
+        def load(self):
+            return lambda: [PulsesManagerManifest, PulsesContributions]
+
+    groups = []
+
+    def iter_entry_points(group):
+        groups.append(group)
+        return [FalseEntryPoint()]
+
+    monkeypatch.setattr(headless, '_iter_entry_points', iter_entry_points)
+    manifests = list_extension_manifests()
+    assert groups == ['exopy_package_extension']
+    assert manifests.count(PulsesManagerManifest) == 1
+    assert PulsesContributions in manifests
+
+
+def test_load_declarations(manager):
+    """Test that the contributions are collected from the manifests.
+
+    """
+    assert not manager.errors
+    assert 'exopy_pulses.BaseSequence' in manager.sequences
+    assert 'exopy_pulses.RootSequence' in manager.sequences
+    assert 'exopy_pulses.SquareShape' in manager.shapes
+    assert 'exopy_pulses.DummyContext' in manager.contexts
+    assert 'simple' in manager.templates
+
+
+def test_collect_dependencies(manager):
+    """Test resolving the dependencies of a sequence.
+
+    """
+    config = build_sequence_config(manager)
+    dependencies, errors = manager.collect_dependencies(config)
+    assert not errors
+    items = dependencies['exopy.pulses.item']
+    assert items['exopy_pulses.Pulse'] is Pulse
+    assert items['exopy_pulses.__template__'] is TemplateSequence
+    assert (dependencies['exopy.pulses.template']['simple'] is
+            manager.get_template_body('simple'))
+    contexts = dependencies['exopy.pulses.context']
+    assert 'exopy_pulses.DummyContext' in contexts
+
+    config['item_0']['item_id'] = 'exopy_pulses.Unknown'
+    config['context']['context_id'] = 'exopy_pulses.Unknown2'
+    _, errors = manager.collect_dependencies(config)
+    assert errors == {'exopy_pulses.Unknown': 'Unknown item.',
+                      'exopy_pulses.Unknown2': 'Unknown context.'}
+
+
+def test_build_and_compile_sequence(manager):
+    """Test rebuilding a sequence and compiling it for several values.
+
+    """
+    config = build_sequence_config(manager)
+    seq, errors = manager.build_sequence(config)
+    assert not errors
+
+    buffers, timings, errors = compile_sequence(seq)
+    assert not errors
+    assert sorted(timings) == ['evaluate', 'render', 'simplify']
+    assert list(buffers['Ch2_L']) == [1, 0, 0]
+    assert list(buffers['Ch1_L']) == [0, 0, 1]
+    assert list(buffers['Ch1_A']) == [0, 0.5, 0.5]
+
+    buffers, _, errors = compile_sequence(seq, {'d': 2.0})
+    assert not errors
+    assert list(buffers['Ch2_L']) == [1, 1, 0, 0, 0]
+    assert list(buffers['Ch1_A']) == [0, 0, 0.5, 0.5, 0.5]
+
+
+def test_compile_sequence_failure(manager):
+    """Test that missing variables are reported.
+
+    """
+    seq, _ = manager.build_sequence(build_sequence_config(manager))
+    seq.external_vars = OrderedDict()
+    buffers, _, errors = compile_sequence(seq)
+    assert buffers is None
+    assert 'Unknown variables' in errors
@@ -49,17 +49,35 @@ def test_template_observation(workbench, template_sequence, app_dir,
     import logging
     caplog.set_level(logging.WARNING)
 
+    from time import sleep
+    from exopy_pulses.pulses.workspace.workspace import SequenceEditionSpace
+
     plugin = workbench.get_plugin('exopy.pulses')
+
+    def wait():
+        # The known templates are updated on the main thread, which no event
+        # loop runs here.
+        sleep(1)
+        plugin._wait_templates_scan()
+
     assert template_sequence in plugin.sequences
     template_path = os.path.join(app_dir, 'pulses', 'templates')
+
+    # The folders are only watched when the workspace is active.
+    other = ConfigObj(os.path.join(template_path, 'other.temp_pulse.ini'))
+    other.write()
+    wait()
+    assert 'other' not in plugin.sequences
+    plugin.workspace = SequenceEditionSpace()
+    assert 'other' in plugin.sequences
+
     prof = ConfigObj(os.path.join(template_path, 'template.temp_pulse.ini'))
     prof.write()
-    from time import sleep
-    sleep(1)
+    wait()
     assert template_sequence in plugin.sequences
     assert 'template' in plugin.sequences
     os.remove(os.path.join(template_path, 'template.temp_pulse.ini'))
-    sleep(1)
+    wait()
     assert template_sequence in plugin.sequences
     assert 'template' not in plugin.sequences
 
@@ -69,6 +87,9 @@ def test_template_observation(workbench, template_sequence, app_dir,
     plugin.templates_folders = [os.path.join(app_dir, 'pulses', 'templates')]
     assert template_sequence in plugin.sequences
 
+    plugin.workspace = None
+    assert plugin._observer is None
+
 
 def test_get_item_infos(workbench, template_sequence):
     """Test getting the infos related to an item (pulse or sequence).
@@ -84,6 +105,124 @@ def test_get_item_infos(workbench, template_sequence):
             assert infos and infos.cls, infos.view
 
 
+def test_template_infos_lazy_loading(workbench, template_sequence):
+    """Test that template infos are built from the header and that the body
+    is loaded only when first accessed.
+
+    """
+    plugin = workbench.get_plugin('exopy.pulses')
+    metadata = plugin._template_sequences_infos[template_sequence].metadata
+    assert not metadata['loaded']
+    assert 'template_config' not in metadata
+    assert metadata['template_doc'] == 'dummy doc'
+    assert metadata['template_vars'] == {'b': ''}
+    assert metadata['logical_channels'] == ['A', 'B']
+    assert metadata['analogical_channels'] == ['Ch1', 'Ch2']
+
+    infos = plugin.get_item_infos(template_sequence)
+    assert infos.metadata['loaded']
+    config = infos.metadata['template_config']
+    assert 'item_0' in config
+
+    # The body is shared and not parsed again.
+    assert (plugin.get_item_infos(template_sequence)
+            .metadata['template_config'] is config)
+
+
+def test_template_infos_broken_header(workbench, app_dir, caplog):
+    """Test that a template whose header cannot be read is skipped.
+
+    """
+    import logging
+    caplog.set_level(logging.WARNING)
+
+    plugin = workbench.get_plugin('exopy.pulses')
+    template_path = os.path.join(app_dir, 'pulses', 'templates')
+    with open(os.path.join(template_path, 'broken.temp_pulse.ini'), 'w') as f:
+        f.write('template_vars = {\n')
+    plugin._refresh_known_template_sequences()
+
+    assert 'broken' not in plugin._template_sequences_infos
+    assert caplog.records
+
+
+def test_template_background_scan(workbench, template_sequence, app_dir):
+    """Test that the getters wait for the templates read in the background.
+
+    """
+    plugin = workbench.get_plugin('exopy.pulses')
+    template_path = os.path.join(app_dir, 'pulses', 'templates')
+    ConfigObj(os.path.join(template_path, 'other.temp_pulse.ini')).write()
+
+    plugin._refresh_known_template_sequences(background=True)
+    assert plugin.get_item_infos('other') is not None
+    assert 'other' in plugin.sequences
+    assert plugin._templates_scanner is None
+
+
+def test_template_folders_precedence(workbench, template_sequence, app_dir,
+                                    tmpdir):
+    """Test that the last templates folder wins for redundant names, whatever
+    the alphabetical order of the paths, even when the files are reported by
+    the watcher.
+
+    """
+    plugin = workbench.get_plugin('exopy.pulses')
+    template_path = os.path.join(app_dir, 'pulses', 'templates')
+    folders = []
+    paths = []
+    for name in ('z', 'a'):
+        folder = str(tmpdir.mkdir(name))
+        path = os.path.join(folder, 'dup.temp_pulse.ini')
+        config = ConfigObj(path)
+        config['template_vars'] = repr({name: ''})
+        config.write()
+        folders.append(folder)
+        paths.append(path)
+
+    plugin.templates_folders = [template_path] + folders
+    plugin._wait_templates_scan()
+    assert plugin._template_sequences_data['dup'] == paths[1]
+
+    plugin._refresh_known_template_sequences(paths)
+    plugin._wait_templates_scan()
+    assert plugin._template_sequences_data['dup'] == paths[1]
+
+    plugin.templates_folders = [template_path] + folders[::-1]
+    plugin._refresh_known_template_sequences(paths)
+    plugin._wait_templates_scan()
+    assert plugin._template_sequences_data['dup'] == paths[0]
+
+
+def test_template_incremental_refresh(workbench, template_sequence,
+                                      app_dir):
+    """Test that only the modified templates get new infos and that the index
+    is persisted.
+
+    """
+    plugin = workbench.get_plugin('exopy.pulses')
+    infos = plugin.get_item_infos(template_sequence)
+    assert infos.metadata['loaded']
+
+    template_path = os.path.join(app_dir, 'pulses', 'templates')
+    path = os.path.join(template_path, 'template.temp_pulse.ini')
+    ConfigObj(path).write()
+    plugin._refresh_known_template_sequences([path])
+    assert 'template' in plugin.sequences
+    assert plugin._template_sequences_infos[template_sequence] is infos
+
+    plugin._refresh_known_template_sequences()
+    assert plugin._template_sequences_infos[template_sequence] is infos
+
+    os.remove(path)
+    plugin._refresh_known_template_sequences([path])
+    assert 'template' not in plugin.sequences
+
+    assert os.path.isfile(os.path.join(app_dir, 'pulses',
+                                       'templates_index.json'))
+    assert plugin._templates_index.entries[infos.metadata['path']]
+
+
 # TODO test using the commands
 def test_get_item(workbench):
     """Test getting an item class and potentially view.
@@ -109,6 +248,30 @@ def test_get_item(workbench):
                     assert res is infos.cls
 
 
+def test_get_item_broken_import(workbench):
+    """Test that failing to import an item class is signaled on first access.
+
+    """
+    from exopy_pulses.pulses.infos import SequenceInfos
+    plugin = workbench.get_plugin('exopy.pulses')
+    infos = SequenceInfos(cls_path=('exopy_pulses.foo', 'Sequence'),
+                          view_path=('exopy_pulses.foo', 'SequenceView'))
+    plugin._sequences.contributions['exopy_pulses.Broken'] = infos
+
+    core = workbench.get_plugin('enaml.workbench.core')
+    core.invoke_command('exopy.app.errors.enter_error_gathering')
+    assert plugin.get_item('exopy_pulses.Broken') is None
+    assert plugin.get_item('exopy_pulses.Broken', True) == (None, None)
+
+    errors = workbench.get_plugin('exopy.app.errors')
+    signaled = errors._delayed['extensions']
+    assert len(signaled) == 2
+    assert 'exopy_pulses.Broken' in signaled[0]['errors']
+    assert 'import' in signaled[0]['errors']['exopy_pulses.Broken']
+    errors._delayed.clear()
+    core.invoke_command('exopy.app.errors.exit_error_gathering')
+
+
 def test_get_items(workbench):
     """Test getting multiple items class.
 
@@ -218,3 +381,56 @@ def test_list_sequences(workbench, template_sequence, caplog):
 
     plugin.list_sequences('__unknown__')
     assert caplog.records
+
+
+def test_compilation_server(workbench, tmpdir, monkeypatch):
+    """Test starting a compilation server from the plugin.
+
+    """
+    from exopy_pulses.pulses import server
+    from exopy_pulses.pulses.contexts.base_context import LOCAL_SETTINGS
+    from exopy_pulses.testing.context import DummyContext
+
+    monkeypatch.setattr(server, 'AUTHKEY_PATH', str(tmpdir.join('key')))
+    plugin = workbench.get_plugin('exopy.pulses')
+    plugin.compilation_server = '192.0.2.1:5000'
+    assert not plugin.start_compilation_server()
+
+    plugin.compilation_server = str(tmpdir.join('server'))
+    assert plugin.start_compilation_server()
+    assert plugin._compilation_server.running
+    # The contexts use the server of the machine, which is not saved with
+    # the sequences.
+    context = DummyContext()
+    assert context.compilation_server == plugin.compilation_server
+    assert 'compilation_server' not in context.preferences_from_members()
+
+    # A second server cannot listen on the same address.
+    other = type(plugin)()
+    other.compilation_server = plugin.compilation_server
+    assert not other.start_compilation_server()
+
+    plugin.stop_compilation_server()
+    assert plugin._compilation_server is None
+    plugin.compilation_server = ''
+    assert LOCAL_SETTINGS.compilation_server == ''
+
+
+def test_buffers_settings(workbench):
+    """Test that the buffers settings of the plugin are used by the contexts.
+
+    """
+    from exopy_pulses.pulses.contexts.base_context import LOCAL_SETTINGS
+    from exopy_pulses.testing.context import DummyContext
+
+    plugin = workbench.get_plugin('exopy.pulses')
+    plugin.buffers_folder = 'dummy'
+    plugin.buffers_chunk_size = 4
+    try:
+        context = DummyContext()
+        assert context.buffers_folder == 'dummy'
+        assert context.buffers_chunk_size == 4
+    finally:
+        plugin.buffers_folder = ''
+        plugin.buffers_chunk_size = 2**20
+    assert LOCAL_SETTINGS.buffers_folder == ''
@@ -609,6 +609,30 @@ def test_eval_pulse18(pulse):
     assert'0_shape_amplitude' in errors
 
 
+def test_compute_waveform_by_parts(pulse):
+    """Test computing a part of the waveform of a pulse.
+
+    """
+    from exopy_pulses.pulses.shapes.slope_shape import SlopeShape
+    pulse.root.context.sampling = 0.1
+    pulse.kind = 'Analogical'
+    pulse.def_1 = '1.0'
+    pulse.def_2 = '2.0'
+    pulse.modulation.frequency = '1.0'
+    pulse.modulation.activated = True
+    for shape in (SquareShape(amplitude='0.5'), SlopeShape()):
+        pulse.shape = shape
+        pulse.clean_cached_values()
+        assert pulse.eval_entries({}, {}, set(), {})
+        waveform = pulse.waveform
+        assert len(waveform) == 10
+        assert_array_equal(pulse.compute_waveform(3, 7), waveform[3:7])
+        assert_array_equal(pulse.compute_waveform(8, 20), waveform[8:])
+
+    pulse.kind = 'Logical'
+    assert_array_equal(pulse.compute_waveform(2, 4), np.ones(2))
+
+
 def test_traversing_pulse(pulse):
     """Test traversing a pulse.
 
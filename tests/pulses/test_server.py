@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the local compilation server.
+
+"""
+import os
+import stat
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+
+import numpy as np
+import pytest
+
+from exopy_pulses.pulses.pulse import Pulse
+from exopy_pulses.pulses.sequences.base_sequences import (RootSequence,
+                                                          BaseSequence)
+from exopy_pulses.pulses import server as server_module
+from exopy_pulses.pulses.server import (CompilationServer, CompilationClient,
+                                        parse_address, is_local_address,
+                                        load_authkey)
+from exopy_pulses.testing.context import DummyContext
+
+
+@pytest.fixture(autouse=True)
+def authkey_path(tmpdir, monkeypatch):
+    """Store the key of the user in a temporary folder.
+
+    """
+    path = str(tmpdir.join('keys', 'server_key'))
+    monkeypatch.setattr(server_module, 'AUTHKEY_PATH', path)
+    return path
+
+
+@pytest.fixture
+def server(tmpdir):
+    """Compilation server listening on a Unix socket.
+
+    """
+    server = CompilationServer(address=str(tmpdir.join('server')),
+                               workers=2, cache_size=2)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def root():
+    """Sequence depending on an external variable.
+
+    """
+    root = RootSequence(context=DummyContext(),
+                        external_vars=OrderedDict({'d': 1.0}))
+    seq = BaseSequence()
+    root.add_child_item(0, seq)
+    seq.add_child_item(0, Pulse(channel='Ch1_L', def_1='1.0',
+                                def_2='1.0 + {d}'))
+    return root
+
+
+def test_parse_address():
+    """Test converting the addresses.
+
+    """
+    assert parse_address('localhost:5000') == ('localhost', 5000)
+    assert parse_address('/tmp/server') == '/tmp/server'
+    assert parse_address(r'C:\server') == r'C:\server'
+
+
+def test_is_local_address():
+    """Test identifying the addresses which are not reachable from outside.
+
+    """
+    assert is_local_address('/tmp/server')
+    assert is_local_address('127.0.0.1:5000')
+    assert not is_local_address('192.0.2.1:5000')
+
+    server = CompilationServer(address='192.0.2.1:5000')
+    with pytest.raises(ValueError):
+        server.start()
+    assert not server.running
+
+
+def test_load_authkey(authkey_path):
+    """Test that a random key readable only by the user is generated once.
+
+    """
+    key = load_authkey()
+    assert len(key) == 64
+    assert load_authkey(authkey_path) == key
+    assert CompilationClient().authkey == key
+
+    if os.name == 'posix':
+        assert stat.S_IMODE(os.stat(authkey_path).st_mode) == 0o600
+        os.chmod(authkey_path, 0o644)
+        with pytest.raises(PermissionError):
+            load_authkey()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Uses a Unix socket')
+def test_compile(server, root):
+    """Test compiling a sequence on the server.
+
+    """
+    client = CompilationClient(address=server.address)
+    res, buffers, errors = client.compile(root)
+    assert res, errors
+    assert np.array_equal(buffers['Ch1_L'], [0, 1])
+    assert buffers['Ch1_A'].dtype == np.float64
+
+    res, buffers, _ = client.compile(root, {'d': 2.0})
+    assert np.array_equal(buffers['Ch1_L'], [0, 1, 1])
+    assert len(server._waveforms) == 2
+
+    # The waveforms are cached.
+    root.items[0].items[0].def_1 = '1.0'
+    res, buffers, _ = client.compile(root)
+    assert np.array_equal(buffers['Ch1_L'], [0, 1])
+    assert len(server._waveforms) == 2
+
+    res, buffers, errors = client.compile(root, {'d': 'a'})
+    assert not res and buffers is None
+    assert '2_stop' in errors
+
+    client.close()
+
+    # Clients which do not know the key are rejected.
+    client = CompilationClient(address=server.address, authkey=b'public')
+    with pytest.raises(AuthenticationError):
+        client.compile(root)
+    client = CompilationClient(address=server.address)
+    assert client.compile(root)[0]
+    client.close()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Uses a Unix socket')
+def test_waveforms_cache_size(server, root):
+    """Test that the total size of the cached waveforms is bounded.
+
+    """
+    client = CompilationClient(address=server.address)
+    server.cache_bytes = 0
+    res, buffers, errors = client.compile(root)
+    assert res, errors
+    assert not server._waveforms and server._waveforms_nbytes == 0
+
+    nbytes = sum(b.nbytes for b in buffers.values())
+    server.cache_bytes = nbytes
+    assert client.compile(root)[0]
+    assert server._waveforms_nbytes == nbytes
+    assert client.compile(root, {'d': 0.5})[0]
+    assert len(server._waveforms) == 1
+    assert server._waveforms_nbytes <= nbytes
+    client.close()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Uses a Unix socket')
+def test_compile_evicted_sequence(server, root):
+    """Test that sequences evicted from the cache of the server are sent
+    again.
+
+    """
+    client = CompilationClient(address=server.address)
+    assert client.compile(root)[0]
+    content_hash = root.content_hash
+    for i in range(2):
+        root.items[0].items[0].def_2 = str(3 + i)
+        assert client.compile(root)[0]
+    assert content_hash not in server._sequences
+
+    root.items[0].items[0].def_2 = '1.0 + {d}'
+    res, buffers, _ = client.compile(root)
+    assert np.array_equal(buffers['Ch1_L'], [0, 1])
+    client.close()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Uses a Unix socket')
+def test_context_client_mode(server, root, tmpdir, caplog):
+    """Test delegating the compilation from the context.
+
+    """
+    context = root.context
+    context.compilation_server = server.address
+    res, buffers, errors = context.compile_sequence(root)
+    assert res, errors
+    assert np.array_equal(buffers['Ch1_L'], [0, 1])
+    assert root.content_hash in server._sequences
+
+    # Unreachable servers are reported and the sequence compiled locally.
+    context.compilation_server = str(tmpdir.join('unknown'))
+    res, buffers, errors = context.compile_sequence(root)
+    assert res, errors
+    assert np.array_equal(buffers['Ch1_L'], [0, 1])
+    assert caplog.records
@@ -13,9 +13,12 @@ from math import exp, pi as Pi
 import cmath as cm
 
 import numpy as np
+import pytest
 from atom.api import Str
 
-from exopy_pulses.pulses.utils.entry_eval import HasEvaluableFields
+from exopy_pulses.pulses.utils.entry_eval import (HasEvaluableFields,
+                                                  MissingLocalVars,
+                                                  eval_entry, parse_entry)
 from exopy_pulses.pulses.utils.validators import Feval, SkipEmpty
 
 
@@ -147,3 +150,28 @@ def test_handling_feval_type_error():
 
     assert not obj.eval_entries(glob, loc, missings, errors)
     assert 'feval2' in errors
+
+
+def test_parsing_entry():
+    """Test parsing a formula and reusing the result.
+
+    """
+    expr, names = parse_entry('{a} + 2*{b_1} - {a}')
+    assert expr == '_a0 + 2*_a1 - _a2'
+    assert names == ('a', 'b_1', 'a')
+    assert parse_entry('{a} + 2*{b_1} - {a}')[0] is expr
+
+    assert parse_entry('2*Pi') == ('2*Pi', ())
+
+
+def test_eval_entry():
+    """Test evaluating a formula and reporting the missing variables.
+
+    """
+    assert eval_entry('{a} + 2*{b}', {'a': 1, 'b': 2}) == 5
+    assert eval_entry('{a} + 2*{b}', {'a': 2, 'b': 2}) == 6
+    assert eval_entry('2*3', {}) == 6
+
+    with pytest.raises(MissingLocalVars) as e:
+        eval_entry('{a} + 2*{b} +* {c}', {'a': 1})
+    assert e.value.missings == ['b', 'c']
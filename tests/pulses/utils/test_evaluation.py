@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the evaluation of sequences leaving the model untouched.
+
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from exopy_pulses.pulses.pulse import Pulse
+from exopy_pulses.pulses.shapes.square_shape import SquareShape
+from exopy_pulses.pulses.sequences.base_sequences import (RootSequence,
+                                                          BaseSequence)
+from exopy_pulses.pulses.utils.evaluation import (EvaluationResult,
+                                                  copy_sequence)
+from exopy_pulses.testing.context import DummyContext
+
+
+@pytest.fixture
+def root():
+    """Root sequence containing a sequence and a pulse depending on an
+    external variable.
+
+    """
+    root = RootSequence(context=DummyContext(),
+                        external_vars=OrderedDict({'a': 1.0}))
+    seq = BaseSequence()
+    root.add_child_item(0, seq)
+    seq.add_child_item(0, Pulse(kind='Analogical', channel='Ch1_A',
+                                shape=SquareShape(amplitude='{a}*0.1'),
+                                def_1='1', def_2='{a} + 2'))
+    root.add_child_item(1, Pulse(def_1='{2_stop}', def_2='1',
+                                 def_mode='Start/Duration', channel='Ch1_L'))
+    return root
+
+
+def test_copy_sequence(root):
+    """Test copying a sequence using the classes of its components.
+
+    """
+    copy = copy_sequence(root)
+    assert copy is not root
+    assert copy.content_hash == root.content_hash
+    assert copy.external_vars == root.external_vars
+
+
+def test_evaluate(root):
+    """Test that evaluating does not modify nor notify the sequence.
+
+    """
+    changes = []
+    pulse = root.items[1]
+    pulse.observe('stop', changes.append)
+
+    result = root.evaluate({'a': 2.0})
+    assert isinstance(result, EvaluationResult)
+    assert result.success
+    assert result.variables == {'a': 2.0}
+    assert (result.items[2].start, result.items[2].stop) == (1.0, 4.0)
+    assert (result.items[3].start, result.items[3].stop) == (4.0, 5.0)
+    assert [p.channel for p in result.pulses] == ['Ch1_A', 'Ch1_L']
+    assert result.pulses[0].values['shape'] == {'amplitude': 0.2}
+
+    assert not changes
+    assert pulse.stop == 0.0 and not pulse._cache
+    assert root.external_vars == {'a': 1.0}
+
+    with pytest.raises(AttributeError):
+        result.success = False
+    with pytest.raises(AttributeError):
+        result.items[2].stop = 0
+    with pytest.raises(TypeError):
+        result.items[2] = None
+    with pytest.raises(TypeError):
+        result.variables['a'] = 3.0
+    with pytest.raises(TypeError):
+        result.pulses[0].values['shape']['amplitude'] = 1.0
+    assert result.duration is None
+
+    # Later evaluations do not affect previous results.
+    other = root.evaluate()
+    assert other.items[3].stop == 4.0
+    assert result.items[3].stop == 5.0
+    assert result.simplified[1].stop == 5.0
+
+    buffers = root.context.render_sequence(list(result.simplified))
+    assert buffers['Ch1_L'][4:5].all()
+
+
+def test_evaluate_time_constrained(root):
+    """Test that the duration of a time constrained sequence is reported.
+
+    """
+    root.time_constrained = True
+    root.sequence_duration = '{a} + 10'
+    assert root.evaluate({'a': 2.0}).duration == 12.0
+    assert root.duration == 0.0
+
+
+def test_evaluate_failure(root):
+    """Test that errors are reported in the result.
+
+    """
+    result = root.evaluate({'a': 20.0})
+    assert not result.success
+    assert '2_shape_amplitude' in result.errors
+    with pytest.raises(TypeError):
+        result.errors['2_shape_amplitude'] = ''
+    assert not result.items and not result.pulses
+
+    del root.external_vars['a']
+    result = root.evaluate()
+    assert not result.success
+    assert 'a' in result.missings
+
+
+def test_evaluate_in_threads(root):
+    """Test evaluating the sequence for several values at once.
+
+    """
+    values = [1.0, 2.0, 3.0, 4.0]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda v: root.evaluate({'a': v}),
+                                    values))
+
+    assert [r.items[3].start for r in results] == [v + 2 for v in values]
+
+    # The copy is rebuilt when the sequence is edited.
+    root.items[1].def_2 = '2'
+    assert root.evaluate().items[3].stop == 5.0
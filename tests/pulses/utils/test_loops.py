@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the detection of repeated blocks of pulses.
+
+"""
+import pytest
+
+from exopy_pulses.pulses.pulse import Pulse
+from exopy_pulses.pulses.shapes.square_shape import SquareShape
+from exopy_pulses.pulses.sequences.base_sequences import RootSequence
+from exopy_pulses.pulses.utils.loops import PulseLoop, find_loops
+from exopy_pulses.testing.context import DummyContext
+
+
+@pytest.fixture
+def root():
+    """Root sequence using a dummy context.
+
+    """
+    return RootSequence(context=DummyContext(sampling=0.1))
+
+
+def add_pulses(root, pulses):
+    """Add pulses to the root and preprocess it.
+
+    """
+    for i, p in enumerate(pulses):
+        root.add_child_item(i, p)
+    items, errors = root.context.preprocess_sequence(root)
+    assert not errors
+    return items
+
+
+def analogical(start, stop, amplitude='0.5'):
+    """Build an analogical square pulse.
+
+    """
+    return Pulse(channel='Ch1_A', kind='Analogical', def_1=str(start),
+                 def_2=str(stop), shape=SquareShape(amplitude=amplitude))
+
+
+def test_find_single_pulse_loop(root):
+    """Test detecting the repetition of a single pulse.
+
+    """
+    pulses = [analogical(0.1 + 0.5*i, 0.3 + 0.5*i) for i in range(5)]
+    pulses.append(analogical(3.0, 3.2, '0.2'))
+    items = add_pulses(root, pulses)
+
+    channels = find_loops(items, root.context)
+    loop, single = channels['Ch1_A']
+    assert isinstance(loop, PulseLoop)
+    assert (loop.start, loop.period, loop.count) == (1, 5, 5)
+    assert len(loop.block) == 1
+    assert single.start == 3.0
+
+    assert len(find_loops(items, root.context, min_count=6)['Ch1_A']) == 6
+
+
+def test_find_block_loop(root):
+    """Test detecting the repetition of a block of several pulses.
+
+    """
+    pulses = []
+    for i in range(3):
+        pulses.append(Pulse(channel='Ch1_L', def_1=str(i),
+                            def_2=str(i + 0.1)))
+        pulses.append(Pulse(channel='Ch1_L', def_1=str(i + 0.2),
+                            def_2=str(i + 0.5)))
+    pulses.append(Pulse(channel='Ch1_L', def_1='3.0', def_2='3.1'))
+    items = add_pulses(root, pulses)
+
+    loop, single = root.context.detect_loops(items)['Ch1_L']
+    assert (loop.start, loop.period, loop.count) == (0, 10, 3)
+    assert [p.start for p in loop.block] == [0, 0.2]
+    assert single.start == 3.0
+
+    assert len(root.context.detect_loops(items, max_block=1)['Ch1_L']) == 7
+
+
+def test_find_loops_overlapping_blocks(root):
+    """Test that overlapping occurrences are not turned into loops.
+
+    """
+    pulses = [analogical(0.1*i, 0.1*i + 0.3) for i in range(4)]
+    items = add_pulses(root, pulses)
+
+    assert not any(isinstance(p, PulseLoop)
+                   for p in find_loops(items, root.context)['Ch1_A'])
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the sparse representation of the channels.
+
+"""
+import numpy as np
+
+from exopy_pulses.pulses.utils.segments import SparseChannel
+
+
+def test_from_pulses_analogical():
+    """Test building an analogical channel from pulses.
+
+    """
+    pulses = [(10, np.ones(3)), (0, np.ones(2)), (12, np.ones(4)),
+              (30, np.ones(5))]
+    channel = SparseChannel.from_pulses(pulses, 32, np.float64)
+    assert [s for s, _ in channel.segments] == [0, 10, 30]
+    assert list(channel.segments[1][1]) == [1, 1, 2, 1, 1, 1]
+    # The last pulse is truncated.
+    assert len(channel.segments[2][1]) == 2
+    assert channel.nonzero_length == 10
+
+    dense = np.zeros(32)
+    dense[0:2] = 1
+    dense[10:16] = 1
+    dense[12] = 2
+    dense[30:] = 1
+    np.testing.assert_array_equal(channel.densify(), dense)
+
+
+def test_from_pulses_logical_and_gaps():
+    """Test merging close pulses of a logical channel.
+
+    """
+    pulses = [(0, np.ones(2, dtype=np.int8)), (4, np.ones(2, dtype=np.int8)),
+              (5, np.ones(2, dtype=np.int8)), (20, np.ones(1, dtype=np.int8))]
+    channel = SparseChannel.from_pulses(pulses, 25, np.int8)
+    assert [s for s, _ in channel.segments] == [0, 4, 20]
+    assert list(channel.segments[1][1]) == [1, 1, 1]
+
+    channel = SparseChannel.from_pulses(pulses, 25, np.int8, max_gap=2)
+    assert [s for s, _ in channel.segments] == [0, 20]
+    assert list(channel.segments[0][1]) == [1, 1, 0, 0, 1, 1, 1]
+    assert channel.segments[0][1].dtype == np.int8
+
+    assert not SparseChannel.from_pulses([(30, np.ones(2))], 25,
+                                         np.int8).segments
+
+
+def test_from_pulses_split_abutting():
+    """Test keeping back to back pulses in separate segments.
+
+    """
+    pulses = [(0, np.ones(2)), (2, np.ones(2)), (4, 2*np.ones(2)),
+              (5, np.ones(3)), (9, np.ones(1))]
+    channel = SparseChannel.from_pulses(pulses, 12, np.float64, max_gap=1,
+                                        split_abutting=True)
+    assert [s for s, _ in channel.segments] == [0, 2, 4]
+    np.testing.assert_array_equal(channel.segments[2][1], [2, 3, 1, 1, 0, 1])
+    merged = SparseChannel.from_pulses(pulses, 12, np.float64, max_gap=1)
+    assert [s for s, _ in merged.segments] == [0]
+    np.testing.assert_array_equal(channel.densify(), merged.densify())
+
+
+def test_from_dense():
+    """Test extracting the non-zero runs of a dense array.
+
+    """
+    array = np.array([0, 1, 2, 0, 0, 3, 0, 4, 0])
+    channel = SparseChannel.from_dense(array)
+    assert [(s, list(v)) for s, v in channel.segments] == [(1, [1, 2]),
+                                                           (5, [3]), (7, [4])]
+    np.testing.assert_array_equal(channel.densify(), array)
+
+    channel = SparseChannel.from_dense(array, max_gap=1)
+    assert [s for s, _ in channel.segments] == [1, 5]
+    np.testing.assert_array_equal(channel.densify(), array)
+
+    assert not SparseChannel.from_dense(np.zeros(4)).segments
+
+
+def test_densify_range():
+    """Test densifying only part of a channel.
+
+    """
+    array = np.array([0, 1, 2, 0, 0, 3, 0, 4, 0])
+    channel = SparseChannel.from_dense(array)
+    for start, stop in ((0, 9), (2, 6), (3, 5), (6, 20), (8, 9), (5, 5)):
+        np.testing.assert_array_equal(channel.densify(start, stop),
+                                      array[start:stop])
+
+
+def test_waveform_library():
+    """Test deduplicating segments and merging back to back repetitions.
+
+    """
+    from exopy_pulses.pulses.utils.segments import WaveformLibrary
+
+    array = np.zeros(20)
+    array[0:6] = [1, 2, 1, 2, 1, 2]
+    array[8:10] = [3, 3]
+    array[12:14] = [1, 2]
+    channel = SparseChannel(length=20, dtype=array.dtype,
+                            segments=[(0, array[0:2]), (2, array[2:4]),
+                                      (4, array[4:6]), (8, array[8:10]),
+                                      (12, array[12:14])])
+    library = WaveformLibrary.from_channel(channel)
+    assert len(library.waveforms) == 2
+    assert library.table == [(0, 0, 3), (1, 8, 1), (0, 12, 1)]
+    assert library.compression_ratio == 10 / 4
+    np.testing.assert_array_equal(library.densify(), array)
+
+    # Waveforms of different types are never merged.
+    assert library.add_segment(16, np.array([1, 2], dtype=np.float32)) == 2
+
+    assert WaveformLibrary(length=3).compression_ratio == 1.0
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the sequences IO helper functions.
+
+"""
+from exopy_pulses.pulses.utils.sequences_io import (save_sequence_prefs,
+                                                    load_sequence_prefs,
+                                                    load_template_header)
+
+
+PREFS = {'name': 'Test', 'template_vars': "{'b': ''}",
+         'context': {'context_id': 'exopy_pulses.TemplateContext',
+                     'logical_channels': "['A']"},
+         'item_0': {'item_id': 'exopy_pulses.Pulse', 'def_1': '1.0'},
+         'item_1': {'item_id': 'exopy_pulses.Pulse', 'def_1': '2.0'}}
+
+
+def test_saving_and_loading(tmpdir):
+    """Test saving and loading the preferences of a sequence.
+
+    """
+    path = str(tmpdir.join('test.temp_pulse.ini'))
+    save_sequence_prefs(path, PREFS, 'Dummy doc')
+
+    prefs, doc = load_sequence_prefs(path)
+    assert doc == 'Dummy doc'
+    assert prefs['item_1']['def_1'] == '2.0'
+    assert prefs['context']['logical_channels'] == "['A']"
+
+
+def test_loading_template_header(tmpdir):
+    """Test that loading the header does not parse the items.
+
+    """
+    path = str(tmpdir.join('test.temp_pulse.ini'))
+    save_sequence_prefs(path, PREFS, 'Dummy doc')
+
+    header, doc = load_template_header(path)
+    assert doc == 'Dummy doc'
+    assert header['name'] == 'Test'
+    assert header['template_vars'] == "{'b': ''}"
+    assert header['context']['logical_channels'] == "['A']"
+    assert 'item_0' not in header and 'item_1' not in header
+
+
+def test_loading_reordered_template_header(tmpdir):
+    """Test loading the header of a template whose context is written after
+    the items.
+
+    """
+    path = str(tmpdir.join('test.temp_pulse.ini'))
+    with open(path, 'w') as f:
+        f.write('# Dummy doc\n'
+                'name = Test\n'
+                'template_vars = "{\'b\': \'\'}"\n'
+                '[item_0]\n'
+                '    item_id = exopy_pulses.Pulse\n'
+                '    [[shape]]\n'
+                '        shape_id = exopy_pulses.SquareShape\n'
+                '[context]\n'
+                '    logical_channels = "[\'A\']"\n')
+
+    header, doc = load_template_header(path)
+    assert doc == 'Dummy doc'
+    assert header['template_vars'] == "{'b': ''}"
+    assert header['context']['logical_channels'] == "['A']"
+    assert 'item_0' not in header
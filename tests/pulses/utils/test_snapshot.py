@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the snapshots and the pickling of sequences.
+
+"""
+import pickle
+from copy import copy
+from collections import OrderedDict
+
+import pytest
+
+from exopy_pulses.pulses.pulse import Pulse
+from exopy_pulses.pulses.shapes.square_shape import SquareShape
+from exopy_pulses.pulses.shapes.modulation import Modulation
+from exopy_pulses.pulses.sequences.base_sequences import (RootSequence,
+                                                          BaseSequence)
+from exopy_pulses.pulses.sequences.conditional_sequence import \
+    ConditionalSequence
+from exopy_pulses.pulses.utils.snapshot import Snapshot, dumps_sequence
+from exopy_pulses.testing.context import DummyContext
+
+
+@pytest.fixture
+def root():
+    """Root sequence containing nested sequences.
+
+    """
+    root = RootSequence(context=DummyContext(sampling=0.5),
+                        external_vars=OrderedDict({'a': 1.0}),
+                        local_vars=OrderedDict({'b': '{a}*2'}))
+    seq = BaseSequence(name='seq', time_constrained=True, def_1='1',
+                       def_2='10')
+    cond = ConditionalSequence(condition='{a} > 0')
+    root.add_child_item(0, seq)
+    seq.add_child_item(0, cond)
+    cond.add_child_item(0, Pulse(kind='Analogical', channel='Ch1_A',
+                                 shape=SquareShape(amplitude='{a}/2'),
+                                 def_1='2', def_2='{b} + 2'))
+    seq.add_child_item(1, Pulse(def_1='{3_stop}', def_2='1',
+                                def_mode='Start/Duration', channel='Ch1_L'))
+    root.add_child_item(1, Pulse(def_1='{1_stop}', def_2='12'))
+    return root
+
+
+def test_snapshot_restore(root):
+    """Test rebuilding a sequence from a snapshot.
+
+    """
+    snapshot = root.snapshot()
+    assert isinstance(snapshot, Snapshot)
+    with pytest.raises(AttributeError):
+        snapshot.children = ()
+
+    copy = snapshot.restore()
+    assert type(copy) is RootSequence
+    assert copy.content_hash == root.content_hash
+    assert copy.external_vars == root.external_vars
+    assert sorted(copy.global_vars) == sorted(root.global_vars)
+    assert copy.context is not root.context
+    assert copy.context.sampling == 0.5
+
+    seq = copy.items[0]
+    pulse = seq.items[0].items[0]
+    assert pulse.root is copy and pulse.parent is seq.items[0]
+    assert [i.index for i in copy.traverse() if hasattr(i, 'index')] == \
+        [i.index for i in root.traverse() if hasattr(i, 'index')]
+    assert pulse.shape is not root.items[0].items[0].items[0].shape
+
+    res, missings, errors = copy.evaluate_sequence()
+    assert res, errors
+    assert [(p.start, p.stop) for p in copy.simplify_sequence()] == \
+        [(2.0, 4.0), (4.0, 5.0), (10.0, 12.0)]
+
+
+def test_snapshot_restore_linkable_vars(root):
+    """Test that the root tracks the linkable vars of the nested items.
+
+    """
+    copy = root.snapshot().restore()
+    for seq in (root, copy):
+        seq.items[0].items[0].time_constrained = True
+        assert '2_stop' in seq.global_vars
+        seq.items[0].items[0].time_constrained = False
+        assert '2_stop' not in seq.global_vars
+    assert sorted(copy.global_vars) == sorted(root.global_vars)
+
+
+def test_snapshot_independence(root):
+    """Test that the snapshot is not affected by later changes.
+
+    """
+    snapshot = root.snapshot()
+    root.external_vars['a'] = 2.0
+    root.items[0].items[0].items[0].shape.amplitude = '0.1'
+    root.items[0].add_child_item(0, Pulse())
+
+    copy = snapshot.restore()
+    assert copy.external_vars == {'a': 1.0}
+    assert copy.items[0].items[0].items[0].shape.amplitude == '{a}/2'
+    assert len(copy.items[0].items) == 2
+
+    copy.external_vars['a'] = 3.0
+    assert snapshot.restore().external_vars == {'a': 1.0}
+
+
+def test_snapshot_pickling(root):
+    """Test that snapshots can be pickled.
+
+    """
+    snapshot = pickle.loads(pickle.dumps(root.snapshot()))
+    with pytest.raises(AttributeError):
+        snapshot.state = ()
+    assert snapshot.restore().content_hash == root.content_hash
+
+
+def test_snapshot_omits_defaults(root):
+    """Test that the values equal to the defaults are not recorded.
+
+    """
+    names = [name for name, _ in Snapshot.from_object(root.items[1]).state]
+    assert 'def_1' in names and 'def_mode' not in names
+
+
+def test_pickle_sequence(root):
+    """Test that pickling a sequence rebuilds the parents, roots and indexes
+    on load.
+
+    """
+    res, _, errors = root.evaluate_sequence()
+    assert res, errors
+    root.evaluate({'a': 2.0})
+
+    copy = pickle.loads(dumps_sequence(root))
+    assert copy.content_hash == root.content_hash
+    assert sorted(copy.global_vars) == sorted(root.global_vars)
+    pulse = copy.items[0].items[0].items[0]
+    assert pulse.root is copy and pulse.parent is copy.items[0].items[0]
+    assert pulse.index == root.items[0].items[0].items[0].index
+    assert pulse.stop == 0.0 and not pulse._cache
+
+    res, _, errors = copy.evaluate_sequence()
+    assert res, errors
+    assert [(p.start, p.stop) for p in copy.simplify_sequence()] == \
+        [(2.0, 4.0), (4.0, 5.0), (10.0, 12.0)]
+
+
+def test_pickle_components():
+    """Test pickling components which are not part of a sequence.
+
+    """
+    shape = pickle.loads(dumps_sequence(SquareShape(amplitude='{a}')))
+    assert type(shape) is SquareShape and shape.amplitude == '{a}'
+
+    modulation = pickle.loads(dumps_sequence(Modulation(frequency='2')))
+    assert modulation.frequency == '2'
+
+    context = pickle.loads(dumps_sequence(DummyContext(sampling=0.5)))
+    assert context.sampling == 0.5
+
+
+def test_copy_evaluated_pulse(root):
+    """Test that copying an item keeps the values of the last evaluation.
+
+    """
+    root.evaluate_sequence()
+    pulse = root.items[1]
+    new = copy(pulse)
+    assert new is not pulse
+    assert new.root is root and new.index == pulse.index
+    assert (new.start, new.stop) == (10.0, 12.0)
+    assert new._cache == pulse._cache
+
+
+def test_pickle_and_copy_template():
+    """Test pickling a sequence using a template and that copying a body
+    keeps its evaluation state.
+
+    """
+    from exopy_pulses.pulses.contexts.template_context import TemplateContext
+    from exopy_pulses.pulses.sequences.template_sequence import (
+        TemplateBody, TemplateSequence)
+
+    template = RootSequence(context=TemplateContext(logical_channels=['A']))
+    template.add_child_item(0, Pulse(channel='A', def_1='1.0', def_2='{b}'))
+    pref = template.preferences_from_members()
+    pref['template_vars'] = repr(dict(b=''))
+    dependencies = {'exopy.pulses.item': {'exopy_pulses.Pulse': Pulse}}
+    body = TemplateBody.build_from_config(pref, dependencies)
+
+    root = RootSequence(context=DummyContext())
+    seq = TemplateSequence(template_id='t', body=body,
+                           context=body.create_context(),
+                           template_vars={'b': '3.0'}, def_1='0.0',
+                           def_2='5.0')
+    seq.context.channel_mapping = {'A': 'Ch1_L'}
+    root.add_child_item(0, seq)
+    res, _, errors = root.evaluate_sequence()
+    assert res, errors
+
+    loaded = pickle.loads(dumps_sequence(root))
+    new_body = loaded.items[0].body
+    assert new_body is not body and not new_body.evaluation_order
+    assert all(i.root is new_body for i in new_body.items)
+    res, _, errors = loaded.evaluate_sequence()
+    assert res, errors
+    assert [(p.start, p.stop) for p in loaded.simplify_sequence()] == \
+        [(1.0, 3.0)]
+
+    # The copy protocol is not affected by the pickling.
+    new = copy(body)
+    assert new.items == body.items
+    assert body.evaluation_order
+    assert new.evaluation_order == body.evaluation_order
+
+
+def test_pickle_shared_template(pulses_plugin, template_sequence):
+    """Test that a template body shared by several sequences is pickled once
+    and indexed again once unpickled.
+
+    """
+    from exopy_pulses.pulses.sequences.template_sequence import (
+        TemplateSequence, DEP_TYPE)
+
+    body, errors = pulses_plugin.get_template_body(template_sequence)
+    assert body is not None, errors
+    root = RootSequence(context=DummyContext(sampling=0.5))
+    for i, (b, mapping) in enumerate([('19', ('Ch1_L', 'Ch2_L')),
+                                      ('12', ('Ch2_L', 'Ch1_L'))]):
+        conf = {'template_id': body.template_id, 'name': 'Template',
+                'template_vars': repr({'b': b})}
+        seq = TemplateSequence.build_from_config(conf,
+                                                 {DEP_TYPE:
+                                                  {body.template_id: body}})
+        seq.context.channel_mapping = {'A': mapping[0], 'B': mapping[1],
+                                       'Ch1': 'Ch2_A', 'Ch2': 'Ch1_A'}
+        seq.def_1 = '{1_stop}' if i else '1.0'
+        seq.def_2 = '40.0' if i else '20.0'
+        root.add_child_item(i, seq)
+    res, missings, errors = root.evaluate_sequence()
+    assert res, (missings, errors)
+    ref = [(p.start, p.stop, p.channel) for p in root.simplify_sequence()]
+
+    loaded = pickle.loads(dumps_sequence(root))
+    new_body = loaded.items[0].body
+    assert new_body is not body and loaded.items[1].body is new_body
+    assert not new_body.evaluation_order
+    assert all(i.root is new_body for i in new_body.items)
+    assert loaded.content_hash == root.content_hash
+
+    res, missings, errors = loaded.evaluate_sequence()
+    assert res, (missings, errors)
+    assert [(p.start, p.stop, p.channel)
+            for p in loaded.simplify_sequence()] == ref
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015-2018 by ExopyPulses Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the persistent index of templates.
+
+"""
+import os
+
+from exopy_pulses.pulses.utils.sequences_io import save_sequence_prefs
+from exopy_pulses.pulses.utils.templates_index import (TemplatesIndex,
+                                                       list_template_files)
+
+
+def save_template(path, t_vars):
+    """Save a minimal template.
+
+    """
+    prefs = {'template_vars': repr(t_vars),
+             'context': {'logical_channels': "['A']",
+                         'analogical_channels': "[]"}}
+    save_sequence_prefs(path, prefs, 'doc')
+
+
+def test_listing_templates(tmpdir):
+    """Test listing the templates found in folders.
+
+    """
+    folder = str(tmpdir)
+    save_template(os.path.join(folder, 'a.temp_pulse.ini'), {})
+    save_template(os.path.join(folder, 'b.ini'), {})
+
+    templates = list_template_files([folder, os.path.join(folder, 'dummy')])
+    assert templates == {'a': os.path.join(folder, 'a.temp_pulse.ini')}
+
+
+def test_updating_index(tmpdir, monkeypatch):
+    """Test that only the modified templates are read again.
+
+    """
+    from exopy_pulses.pulses.utils import templates_index
+    path = os.path.join(str(tmpdir), 'a.temp_pulse.ini')
+    save_template(path, {'a': '1'})
+
+    index = TemplatesIndex()
+    assert index.update([path]) == ([path], [])
+    metadata = index.entries[path]['metadata']
+    assert metadata['template_vars'] == {'a': '1'}
+    assert metadata['logical_channels'] == ['A']
+    assert metadata['template_doc'] == 'doc'
+
+    read = []
+    old = templates_index.read_template_header
+
+    def read_header(path):
+        read.append(path)
+        return old(path)
+
+    monkeypatch.setattr(templates_index, 'read_template_header', read_header)
+
+    # Unchanged file.
+    assert index.update([path]) == ([], [])
+
+    # Same content but new modification time.
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert index.update([path]) == ([], [])
+    assert index.entries[path]['mtime'] == stat.st_mtime + 10
+    assert not read
+
+    # Modified content.
+    save_template(path, {'a': '2'})
+    os.utime(path, (stat.st_atime, stat.st_mtime + 20))
+    assert index.update([path]) == ([path], [])
+    assert index.entries[path]['metadata']['template_vars'] == {'a': '2'}
+    assert read == [path]
+
+    # Deleted file.
+    os.remove(path)
+    assert index.update([path]) == ([], [path])
+    assert not index.entries
+
+
+def test_stale_entries(tmpdir):
+    """Test listing the entries which should be read again.
+
+    """
+    path = os.path.join(str(tmpdir), 'a.temp_pulse.ini')
+    other = os.path.join(str(tmpdir), 'b.temp_pulse.ini')
+    save_template(path, {'a': '1'})
+
+    index = TemplatesIndex()
+    assert index.stale([path, other]) == [path]
+    index.update([path])
+    assert index.stale([path, other]) == []
+
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert index.stale([path]) == [path]
+
+    os.remove(path)
+    assert index.stale([path]) == [path]
+
+
+def test_updating_index_broken_header(tmpdir, caplog):
+    """Test that a template whose header cannot be read is removed.
+
+    """
+    path = os.path.join(str(tmpdir), 'a.temp_pulse.ini')
+    with open(path, 'w') as f:
+        f.write('template_vars = {\n')
+
+    index = TemplatesIndex()
+    assert index.update([path]) == ([], [])
+    assert not index.entries
+    assert caplog.records
+
+
+def test_persisting_index(tmpdir):
+    """Test saving and loading the index.
+
+    """
+    path = os.path.join(str(tmpdir), 'a.temp_pulse.ini')
+    save_template(path, {'a': '1'})
+    index_path = os.path.join(str(tmpdir), 'index.json')
+
+    index = TemplatesIndex(path=index_path)
+    index.load()
+    assert not index.entries
+    index.update([path])
+    index.save()
+
+    index2 = TemplatesIndex(path=index_path)
+    index2.load()
+    assert index2.entries == index.entries
+    assert index2.update([path]) == ([], [])
+
+    with open(index_path, 'w') as f:
+        f.write('{')
+    index3 = TemplatesIndex(path=index_path)
+    index3.load()
+    assert not index3.entries
@@ -15,6 +15,7 @@ from collections import OrderedDict
 
 import enaml
 import pytest
+import numpy as np
 from enaml.widgets.api import Window
 from exopy.tasks.api import RootTask
 from exopy.tasks.tasks.instr_task import (PROFILE_DEPENDENCY_ID,
@@ -554,3 +555,222 @@ def test_drivers_filtering(task_view):
     del task_view.task.sequence.context
 
     assert len(task_view.filter_drivers([DInfos(id='__dummy__'), d])) == 2
+
+
+def set_channels(task):
+    """Assign all the pulses of the task sequence to a channel.
+
+    """
+    for item in task.sequence.items:
+        item.channel = 'Ch1_L'
+
+
+def test_task_check_table(task):
+    """Test checking the task when using a sequence table.
+
+    """
+    set_channels(task)
+    task.use_sequence_table = True
+    task.sweep_var = 'a'
+    task.sweep_values = '[1.5, 2.0]'
+    res, traceback = task.check()
+    assert res
+    assert not traceback
+
+    task.sweep_var = 'c'
+    res, traceback = task.check()
+    assert not res
+    assert 'root/Test-table' in traceback
+
+    task.sweep_var = 'a'
+    task.sequence.context.supports_sequence_table = False
+    res, traceback = task.check()
+    assert not res
+    assert 'root/Test-table' in traceback
+
+
+def test_task_perform_table(task, monkeypatch):
+    """Test that the table is transferred once and the entries selected.
+
+    """
+    set_channels(task)
+    context = task.sequence.context
+    calls = []
+    old = DummyContext.compile_and_transfer_table
+
+    def count_compil(self, *args, **kwargs):
+        calls.append(args)
+        return old(self, *args, **kwargs)
+    monkeypatch.setattr(DummyContext, 'compile_and_transfer_table',
+                        count_compil)
+
+    task.use_sequence_table = True
+    task.sweep_var = 'a'
+    task.sweep_values = '[1.5, 2.0, 1.2]'
+    for value in ('2.0', '1.5', '1.2'):
+        task.sequence_vars['a'] = value
+        task.perform()
+    assert len(calls) == 1
+    assert context.selected_entries == [1, 0, 2]
+    assert task.get_from_database('Test_test')
+    assert task.sequence.external_vars['a'] == 1.2
+
+    task.sequence_vars['a'] = '1.8'
+    with pytest.raises(Exception):
+        task.perform()
+
+    task.sweep_values = '[1.5, 1.8]'
+    task.perform()
+    assert len(calls) == 2
+    assert context.selected_entries[-1] == 1
+
+    # Editing the sequence requires to transfer the table again.
+    task.perform()
+    assert len(calls) == 2
+    task.sequence.items[2].def_2 = '11 + {b}'
+    task.perform()
+    assert len(calls) == 3
+
+
+def test_compile_sequence_table(task):
+    """Test that identical variants share the same waveforms.
+
+    """
+    set_channels(task)
+    seq = task.sequence
+    seq.external_vars['a'] = 1.5
+    context = seq.context
+    table, waveforms, errors = context.compile_sequence_table(
+        seq, [{'a': 1.5}, {'a': 2.0}, {'a': 1.5}])
+    assert not errors
+    assert table == [0, 1, 0]
+    assert len(waveforms) == 2
+    assert seq.external_vars['a'] == 1.5
+
+    seq.local_vars = OrderedDict()
+    table, waveforms, errors = context.compile_sequence_table(seq,
+                                                              [{'a': 1.5}])
+    assert 'variant_0' in errors
+
+
+def test_task_check_prefetch(task):
+    """Test checking the task when compiling the next point in advance.
+
+    """
+    task.prefetch_next = True
+    task.sweep_var = 'a'
+    task.sweep_values = '[1.5, 2.0]'
+    res, traceback = task.check()
+    assert res
+    assert not traceback
+
+    task.sequence.context.supports_precompilation = False
+    res, traceback = task.check()
+    assert not res
+    assert 'root/Test-prefetch' in traceback
+
+
+def test_task_perform_prefetch(task, monkeypatch):
+    """Test that the next point is compiled in the background.
+
+    """
+    set_channels(task)
+    context = task.sequence.context
+    compiled = []
+    old = DummyContext.compile_sequence
+
+    def record_compil(self, sequence):
+        compiled.append((self, sequence.external_vars['a']))
+        return old(self, sequence)
+    monkeypatch.setattr(DummyContext, 'compile_sequence', record_compil)
+
+    task.prefetch_next = True
+    task.sweep_var = 'a'
+    task.sweep_values = '[1.5, 2.0, 1.2]'
+    for value in ('1.5', '2.0', '1.2'):
+        task.sequence_vars['a'] = value
+        task.perform()
+    assert task._prefetched is None
+
+    # Only the first point is compiled using the context of the sequence.
+    assert [a for _, a in compiled] == [1.5, 2.0, 1.2]
+    assert compiled[0][0] is context
+    assert all(c is not context for c, _ in compiled[1:])
+    assert len(context.transferred) == 3
+    assert task.get_from_database('Test_test')
+
+    # Points which were not anticipated are compiled when performing.
+    task.sequence_vars['a'] = '2.0'
+    task.perform()
+    task._prefetched[1].result()
+    assert compiled[-2] == (context, 2.0)
+    assert compiled[-1][1] == 1.2
+    np.testing.assert_array_equal(context.transferred[1]['Ch1_L'],
+                                  context.transferred[3]['Ch1_L'])
+
+
+def test_task_perform_prefetch_several_vars(task, monkeypatch):
+    """Test that the prefetched point is used with several variables and that
+    the background compilation is stopped with the measurement.
+
+    """
+    set_channels(task)
+    seq = task.sequence
+    context = seq.context
+    seq.external_vars = OrderedDict([('a', None), ('c', None)])
+    seq.items[2].def_2 = '10 + {b} + {c}'
+    task.sequence_vars = OrderedDict([('a', '1.5'), ('c', '0.5')])
+    compiled = []
+    old = DummyContext.compile_sequence
+
+    def record_compil(self, sequence):
+        compiled.append(self)
+        return old(self, sequence)
+    monkeypatch.setattr(DummyContext, 'compile_sequence', record_compil)
+
+    task.prefetch_next = True
+    task.sweep_var = 'a'
+    task.sweep_values = '[1.5, 2.0, 1.2]'
+    for value in ('1.5', '2.0'):
+        task.sequence_vars['a'] = value
+        task.perform()
+    assert compiled[0] is context
+    assert all(c is not context for c in compiled[1:])
+    assert len(context.transferred) == 2
+
+    future = task._prefetched[1]
+    task.root.release_resources()
+    assert future.done()
+    assert task._prefetched is None
+    assert task._executor is None
+
+    # A new measurement gets a new executor.
+    task.sequence_vars['a'] = '1.5'
+    task.perform()
+    assert task._executor is not None
+
+    # Changing the sequence stops the background compilation.
+    task.sequence = sequence()
+    assert task._prefetched is None
+    assert task._executor is None
+
+
+def test_task_perform_delta(task):
+    """Test that only the modified channels are sent again.
+
+    """
+    set_channels(task)
+    task.sequence.items[2].channel = 'Ch2_L'
+    task.sequence.time_constrained = True
+    task.sequence.sequence_duration = '20'
+    context = task.sequence.context
+    task.prefetch_next = True
+    task.sweep_var = 'a'
+    task.sweep_values = '[1.5, 2.0]'
+    task.perform()
+    task.perform()
+    task.sequence_vars['a'] = '2.0'
+    task.perform()
+    assert context.sent_channels[0] == ['Ch1_A', 'Ch1_L', 'Ch2_A', 'Ch2_L']
+    assert context.sent_channels[1] == []
+    assert context.sent_channels[2] == ['Ch1_L', 'Ch2_L']